@@ -0,0 +1,95 @@
+'''Deadlock Handling Benchmark
+
+Runs the same synthetic workloads under each deadlock detection and prevention mode, and reports
+abort rate, commits/sec and percentiles of the ticks transactions spent blocked. Results are
+written to a JSON file together with the current git commit.
+
+Usage:
+    python -m bench.bench_deadlock [-o FILE] [-transactions N] [-modes MODE ...] [-timeout TICKS]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from bench.bench_throughput import SCENARIOS, git_commit
+from src.ddbms import DDBMS
+from src.events import EventLog
+from src.metrics import Metrics
+from src.topology import Topology
+from src.transaction import TransactionStatus
+from src.transaction_manager import TransactionManager
+from src.workload import Workload
+
+import argparse
+import json
+import time
+from collections import Counter
+from io import StringIO
+
+
+def percentile(values, p):
+    '''Returns the p-th percentile of sorted values, or 0 without values'''
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def run_mode(trace, topology, deadlock, timeout):
+    '''
+    Runs a trace under a deadlock mode with metrics recorded.
+    :param trace: trace text
+    :param topology: topology of the database
+    :param deadlock: deadlock detection or prevention mode
+    :param timeout: ticks a transaction may wait on locks, with the timeout mode
+    :return: dictionary of measurements
+    '''
+    metrics = Metrics()
+    start = time.perf_counter()
+    db = DDBMS(StringIO(trace), deadlock, topology, EventLog([]), metrics, deadlock_timeout=timeout)
+    elapsed = time.perf_counter() - start
+    trxs = db.tm.trxs.values()
+    commits = sum(1 for t in trxs if t.status == TransactionStatus.COMMITED)
+    aborts = Counter(t.abort_cause.name.lower() for t in trxs if t.status == TransactionStatus.ABORTED)
+    waits = metrics.counters.get('trx_wait_ticks')
+    blocked = sorted(waits.values.values()) if waits is not None else []
+    return {
+        'deadlock': deadlock,
+        'commits': commits,
+        'aborts': dict(aborts),
+        'abort_rate': sum(aborts.values()) / len(trxs) if trxs else 0.0,
+        'commits_per_sec': commits / elapsed,
+        'blocked_transactions': len(blocked),
+        'blocked_ticks': {p: percentile(blocked, p) for p in (50, 90, 99)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark deadlock detection against prevention.")
+    parser.add_argument('-o', default='bench_deadlock.json', help="JSON file the results are written to.")
+    parser.add_argument('-transactions', type=int, default=2000, help="Transactions per generated workload.")
+    parser.add_argument('-modes', nargs='+', choices=TransactionManager.DEADLOCK_MODES,
+                        default=list(TransactionManager.DEADLOCK_MODES), help="Deadlock modes to compare.")
+    parser.add_argument('-timeout', type=int, default=10, help="Ticks a transaction may wait with timeout.")
+    parser.add_argument('-seed', type=int, default=0, help="Random seed of the generated workloads.")
+    args = parser.parse_args()
+
+    results = {'commit': git_commit(), 'timeout': args.timeout, 'workloads': {}}
+    print('{:<20} {:<12} {:>11} {:>12} {:>8} {:>8} {:>8}'.format(
+        'workload', 'mode', 'abort rate', 'commits/sec', 'p50', 'p90', 'p99'))
+    for name, settings in SCENARIOS.items():
+        workload = Workload(transactions=args.transactions, seed=args.seed, **settings)
+        topology = Topology(workload.num_sites, workload.num_vars)
+        trace = workload.trace()
+        runs = results['workloads'][name] = []
+        for mode in args.modes:
+            r = run_mode(trace, topology, mode, args.timeout)
+            runs.append(r)
+            print('{:<20} {:<12} {:>11.3f} {:>12.0f} {:>8} {:>8} {:>8}'.format(
+                name, mode, r['abort_rate'], r['commits_per_sec'], *r['blocked_ticks'].values()))
+    with open(args.o, 'w') as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''Group Commit Benchmark
+
+Runs a synthetic workload with every site logging its commits to files that are synced on each
+flush, with group commit off and with growing windows, and reports log flushes (fsyncs) per commit
+and commits/sec. Results are written to a JSON file together with the current git commit.
+
+Usage:
+    python -m bench.bench_group_commit [-o FILE] [-transactions N] [-windows TICKS ...] [-no-sync]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from bench.bench_throughput import git_commit
+from src.ddbms import DDBMS
+from src.events import EventLog
+from src.topology import Topology
+from src.transaction import TransactionStatus
+from src.wal import WriteAheadLog
+from src.workload import Workload
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+
+
+def run_group_commit(trace, topology, window, sync=True):
+    '''
+    Runs a trace with file logs and a group commit window.
+    :param trace: trace text
+    :param topology: topology of the database
+    :param window: group commit window in ticks, 0 for no group commit
+    :param sync: whether log flushes are synced to disk
+    :return: dictionary of measurements
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        db = DDBMS(StringIO(trace), topology=topology, events=EventLog([]), group_window=window,
+                   wal=lambda i: WriteAheadLog(os.path.join(directory, 'site-{}'.format(i)), sync=sync))
+        elapsed = time.perf_counter() - start
+        db.close()
+    commits = sum(1 for t in db.tm.trxs.values() if t.status == TransactionStatus.COMMITED)
+    flushes = sum(site.wal.flushes for site in db.sites.values())
+    return {
+        'window': window,
+        'commits': commits,
+        'flushes': flushes,
+        'flushes_per_commit': flushes / commits if commits else 0.0,
+        'wall_time': elapsed,
+        'commits_per_sec': commits / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark group commit of durable logs.")
+    parser.add_argument('-o', default='bench_group_commit.json', help="JSON file the results are written to.")
+    parser.add_argument('-transactions', type=int, default=2000, help="Transactions of the workload.")
+    parser.add_argument('-windows', type=int, nargs='+', default=[0, 1, 2, 5, 10, 20],
+                        help="Group commit windows in ticks, 0 for group commit off.")
+    parser.add_argument('-no-sync', action='store_true', help="Flush logs to the file system without fsync.")
+    parser.add_argument('-seed', type=int, default=0, help="Random seed of the workload.")
+    args = parser.parse_args()
+
+    workload = Workload(transactions=args.transactions, seed=args.seed, write_ratio=0.5)
+    topology = Topology(workload.num_sites, workload.num_vars)
+    trace = workload.trace()
+    results = {'commit': git_commit(), 'settings': workload.settings(), 'sync': not args.no_sync, 'runs': []}
+    print('{:>7} {:>8} {:>8} {:>14} {:>12}'.format('window', 'commits', 'fsyncs', 'fsyncs/commit', 'commits/sec'))
+    for window in args.windows:
+        r = run_group_commit(trace, topology, window, not args.no_sync)
+        results['runs'].append(r)
+        print('{:>7} {:>8} {:>8} {:>14.2f} {:>12.0f}'.format(
+            window, r['commits'], r['flushes'], r['flushes_per_commit'], r['commits_per_sec']))
+    with open(args.o, 'w') as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''Memory Benchmark
+
+Measures the memory taken by the state of the database: bytes per variable (over all its copies)
+and per replica once every copy of every variable has been accessed, bytes per committed version
+beyond the first, per transaction, and per entry of a lock table.
+
+Usage:
+    python -m bench.bench_memory [-sites N] [-vars M] [-versions K] [-transactions N]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from src.ddbms import DDBMS
+from src.events import EventLog
+from src.topology import Topology
+
+import argparse
+import gc
+import tracemalloc
+
+
+def measure(step):
+    '''Returns the bytes allocated and kept by step()'''
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    step()
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory per variable, replica, version and transaction.")
+    parser.add_argument('-sites', type=int, default=10, help="Number of sites.")
+    parser.add_argument('-vars', type=int, default=100000, help="Number of variables.")
+    parser.add_argument('-versions', type=int, default=4, help="Versions committed on each variable.")
+    parser.add_argument('-transactions', type=int, default=100000, help="Transactions begun.")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    topology = Topology(args.sites, args.vars)
+    db = DDBMS(events=EventLog([]), topology=topology, start=False)
+    names = ['x' + str(i) for i in range(1, args.vars + 1)]
+    replicas = sum(len(topology.locate(var)) for var in names)
+
+    def access():
+        for site in db.sites.values():
+            for var in topology.vars_on_site(site.id):
+                site.vars[var]
+
+    def commit():
+        for site in db.sites.values():
+            for i, var in enumerate(topology.vars_on_site(site.id)):
+                variable = site.vars[var]
+                for k in range(args.versions):
+                    variable.write(1000 + i + k)
+                    variable.commit(k + 1)
+
+    def lock():
+        for site in db.sites.values():
+            for var in topology.vars_on_site(site.id):
+                site.locktable[var][0] |= 1
+
+    def begin():
+        for i in range(args.transactions):
+            db.tm.begin('T' + str(i))
+
+    accessed = measure(access)
+    versions = measure(commit)
+    locks = measure(lock)
+    transactions = measure(begin)
+    print('{} sites, {} variables, {} replicas'.format(args.sites, args.vars, replicas))
+    print('bytes per variable:    {:>8.1f}'.format(accessed / args.vars))
+    print('bytes per replica:     {:>8.1f}'.format(accessed / replicas))
+    print('bytes per version:     {:>8.1f}'.format(versions / (replicas * args.versions)))
+    print('bytes per lock entry:  {:>8.1f}'.format(locks / replicas))
+    print('bytes per transaction: {:>8.1f}'.format(transactions / args.transactions))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+'''Optimistic Concurrency Control Benchmark
+
+Runs synthetic workloads of growing contention, from many variables to few, under two-phase
+locking and optimistic concurrency control (or any other isolation levels given), and reports
+commits/sec and abort rate by cause. Results are written to a JSON file together with the current
+git commit.
+
+Usage:
+    python -m bench.bench_occ [-o FILE] [-transactions N] [-vars M ...] [-isolation LEVEL ...]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from bench.bench_throughput import best_of, git_commit
+from src.topology import Topology
+from src.transaction_manager import TransactionManager
+from src.workload import Workload
+
+import argparse
+import json
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark optimistic concurrency control against locking.")
+    parser.add_argument('-o', default='bench_occ.json', help="JSON file the results are written to.")
+    parser.add_argument('-transactions', type=int, default=2000, help="Transactions per workload.")
+    parser.add_argument('-vars', type=int, nargs='+', default=[2000, 500, 100, 20],
+                        help="Variables of the workloads, fewer for more contention.")
+    parser.add_argument('-isolation', nargs='+', choices=TransactionManager.ISOLATION_LEVELS,
+                        default=['2pl', 'occ'], help="Isolation levels to compare.")
+    parser.add_argument('-writes', type=float, default=0.3, help="Fraction of operations that are writes.")
+    parser.add_argument('-repeat', type=int, default=3, help="Runs per workload, the fastest is kept.")
+    parser.add_argument('-seed', type=int, default=0, help="Random seed of the workloads.")
+    args = parser.parse_args()
+
+    results = {'commit': git_commit(), 'runs': []}
+    print('{:>6} {:<6} {:>12} {:>11} {}'.format('vars', 'mode', 'commits/sec', 'abort rate', 'aborts'))
+    for num_vars in args.vars:
+        workload = Workload(transactions=args.transactions, write_ratio=args.writes, num_vars=num_vars,
+                            seed=args.seed)
+        topology = Topology(workload.num_sites, workload.num_vars)
+        trace = workload.trace()
+        for isolation in args.isolation:
+            r = best_of(args.repeat, trace, topology, isolation=isolation)
+            r.update(settings=workload.settings(), isolation=isolation)
+            results['runs'].append(r)
+            print('{:>6} {:<6} {:>12.0f} {:>11.3f} {}'.format(
+                num_vars, isolation, r['commits_per_sec'], r['abort_rate'], r['aborts']))
+    with open(args.o, 'w') as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
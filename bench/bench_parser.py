@@ -0,0 +1,64 @@
+'''Parser Benchmark
+
+Compares the lines per second of the original split-based line parser with the compiled parser,
+reading the same trace from memory in both cases. Only parsing is timed, not running the commands.
+
+Usage:
+    python -m bench.bench_parser [-lines N]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from src.parser import parse_lines
+
+import argparse
+import time
+from io import StringIO
+
+TEMPLATE = ['begin(T{0})', 'R(T{0},x{1})', 'W(T{0},x{2},{0})', 'dump(x{1})', 'end(T{0})']
+
+
+def legacy_parse(line):
+    '''Splits a line the way DDBMS._parse_line did before the compiled parser'''
+    line = line.split(')')[0]
+    line = line.split('(')
+    return (line[0], [x.strip() for x in line[1].split(',')])
+
+
+def make_trace(lines):
+    '''Returns a trace of the given number of lines'''
+    out = []
+    for i in range(lines):
+        out.append(TEMPLATE[i % len(TEMPLATE)].format(i // len(TEMPLATE), i % 20 + 1, (i * 7) % 20 + 1))
+    return '\n'.join(out) + '\n'
+
+
+def parse_legacy(stream):
+    '''Yields the commands of stream parsed line by line with legacy_parse'''
+    for line in stream:
+        yield legacy_parse(line)
+
+
+def bench(name, trace, parse):
+    '''Prints the lines per second parse reads from trace'''
+    start = time.perf_counter()
+    count = 0
+    for _ in parse(StringIO(trace)):
+        count += 1
+    elapsed = time.perf_counter() - start
+    print('{:<10} {:>10.0f} lines/sec'.format(name, count / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the command parser.")
+    parser.add_argument('-lines', type=int, default=500000, help="Number of lines parsed.")
+    args = parser.parse_args()
+    trace = make_trace(args.lines)
+    bench('before', trace, parse_legacy)
+    bench('after', trace, parse_lines)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''Recovery Benchmark
+
+Measures how long a site that lost its state on failure takes to recover from its write-ahead log,
+against the number of logged commits and the checkpoint interval, for logs kept in memory, in
+files and in memory-mapped files. Results are written to a JSON file together with the current
+git commit.
+
+Usage:
+    python -m bench.bench_recovery [-o FILE] [-commits N ...] [-checkpoint-every N ...]
+                                   [-backends memory|file|mmap ...] [-repeat N]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from bench.bench_throughput import git_commit
+from src.dbsite import DBSite
+from src.events import EventLog
+from src.topology import Topology
+from src.wal import WriteAheadLog
+
+import argparse
+import json
+import random
+import tempfile
+import time
+
+BACKENDS = ('memory', 'file', 'mmap')
+
+
+def run_recovery(commits, checkpoint_every, backend, directory=None, seed=0):
+    '''
+    Commits single writes on one site, fails it dropping its state and recovers it.
+    :param commits: number of commits logged before the failure
+    :param checkpoint_every: records between checkpoints, 0 for none
+    :param backend: 'memory', 'file' or 'mmap'
+    :param directory: directory of the log files, for the file and mmap backends
+    :return: dictionary of measurements
+    '''
+    rng = random.Random(seed)
+    topology = Topology()
+    wal = WriteAheadLog(None if backend == 'memory' else directory, checkpoint_every=checkpoint_every,
+                        use_mmap=backend == 'mmap')
+    site = DBSite(1, topology, EventLog([]), wal=wal)
+    variables = list(topology.vars_on_site(1))
+    start = time.perf_counter()
+    for i in range(commits):  # transaction i is interned to number 0, freed when it commits
+        site.ticker.next_tick()
+        site.write(0, rng.choice(variables), i)
+        site.commit(0)
+    logging = time.perf_counter() - start
+    tail = wal.lsn - wal.checkpoint_lsn
+    site.fail(drop_state=True)
+    start = time.perf_counter()
+    site.recover()
+    recovery = time.perf_counter() - start
+    wal.close()
+    return {
+        'commits': commits,
+        'checkpoint_every': checkpoint_every,
+        'backend': backend,
+        'replayed': tail,
+        'commit_time': logging / commits if commits else 0.0,
+        'recovery_time': recovery,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recovery of a site from its write-ahead log.")
+    parser.add_argument('-o', default='bench_recovery.json', help="JSON file the results are written to.")
+    parser.add_argument('-commits', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Log lengths, in commits before the failure.")
+    parser.add_argument('-checkpoint-every', type=int, nargs='+', default=[0, 1000, 10000],
+                        help="Checkpoint intervals, 0 for no checkpoints.")
+    parser.add_argument('-backends', choices=BACKENDS, nargs='+', default=list(BACKENDS),
+                        help="Where logs are kept.")
+    parser.add_argument('-repeat', type=int, default=3, help="Runs per setting, the fastest recovery is kept.")
+    args = parser.parse_args()
+
+    results = {'commit': git_commit(), 'runs': []}
+    print('{:<8} {:>8} {:>11} {:>9} {:>13} {:>13}'.format(
+        'backend', 'commits', 'checkpoint', 'replayed', 'us/commit', 'recovery ms'))
+    for backend in args.backends:
+        for commits in args.commits:
+            for checkpoint_every in args.checkpoint_every:
+                runs = []
+                for _ in range(args.repeat):
+                    with tempfile.TemporaryDirectory() as directory:
+                        runs.append(run_recovery(commits, checkpoint_every, backend, directory))
+                r = min(runs, key=lambda r: r['recovery_time'])
+                results['runs'].append(r)
+                print('{:<8} {:>8} {:>11} {:>9} {:>13.1f} {:>13.3f}'.format(
+                    backend, commits, checkpoint_every, r['replayed'], r['commit_time'] * 1e6,
+                    r['recovery_time'] * 1e3))
+    with open(args.o, 'w') as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+'''Read Routing Benchmark
+
+Runs a synthetic workload with sites failing and recovering under each read routing policy, and
+reports the share of reads served by the busiest site, commits and aborts.
+
+Usage:
+    python -m bench.bench_routing [-transactions N] [-seed SEED]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from src.ddbms import DDBMS
+from src.directory import POLICIES
+from src.events import EventLog
+from src.topology import Topology
+from src.transaction import TransactionStatus
+from src.workload import Workload
+
+import argparse
+import time
+from io import StringIO
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark read routing policies.")
+    parser.add_argument('-transactions', type=int, default=2000, help="Transactions of the workload.")
+    parser.add_argument('-seed', type=int, default=0, help="Random seed of the workload.")
+    args = parser.parse_args()
+
+    workload = Workload(transactions=args.transactions, seed=args.seed, fail_every=50, recover_after=10)
+    topology = Topology(workload.num_sites, workload.num_vars)
+    trace = workload.trace()
+    print('{:>12} {:>8} {:>10} {:>8} {:>8} {:>9}'.format(
+        'policy', 'reads', 'max share', 'commits', 'aborts', 'wall ms'))
+    for policy in POLICIES:
+        start = time.perf_counter()
+        db = DDBMS(StringIO(trace), topology=topology, events=EventLog([]), routing=policy)
+        elapsed = time.perf_counter() - start
+        statuses = [t.status for t in db.tm.trxs.values()]
+        print('{:>12} {:>8} {:>10.1%} {:>8} {:>8} {:>9.1f}'.format(
+            policy, sum(db.tm.directory.reads.values()), max(db.tm.directory.distribution().values()),
+            statuses.count(TransactionStatus.COMMITED), statuses.count(TransactionStatus.ABORTED), elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    main()
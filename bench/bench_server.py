@@ -0,0 +1,121 @@
+'''Server Load Benchmark
+
+Runs concurrent clients against the database server, each running transactions of reads and
+writes over Zipfian keys, and reports latency percentiles per operation type. A server is started
+in this process unless one is given with -connect.
+
+Usage:
+    python -m bench.bench_server [-connect HOST:PORT] [-clients N] [-transactions N] [-ops N]
+                                 [-writes RATIO] [-zipf S] [-pipeline] [-deadlock MODE] [-seed SEED]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from src.ddbms import DDBMS
+from src.events import EventLog
+from src.server import Server
+from src.transaction_manager import TransactionManager
+
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from itertools import accumulate
+
+
+def percentile(sorted_values, p):
+    '''Returns the p-th percentile (0-100) of a sorted list by nearest rank'''
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+async def client(host, port, c, args, latencies, outcomes):
+    '''Runs args.transactions transactions on one connection, recording the latency of each command'''
+    rng = random.Random(args.seed * 1000 + c)
+    keys = ['x' + str(k) for k in range(1, args.vars + 1)]
+    rng.shuffle(keys)
+    cum_weights = list(accumulate(1.0 / (k ** args.zipf) for k in range(1, args.vars + 1)))
+    reader, writer = await asyncio.open_connection(host, port)
+    n = 0
+    for i in range(args.transactions):
+        trx = 'C{}T{}'.format(c, i)
+        commands = [('begin', 'begin({})'.format(trx))]
+        for _ in range(args.ops):
+            key = rng.choices(keys, cum_weights=cum_weights)[0]
+            if rng.random() < args.writes:
+                commands.append(('W', 'W({},{},{})'.format(trx, key, rng.randint(0, 999))))
+            else:
+                commands.append(('R', 'R({},{})'.format(trx, key)))
+        commands.append(('end', 'end({})'.format(trx)))
+        batches = [commands] if args.pipeline else [[command] for command in commands]
+        for batch in batches:
+            sent = {}
+            for kind, line in batch:
+                n += 1
+                sent[n] = (kind, time.perf_counter())
+                writer.write(line.encode() + b'\n')
+            await writer.drain()
+            while sent:
+                reply = (await reader.readline()).decode().split(None, 1)
+                kind, start = sent.pop(int(reply[0]))
+                latencies[kind].append(time.perf_counter() - start)
+                if kind == 'end':
+                    outcomes[reply[1].split()[0]] += 1
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(args):
+    '''Runs all clients, starting a server unless one is given'''
+    server = None
+    if args.connect:
+        host, port = args.connect.rsplit(':', 1)
+    else:
+        db = DDBMS(deadlock=args.deadlock, events=EventLog([]), start=False)
+        server = await Server(db).start(port=0)
+        host, port = server.sockets[0].getsockname()[:2]
+    latencies = defaultdict(list)
+    outcomes = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, int(port), c, args, latencies, outcomes) for c in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+    return latencies, outcomes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure latency of the database server under concurrent clients.")
+    parser.add_argument('-connect', help="HOST:PORT of a running server (default: start one in this process).")
+    parser.add_argument('-clients', type=int, default=10, help="Number of concurrent clients.")
+    parser.add_argument('-transactions', type=int, default=100, help="Transactions per client.")
+    parser.add_argument('-ops', type=int, default=4, help="Reads and writes per transaction.")
+    parser.add_argument('-writes', type=float, default=0.5, help="Fraction of writes.")
+    parser.add_argument('-zipf', type=float, default=0.0, help="Zipfian skew of keys, 0 for uniform.")
+    parser.add_argument('-vars', type=int, default=20, help="Number of variables.")
+    parser.add_argument('-pipeline', action='store_true',
+                        help="Send all commands of a transaction at once instead of waiting for each reply.")
+    parser.add_argument('-deadlock', choices=TransactionManager.DEADLOCK_MODES, default='incremental',
+                        help="Deadlock detection mode of the server started in this process.")
+    parser.add_argument('-seed', type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    latencies, outcomes, elapsed = asyncio.run(run(args))
+    print('{:<8} {:>8} {:>10} {:>10} {:>10} {:>10}'.format('command', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms'))
+    for kind in ('begin', 'R', 'W', 'end'):
+        values = sorted(latencies[kind])
+        if values:
+            print('{:<8} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+                kind, len(values), *(1000 * percentile(values, p) for p in (50, 95, 99, 100))))
+    total = sum(len(v) for v in latencies.values())
+    print('{} commands in {:.3f}s ({:.0f}/s), transactions: {}'.format(
+        total, elapsed, total / elapsed, dict(outcomes)))
+
+
+if __name__ == '__main__':
+    main()
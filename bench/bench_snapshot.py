@@ -0,0 +1,53 @@
+'''Snapshot Benchmark
+
+Compares reaching the state at the end of a synthetic workload by replaying it from tick 0 with
+restoring it from a snapshot, and reports the size of the snapshot.
+
+Usage:
+    python -m bench.bench_snapshot [-transactions N ...] [-seed SEED]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from src.ddbms import DDBMS
+from src.events import EventLog
+from src.topology import Topology
+from src.workload import Workload
+
+import argparse
+import os
+import tempfile
+import time
+from io import StringIO
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark restoring a snapshot against replaying a trace.")
+    parser.add_argument('-transactions', type=int, nargs='+', default=[500, 2000],
+                        help="Transactions of the workloads.")
+    parser.add_argument('-seed', type=int, default=0, help="Random seed of the workloads.")
+    args = parser.parse_args()
+
+    print('{:>12} {:>10} {:>11} {:>11} {:>9}'.format('transactions', 'replay ms', 'restore ms', 'speedup', 'KiB'))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'snapshot')
+        for transactions in args.transactions:
+            workload = Workload(transactions=transactions, seed=args.seed, fail_every=50, recover_after=10)
+            topology = Topology(workload.num_sites, workload.num_vars)
+            start = time.perf_counter()
+            db = DDBMS(events=EventLog([]), topology=topology, start=False)
+            db.inputf = StringIO(workload.trace())
+            db.run()
+            replay = time.perf_counter() - start
+            db.snapshot(path)
+            start = time.perf_counter()
+            DDBMS(events=EventLog([]), topology=topology, start=False).restore(path)
+            restore = time.perf_counter() - start
+            print('{:>12} {:>10.1f} {:>11.1f} {:>10.0f}x {:>9.1f}'.format(
+                transactions, replay * 1e3, restore * 1e3, replay / restore, os.path.getsize(path) / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+'''End-to-end Throughput Benchmark
+
+Feeds synthetic workloads (or trace files) through DDBMS with events discarded, and reports
+ops/sec, commits/sec, abort rate by cause and wall time per tick. Results are written to a JSON
+file together with the current git commit, so runs can be compared across commits.
+
+Usage:
+    python -m bench.bench_throughput [-o FILE] [-transactions N] [-repeat N] [-processes]
+                                     [-writes MODE] [-isolation LEVEL] [TRACE ...]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from src.ddbms import DDBMS
+from src.events import EventLog
+from src.topology import Topology
+from src.transaction import TransactionStatus
+from src.transaction_manager import TransactionManager
+from src.workload import Workload
+
+import argparse
+import json
+import re
+import subprocess
+import time
+from collections import Counter
+from io import StringIO
+
+OPERATION = re.compile(r'^\s*[RW]\s*\(', re.M)
+
+# name: workload settings
+SCENARIOS = {
+    'uniform-read-heavy': dict(write_ratio=0.2, zipf=0.0),
+    'uniform-write-heavy': dict(write_ratio=0.8, zipf=0.0),
+    'zipf-0.99': dict(write_ratio=0.5, zipf=0.99),
+    'zipf-0.99-failures': dict(write_ratio=0.5, zipf=0.99, fail_every=25, recover_after=10),
+    'read-only-mix': dict(write_ratio=0.5, ro_fraction=0.5, zipf=0.5),
+}
+
+
+def git_commit():
+    '''Returns the current git commit, or None outside a git checkout'''
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_trace(trace, topology=None, **options):
+    '''
+    Runs a trace through DDBMS without output.
+    :param trace: trace text
+    :param topology: topology of the database
+    :param options: further DDBMS arguments, e.g. deadlock='incremental' or processes=True
+    :return: dictionary of measurements
+    '''
+    ops = len(OPERATION.findall(trace))
+    start = time.perf_counter()
+    db = DDBMS(StringIO(trace), topology=topology, events=EventLog([]), **options)
+    elapsed = time.perf_counter() - start
+    db.close()
+    ticks = db.ticker.get_tick()
+    trxs = db.tm.trxs.values()
+    commits = sum(1 for t in trxs if t.status == TransactionStatus.COMMITED)
+    aborts = Counter(t.abort_cause.name.lower() for t in trxs if t.status == TransactionStatus.ABORTED)
+    return {
+        'transactions': len(trxs),
+        'ops': ops,
+        'ticks': ticks,
+        'commits': commits,
+        'aborts': dict(aborts),
+        'abort_rate': sum(aborts.values()) / len(trxs) if trxs else 0.0,
+        'wall_time': elapsed,
+        'ops_per_sec': ops / elapsed,
+        'commits_per_sec': commits / elapsed,
+        'wall_time_per_tick': elapsed / ticks if ticks else 0.0,
+    }
+
+
+def best_of(repeat, trace, topology=None, **options):
+    '''Runs trace repeat times and keeps the fastest run'''
+    return min((run_trace(trace, topology, **options) for _ in range(repeat)), key=lambda r: r['wall_time'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end throughput of the database.")
+    parser.add_argument('traces', nargs='*', help="Trace files to run instead of the generated scenarios.")
+    parser.add_argument('-o', default='bench_throughput.json', help="JSON file the results are written to.")
+    parser.add_argument('-transactions', type=int, default=2000, help="Transactions per generated workload.")
+    parser.add_argument('-repeat', type=int, default=3, help="Runs per workload, the fastest is kept.")
+    parser.add_argument('-seed', type=int, default=0, help="Random seed of the generated workloads.")
+    parser.add_argument('-processes', action='store_true', help="Run each site in its own worker process.")
+    parser.add_argument('-writes', choices=TransactionManager.WRITE_MODES, default='immediate',
+                        help="Whether writes go to the sites at once or are buffered until end.")
+    parser.add_argument('-isolation', choices=TransactionManager.ISOLATION_LEVELS, default='2pl',
+                        help="Whether read/write transactions lock what they read or read snapshots.")
+    args = parser.parse_args()
+
+    options = dict(processes=args.processes, write_mode=args.writes, isolation=args.isolation)
+    results = {'commit': git_commit(), 'processes': args.processes, 'writes': args.writes,
+               'isolation': args.isolation, 'workloads': {}}
+    if args.traces:
+        for path in args.traces:
+            with open(path) as f:
+                trace = f.read()
+            results['workloads'][path] = best_of(args.repeat, trace, **options)
+    else:
+        for name, settings in SCENARIOS.items():
+            workload = Workload(transactions=args.transactions, seed=args.seed, **settings)
+            topology = Topology(workload.num_sites, workload.num_vars)
+            result = best_of(args.repeat, workload.trace(), topology, **options)
+            result['settings'] = workload.settings()
+            results['workloads'][name] = result
+
+    print('{:<22} {:>10} {:>12} {:>11} {:>9} {:>10}'.format(
+        'workload', 'ops/sec', 'commits/sec', 'abort rate', 'us/tick', 'aborts'))
+    for name, r in results['workloads'].items():
+        print('{:<22} {:>10.0f} {:>12.0f} {:>11.3f} {:>9.1f} {}'.format(
+            name, r['ops_per_sec'], r['commits_per_sec'], r['abort_rate'], r['wall_time_per_tick'] * 1e6,
+            r['aborts']))
+    with open(args.o, 'w') as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
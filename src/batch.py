@@ -0,0 +1,151 @@
+'''Batch Replay
+
+Replays many trace files across a pool of worker processes, one DDBMS per trace, and collects
+the outcome of each trace into one results file. Outcomes do not depend on the number of workers;
+wall times are kept apart from them.
+
+Usage:
+    python -m src.batch [-o FILE] [-workers N] [-deadlock MODE] [-sites N] [-vars M]
+                        [-replication K] PATH [PATH ...]
+
+    Each PATH is a trace file, a directory of trace files or a glob pattern.
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from .ddbms import DDBMS
+from .events import EventLog
+from .topology import Topology
+from .transaction_manager import TransactionManager
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# files in a directory that are not traces
+SKIPPED_SUFFIXES = ('.py', '.pyc', '.json', '.md')
+
+
+def collect(patterns):
+    '''Expands trace paths, directories and glob patterns
+
+    Args:
+        patterns ([str]): Trace files, directories or glob patterns
+
+    Returns:
+        Sorted list of the trace files, without duplicates. Directories and patterns skip hidden files
+        and files that are not traces, such as .py files
+    '''
+    paths = set()
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            candidates = glob.glob(pattern)
+        elif os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            paths.add(pattern)  # named explicitly, missing files are reported as errors
+            continue
+        for path in candidates:
+            name = os.path.basename(path)
+            if os.path.isfile(path) and not name.startswith(('.', '_')) and not name.endswith(SKIPPED_SUFFIXES):
+                paths.add(path)
+    return sorted(paths)
+
+
+def run_trace(path, deadlock='periodic', num_sites=10, num_vars=20, replication=None):
+    '''Replays one trace without output
+
+    Args:
+        path (str): Trace file
+        deadlock (str): Deadlock detection mode
+        num_sites (int): Number of sites
+        num_vars (int): Number of variables
+        replication (int): Number of copies of replicated variables, None for all sites
+
+    Returns:
+        (outcome, wall time) where outcome holds the final ticks, the status (and abort cause)
+        of each transaction and the latest committed value of each variable on each site,
+        or the error the trace raised
+    '''
+    start = time.perf_counter()
+    outcome = {'path': path}
+    try:
+        db = DDBMS(path, deadlock, Topology(num_sites, num_vars, replication=replication), EventLog([]))
+    except Exception as e:
+        outcome['error'] = '{}: {}'.format(type(e).__name__, e)
+        return outcome, time.perf_counter() - start
+    outcome['ticks'] = db.ticker.get_tick()
+    outcome['transactions'] = {
+        trx: t.status.name if t.abort_cause is None else '{} ({})'.format(t.status.name, t.abort_cause.name)
+        for trx, t in db.tm.trxs.items()}
+    outcome['values'] = {
+        str(s): {v: site.vars.peek(v).versions.latest()[1] for v in db.topology.vars_on_site(s)}
+        for s, site in db.sites.items()}
+    return outcome, time.perf_counter() - start
+
+
+def _run(args):
+    path, options = args
+    return run_trace(path, **options)
+
+
+def run_batch(paths, workers=None, **options):
+    '''Replays traces across a pool of worker processes
+
+    Args:
+        paths ([str]): Trace files, run in this order
+        workers (int): Number of worker processes, by default one per CPU; 0 runs the traces in this process
+        options: Further arguments of run_trace, e.g. deadlock='incremental'
+
+    Returns:
+        Dictionary with the outcome of each trace in order of paths, and the wall time of each
+        trace and of the whole batch
+    '''
+    start = time.perf_counter()
+    jobs = [(path, options) for path in paths]
+    if workers == 0:
+        results = list(map(_run, jobs))
+    else:
+        workers = workers or os.cpu_count() or 1
+        # workers are reused for many traces; handing out a few at a time keeps them all busy
+        chunksize = max(1, len(jobs) // (4 * workers))
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_run, jobs, chunksize=chunksize))
+    return {
+        'options': options,
+        'outcomes': [outcome for outcome, _ in results],
+        'timings': {
+            'traces': {outcome['path']: elapsed for outcome, elapsed in results},
+            'wall_time': time.perf_counter() - start,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay trace files across a pool of worker processes.")
+    parser.add_argument('paths', nargs='+', help="Trace files, directories of trace files or glob patterns.")
+    parser.add_argument('-o', default='batch_results.json', help="JSON file the results are written to.")
+    parser.add_argument('-workers', type=int, help="Number of worker processes (default: one per CPU).")
+    parser.add_argument('-deadlock', choices=TransactionManager.DEADLOCK_MODES, default='periodic',
+                        help="Deadlock detection mode.")
+    parser.add_argument('-sites', type=int, default=10, help="Number of sites.")
+    parser.add_argument('-vars', type=int, default=20, help="Number of variables.")
+    parser.add_argument('-replication', type=int,
+                        help="Number of copies of each replicated variable (default: all sites).")
+    args = parser.parse_args()
+    paths = collect(args.paths)
+    results = run_batch(paths, args.workers, deadlock=args.deadlock, num_sites=args.sites,
+                        num_vars=args.vars, replication=args.replication)
+    with open(args.o, 'w') as out:
+        json.dump(results, out, indent=2, sort_keys=True)
+    errors = sum(1 for outcome in results['outcomes'] if 'error' in outcome)
+    print('{} traces, {} errors, {:.3f}s'.format(len(paths), errors, results['timings']['wall_time']))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,218 +7,508 @@ Authors:
     Ardi Jusufi (aj2223@nyu.edu)
 """
 
+from .events import EventLog, DEBUG, INFO
+from .metrics import Metrics
 from .ticker import Ticker
-from .variable import Variable
+from .topology import Topology
+from .variable import Variable, VersionChain
+
+import sys
+
+
+class SiteVars(dict):
+    """Variables stored on a site. A variable is created the first time it is accessed."""
+
+    def __init__(self, site):
+        """
+        :param site: site storing the variables
+        """
+        super().__init__()
+        self.site = site
+
+    def __missing__(self, var):
+        variable = self.peek(var)
+        self[variable.id] = variable
+        self.site.versions_kept += len(variable.versions)
+        return variable
+
+    def peek(self, var):
+        """
+        Returns variable var without storing it if it was never accessed.
+        :param var: variable id
+        :return: the variable, or a new one in its initial state
+        """
+        variable = self.get(var)
+        if variable is None:
+            topology = self.site.topology
+            if not topology.hosts(self.site.id, var):
+                raise KeyError(var)
+            variable = Variable(sys.intern(var), topology.initial(var))  # one name for the copies on all sites
+            # replicated variable not written since the site recovered
+            if self.site.recovered and topology.is_replicated(var):
+                variable.available_for_read = False
+        return variable
+
+
+def holders(readlocks):
+    """
+    Returns the transactions holding read locks, in increasing order.
+    :param readlocks: bitset of read locks, with bit n set if transaction number n holds one
+    :return: list of transaction numbers
+    """
+    nums = []
+    while readlocks:
+        low = readlocks & -readlocks
+        nums.append(low.bit_length() - 1)
+        readlocks ^= low
+    return nums
+
+
+class LockTable(dict):
+    """Read and write locks of the variables of a site. An entry exists only while a variable is locked.
+    Transactions are given by the numbers the transaction manager interned them to."""
+
+    def __missing__(self, var):
+        entry = [0, None]  # [Read Locks as a bitset of transaction numbers, Write Lock]
+        self[var] = entry
+        return entry
+
+    def release_if_free(self, var):
+        """
+        Drops the entry of var if no lock is held on it.
+        :param var: variable whose locks were released
+        """
+        readlocks, writelock = self[var]
+        if not readlocks and writelock is None:
+            del self[var]
 
 
 class DBSite:
     """Creates a site object with unique copies of variables and locktables."""
 
-    def __init__(self, id):
+    def __init__(self, id, topology=None, events=None, metrics=None, ticker=None, wal=None):
         """
         Initializes own site copies of variables and the locktable, and sets site to active.
         :param id: site id
+        :param topology: topology of the database, by default ten sites and twenty variables
+        :param events: event log receiving the events of the site, by default printing them
+        :param metrics: metrics registry fed by the site, by default disabled
+        :param ticker: logical clock of the database, by default a new one at tick 0
+        :param wal: write-ahead log of the commits of the site, needed to recover from a failure that drops its state
         """
         self.id = id
-        self.vars = {}
-        self.init_vars()
-        self.locktable = {}
-        self.init_locks()
+        self.topology = topology if topology is not None else Topology()
+        self.events = events if events is not None else EventLog()
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.ticker = ticker if ticker is not None else Ticker()
+        self.wal = wal
+        self.state_lost = False  # variables were dropped on failure and have to be rebuilt from the log
+        self._catalog = []  # variables created before the state was dropped, recreated on rebuild
+        self._dropped_locks = []  # variables whose locks were dropped with the state, reported on recover
+        self.versions_kept = 0  # committed versions stored over all variables
+        self.recovered = False
+        self.vars = SiteVars(self)
+        self.locktable = LockTable()
+        self.trx_locks = {}  # trx: variables it holds read/write locks on
+        self.lock_since = {}  # (trx, var): tick the lock was acquired, kept only with metrics enabled
         self.up = True
         self.up_since = 0
 
     def init_locks(self):
         """
         Initializes the locktables. The locktable holds read and write locks for each variable.
+        :return: list of variables that were locked, in the same order as the locktable
         """
-        for v in self.vars:
-            self.locktable[v] = [set(), None]  # [Read Locks, Write Lock]
-
-    def init_vars(self):
-        """
-        Initializes twenty variables with indexes 1-10 with the values 10*i. E.g. x5 = 5 * 10 = 50.
-        """
-        for i in range(1, 21):
-            id = 'x' + str(i)
-            val = 10 * i
-            if i % 2 == 0:
-                self.vars[id] = Variable(id, val)
-            elif 1 + (i % 10) == self.id:
-                self.vars[id] = Variable(id, val)
+        dropped = sorted(set().union(*self.trx_locks.values()), key=self.topology.index)
+        self.trx_locks = {}
+        self.lock_since = {}
+        self.locktable = LockTable()
+        return dropped
 
     def acquire_read_lock(self, trx, var):
         """
         Attempts to acquire read lock on variable var for transaction trx.
         Succeeds if the variable is available for reading and if no other transaction
         holds a write lock on var.
-        :param trx: transaction attempting to get read lock on variable
+        :param trx: number of the transaction attempting to get read lock on variable
         :param var: variable being accessed
         :return: (True, None) if read lock acquired successfully.
-                 Otherwise, returns (False, list of blocking transactions if any)
+                 Otherwise, returns (False, blocking transaction if any)
         """
         if not self.vars[var].available_for_read:
-            print('{} not available for read yet'.format(self.id))
+            self.events.emit(INFO, 'site_unavailable_for_read', '{site} not available for read yet', site=self.id)
             return (False, None)
-        if self.locktable[var][1] and self.locktable[var][1] != trx:
-            return (False, self.locktable[var][1])
+        self.metrics.inc('lock_attempts', (self.id, var))
+        entry = self.locktable[var]
+        if entry[1] is not None and entry[1] != trx:
+            self.metrics.inc('lock_failures', (self.id, var))
+            return (False, entry[1])
         # if trx hold write lock, don't need to acquire new read lock
-        if self.locktable[var][1] is None:
-            self.locktable[var][0].add(trx)
+        if entry[1] is None:
+            entry[0] |= 1 << trx
+            self._index_lock(trx, var)
         return (True, None)
 
     def acquire_write_lock(self, trx, var):
         """
         Attempts to acquire write lock on variable var for transaction trx.
         Succeeds if no other transaction holds any lock on var.
-        :param trx: transaction attempting to get write lock on variable
+        :param trx: number of the transaction attempting to get write lock on variable
         :param var: variable being accessed
         :return: (True, []) if write lock acquired successfully.
-                 Otherwise, returns (False, list of blocking transactions)
-        """
-        readlocks, writelock = self.locktable[var]
-        if (not readlocks or (trx in readlocks and len(readlocks) == 1)) and (not writelock or writelock == trx):
-            # if trx hold read lock, remove write lock, hold new write lock
-            # only
-            if trx in readlocks:
-                readlocks.remove(trx)
-            self.locktable[var][1] = trx
+                 Otherwise, returns (False, list of numbers of blocking transactions)
+        """
+        self.metrics.inc('lock_attempts', (self.id, var))
+        blocking_trx = self._write_blockers(trx, var)
+        if not blocking_trx:
+            self._grant_write_lock(trx, var)
             return (True, [])
-        blocking_trx = []
-        if len(readlocks) > 0:
-            blocking_trx.extend(list(readlocks))
-        if writelock is not None:
-            blocking_trx.append(writelock)
-        if trx in blocking_trx:
-            blocking_trx.remove(trx)
+        self.metrics.inc('lock_failures', (self.id, var))
         return (False, blocking_trx)
 
+    def _write_blockers(self, trx, var):
+        """
+        Finds the transactions that keep trx from getting a write lock on var, without changing any lock.
+        :param trx: number of the transaction that wants the write lock
+        :param var: variable being accessed
+        :return: list of numbers of the transactions holding a lock on var, other than trx
+        """
+        readlocks, writelock = self.locktable.get(var, (0, None))
+        blocking_trx = holders(readlocks & ~(1 << trx))
+        if writelock is not None and writelock != trx:
+            blocking_trx.append(writelock)
+        return blocking_trx
+
+    def _grant_write_lock(self, trx, var):
+        """
+        Gives trx the write lock on var, which no other transaction holds a lock on.
+        :param trx: number of the transaction getting the write lock
+        :param var: variable being locked
+        """
+        entry = self.locktable[var]
+        # if trx hold read lock, remove write lock, hold new write lock
+        # only
+        entry[0] = 0
+        entry[1] = trx
+        self._index_lock(trx, var)
+
+    def _index_lock(self, trx, var):
+        """
+        Records in the reverse index that trx holds a lock on var.
+        :param trx: transaction holding the lock
+        :param var: variable being locked
+        """
+        if trx not in self.trx_locks:
+            self.trx_locks[trx] = set()
+        self.trx_locks[trx].add(var)
+        if self.metrics.enabled:
+            self.lock_since.setdefault((trx, var), self.ticker.get_tick())
+
+    def _observe_hold(self, trx, var):
+        """
+        Records how long trx held its lock on var.
+        :param trx: transaction releasing the lock
+        :param var: variable being unlocked
+        """
+        since = self.lock_since.pop((trx, var), None)
+        if since is not None:
+            self.metrics.observe('lock_hold_ticks', self.ticker.get_tick() - since)
+
+    def _locked_vars(self, trx):
+        """
+        Removes trx from the reverse index and returns the variables it holds locks on,
+        in the same order as the locktable.
+        :param trx: transaction whose locks are being released
+        :return: list of variables locked by trx on this site
+        """
+        locked = sorted(self.trx_locks.pop(trx, ()), key=self.topology.index)
+        if self.metrics.enabled:
+            for var in locked:
+                self._observe_hold(trx, var)
+        return locked
+
     def abort(self, trx):
         """
         Aborts transaction trx and releases all locks it was holding.
-        :param trx: Transaction being aborted
+        :param trx: number of the transaction being aborted
+        :return: list of variables unlocked
         """
         # release locks
         # clear uncommitted value of vars writen by trx
-        for k in self.locktable:
-            if trx in self.locktable[k][0]:
-                self.locktable[k][0].remove(trx)
-            if trx == self.locktable[k][1]:
+        released = self._locked_vars(trx)
+        for k in released:
+            entry = self.locktable[k]
+            entry[0] &= ~(1 << trx)
+            if trx == entry[1]:
                 self.vars[k].uncommited_value = None
-                self.locktable[k][1] = None
-
-    def release_write_lock(self, trx, var):
-        """
-        Releases write lock that trx might hold on variable var.
-        :param trx: transaction whose write lock is being released
-        :param var: variable being unlocked
-        """
-        if trx == self.locktable[var][1]:
-            self.locktable[var][1] = None
+                entry[1] = None
+            self.locktable.release_if_free(k)
+        return released
 
     def read(self, trx, is_read_only, timestamp, var):
         """
         Attempts to read variable var on this site.
-        :param trx: transaction attempting to read var
+        :param trx: number of the transaction attempting to read var
         :param is_read_only: indicates if transaction is read-only or read/write
         :param timestamp: timestamp (age) of transaction
         :param var: variable being read
-        :return: (value of variable, None) if successful.
-                 Otherwise, (False, blocking transactions if any)
+        :return: (True, None, value of variable) if successful.
+                 Otherwise, (False, blocking transactions if any, None)
         """
         if not self.up:
-            print('Site {} is down, try other sites'.format(self.id))
-            return (False, None)
+            self.events.emit(DEBUG, 'site_down', 'Site {site} is down, try other sites', site=self.id)
+            return (False, None, None)
         # if READ WRITE trx, try acquire read lock
         if not is_read_only:
             success, blocking_trx = self.acquire_read_lock(trx, var)
             if not success:
-                return (False, blocking_trx)
-        return (self.vars[var].read(is_read_only, timestamp), None)
+                return (False, blocking_trx, None)
+        version = self.vars[var].read(is_read_only, timestamp)
+        if version is None:
+            self.events.emit(INFO, 'var_unavailable_for_read', '{var} not available for read yet', var=var)
+            return (False, None, None)
+        time, value = version
+        if time is None:
+            self.events.emit(INFO, 'read_value', '{var} has uncommitted value {value}',
+                             var=var, value=value, site=self.id)
+        else:
+            self.events.emit(INFO, 'read_value', '{var} has committed value {value} modified at time {time}',
+                             var=var, value=value, time=time, site=self.id)
+        return (True, None, value)
 
-    def write(self, trx, var, val):
+    def check_write(self, trx, var):
         """
-        Attempts to write variable var on this site. Succeeds if site is up,
-        and the write lock can be acquired.
+        Checks whether transaction trx could write variable var on this site, without taking
+        any lock or writing anything. Succeeds if site is up, and the write lock could be acquired.
 
-        :param trx: transaction attempting to write to var
+        :param trx: number of the transaction attempting to write to var
         :param var: variable being written on
-        :param val: value being written on var
-        :return: (True, []) if successful. Otherwise, (False, list of blocking transactions)
+        :return: (True, []) if the write can be applied. Otherwise, (False, list of blocking transactions)
         """
         if not self.up:
-            print('Site {} is down, try next site'.format(self.id))
+            self.events.emit(DEBUG, 'site_down', 'Site {site} is down, try next site', site=self.id)
             return (False, [])
+        self.metrics.inc('lock_attempts', (self.id, var))
+        blocking_trx = self._write_blockers(trx, var)
+        if blocking_trx:
+            self.metrics.inc('lock_failures', (self.id, var))
+            return (False, blocking_trx)
+        return (True, [])
+
+    def lock_write(self, trx, var):
+        """
+        Attempts to take the write lock on variable var for a write of transaction trx, without writing
+        any value. Succeeds if site is up, and the write lock can be acquired. Once check_write has
+        succeeded, so does lock_write.
 
-        success, blocking_trx = self.acquire_write_lock(trx, var)
-        if not success:
+        :param trx: number of the transaction attempting to write to var
+        :param var: variable being locked
+        :return: (True, []) if successful. Otherwise, (False, list of blocking transactions)
+        """
+        if not self.up:
+            return (False, [])
+        blocking_trx = self._write_blockers(trx, var)
+        if blocking_trx:
             return (False, blocking_trx)
-        self.vars[var].write(val)
+        self._grant_write_lock(trx, var)
         return (True, [])
 
-    def commit(self, trx):
+    def write(self, trx, var, val):
+        """
+        Attempts to write variable var on this site. Succeeds if site is up,
+        and the write lock can be acquired. Once check_write has succeeded, so does write.
+
+        :param trx: number of the transaction attempting to write to var
+        :param var: variable being written on
+        :param val: value being written on var
+        :return: (True, []) if successful. Otherwise, (False, list of blocking transactions)
+        """
+        success, blocking_trx = self.lock_write(trx, var)
+        if success:
+            self.vars[var].write(val)
+        return (success, blocking_trx)
+
+    def commit(self, trx, watermark=None, flush=True):
         """
         Releases all locks held by transaction trx on the lock table of this site.
-        :param trx: transaction being committed whose locks will be released
+        :param trx: number of the transaction being committed whose locks will be released
+        :param watermark: timestamp of the oldest active read-only transaction; older versions are pruned
+        :param flush: whether the log records of the commit are flushed now, else by a later flush_log
+        :return: list of variables unlocked
         """
-        for var in self.locktable:
+        released = self._locked_vars(trx)
+        if self.wal is not None:
+            time = self.ticker.get_tick()
+            self.wal.append([(time, self.topology.index(var), self.vars[var].uncommited_value)
+                             for var in released if self.locktable[var][1] == trx], flush)
+        for var in released:
             if self.locktable[var][1] == trx:
-                print('{} in site {}'.format(var, self.id))
-                self.vars[var].commit(Ticker.get_tick())
+                variable = self.vars[var]
+                time = self.ticker.get_tick()
+                self.events.emit(INFO, 'commit_var', '{var} in site {site}', var=var, site=self.id)
+                self.events.emit(INFO, 'commit_value', 'commit value {value} at time {time}',
+                                 var=var, site=self.id, value=variable.uncommited_value, time=time)
+                self.versions_kept += variable.commit(time, watermark)
+                self.metrics.observe('version_chain_length', len(variable.versions))
                 self.locktable[var][1] = None
-            if trx in self.locktable[var][0]:
-                self.locktable[var][0].remove(trx)
+            self.locktable[var][0] &= ~(1 << trx)
+            self.locktable.release_if_free(var)
+        if self.wal is not None and self.wal.checkpoint_due():
+            self.checkpoint()
+        return released
+
+    def lock_count(self):
+        """
+        Returns the number of variables locked on this site.
+        """
+        return len(self.locktable)
+
+    def flush_log(self):
+        """
+        Makes the commits logged since the last flush durable.
+        :return: True if the log had records to flush
+        """
+        if self.wal is None or not self.wal.dirty:
+            return False
+        self.wal.flush()
+        self.metrics.inc('log_flushes', self.id)
+        return True
+
+    def checkpoint(self):
+        """
+        Stores the committed versions of all variables in a checkpoint of the write-ahead log.
+        """
+        self.wal.checkpoint({self.topology.index(v): (list(variable.versions.times), list(variable.versions.values))
+                             for v, variable in self.vars.items()})
+
+    def submit(self, method, *args):
+        """
+        Runs a request on this site. Sites in worker processes return before the request completes,
+        so the transaction manager can send a request to many sites before waiting for any of them.
+        :param method: name of the method to run, e.g. 'write'
+        :param args: arguments of the method
+        :return: function returning the result of the request
+        """
+        result = getattr(self, method)(*args)
+        return lambda: result
+
+    def _emit_var(self, kind, var):
+        """
+        Emits the latest committed value of variable var.
+        :param kind: kind of the event
+        :param var: variable being reported
+        """
+        time, value = self.vars.peek(var).versions.latest()
+        self.events.emit(INFO, kind, '{var}: {value} at time {time}', site=self.id, var=var, value=value, time=time)
 
     def querystate(self):
         """
         Prints the querystate of all variables on this site.
         """
-        print('**********Site {}:**********'.format(self.id))
-        for v in self.vars:
-            self.vars[v].querystate()
-            # print('locks: {}'.format(self.locktable[v]))
+        if not self.events.enabled(INFO):
+            return
+        self.events.emit(INFO, 'site_state', '**********Site {site}:**********', site=self.id)
+        if self.state_lost:
+            self.events.emit(INFO, 'site_state_lost', 'Site {site} is down and lost its state', site=self.id)
+            return
+        for v in self.topology.vars_on_site(self.id):
+            self._emit_var('var_state', v)
 
     def dump(self):
         """
         Prints all variables held on this site at the current tick (time moment).
         """
+        if not self.events.enabled(INFO):
+            return
         if self.up:
-            print('Site {}:'.format(self.id))
-            for v in sorted(self.vars, key=lambda k: int(k[1:])):
-                self.vars[v].dump()
+            self.events.emit(INFO, 'dump_site', 'Site {site}:', site=self.id)
+            for v in self.topology.vars_on_site(self.id):
+                self._emit_var('dump_var', v)
         else:
-            print('Site {} is down'.format(self.id))
+            self.events.emit(INFO, 'dump_site_down', 'Site {site} is down', site=self.id)
 
     def dump_var(self, var):
         """
         Prints variable var if available on this site.
         :param var: variable to be printed
         """
-        if self.up and self.vars[var].available_for_read:
-            print('Site {}:'.format(self.id))
-            self.vars[var].dump()
+        if self.up and self.vars.peek(var).available_for_read:
+            self.events.emit(INFO, 'dump_site', 'Site {site}:', site=self.id)
+            self._emit_var('dump_var', var)
         elif self.up:
-            print('{} not available yet'.format(var))
+            self.events.emit(INFO, 'dump_var_unavailable', '{var} not available yet', site=self.id, var=var)
         else:
-            print('Site {} is down'.format(self.id))
+            self.events.emit(INFO, 'dump_site_down', 'Site {site} is down', site=self.id)
 
-    def fail(self):
+    def fail(self, drop_state=False):
         """
         Brings site down.
+        :param drop_state: if True, the variables and locks in memory are lost as well, and recover
+                           rebuilds the committed versions from the write-ahead log
         """
+        if drop_state:
+            if self.wal is None:
+                raise ValueError('Site {} has no write-ahead log to recover dropped state from'.format(self.id))
+            self._catalog = list(self.vars)
+            self.vars = SiteVars(self)
+            self.versions_kept = 0
+            self._dropped_locks = self.init_locks()
+            self.state_lost = True
         self.up = False
 
+    def log_state(self):
+        """
+        Returns the committed versions the write-ahead log recovers: its latest checkpoint, with the log
+        after it replayed.
+        :return: ({variable index: (commit times, values)}, number of log records replayed)
+        """
+        lsn, state = self.wal.load_checkpoint()
+        replayed = 0
+        for time, index, value in self.wal.records(lsn):
+            times, values = state.setdefault(index, ([0], [self.topology.initial_value(index)]))
+            times.append(time)
+            values.append(value)
+            replayed += 1
+        return state, replayed
+
+    def _rebuild(self):
+        """
+        Rebuilds the committed versions of the variables from the latest checkpoint and the log after it.
+        :return: number of log records replayed
+        """
+        self.vars = SiteVars(self)
+        self.versions_kept = 0
+        for var in self._catalog:
+            self.vars[var]
+        state, replayed = self.log_state()
+        for index, (times, values) in state.items():
+            variable = self.vars['x' + str(index)]
+            self.versions_kept += len(times) - len(variable.versions)
+            variable.versions = VersionChain.load(times, values)
+        self.state_lost = False
+        self.metrics.observe('recovery_replayed', replayed)
+        return replayed
+
     def recover(self):
         """
-        Brings site back up and makes all unreplicated variables available immediately.
+        Brings site back up without the locks and uncommitted values it had when it failed, and makes
+        all unreplicated variables available immediately. Replicated variables not accessed yet are
+        created unavailable (see SiteVars). A site that lost its state is first rebuilt from its log.
+        :return: list of variables whose locks were dropped, so their waiters can be retried
         """
-        self.init_locks()
+        if self.state_lost:
+            self._rebuild()
+        released = self._dropped_locks + self.init_locks()
+        self._dropped_locks = []
+        self.recovered = True
         for v in self.vars:
-            v_id = int(v[1:])
-
-            if v_id % 2 == 0:
+            # uncommitted values were lost with the locks of their writers
+            self.vars[v].uncommited_value = None
+            if self.topology.is_replicated(v):
                 self.vars[v].available_for_read = False
             # unreplicated variable available immediately
             else:
                 self.vars[v].available_for_read = True
         self.up = True
-        self.up_since = Ticker.get_tick()
+        self.up_since = self.ticker.get_tick()
+        return released
@@ -10,33 +10,118 @@ Authors:
 from .ticker import Ticker
 from .variable import Variable
 from .dbsite import DBSite
+from .directory import POLICIES
+from .events import EventLog, SINKS, LEVELS, INFO, DEBUG, WARNING
+from .metrics import Metrics
+from .parser import ParseError, parse_command, parse_lines
+from .remote_site import RemoteSite
+from .snapshot import read_snapshot, write_snapshot
+from .topology import Topology, PLACEMENTS
 from .transaction_manager import TransactionManager
 from .util import Util
+from .wal import WriteAheadLog
 
 import argparse
+import os
+import sys
 
 
 class DDBMS:
     """Parses input transactions and dispatches them according to the operation."""
 
-    def __init__(self, inputfile=None):
+    # command: (method, least number of arguments, most number of arguments)
+    COMMANDS = {
+        'begin': ('begin', 1, 1),
+        'beginRO': ('beginRO', 1, 1),
+        'R': ('R', 2, 2),
+        'W': ('W', 3, 3),
+        'dump': ('dump', 0, 1),
+        'end': ('end', 1, 1),
+        'fail': ('fail', 1, 1),
+        'recover': ('recover', 1, 1),
+        'metrics': ('report_metrics', 0, 0),
+        'reads': ('report_reads', 0, 0),
+        'snapshot': ('snapshot', 1, 1),
+        'restore': ('restore', 1, 1),
+    }
+
+    # commands that do not take a tick, so a run resumed from a snapshot keeps the ticks of the original
+    UNTIMED = {'snapshot', 'restore'}
+
+    FAIL_MODES = ('keep', 'drop')
+
+    def __init__(self, inputfile=None, deadlock='periodic', topology=None, events=None, metrics=None,
+                 ticker=None, start=True, processes=False, wal=None, fail_mode='keep', group_window=0,
+                 group_budget=None, routing='first', write_mode='immediate', deadlock_timeout=10,
+                 isolation='2pl'):
         """
         Initializes the input (command-line or from a file), all sites and the transaction manager.
-        :param inputfile: filepath to input file, if any
+        :param inputfile: filepath to input file, '-' for standard input, or a file object, if any
+        :param deadlock: deadlock detection mode, 'periodic' (every five ticks and on end) or 'incremental'
+                         (whenever a waits-for edge is added), or deadlock prevention mode, 'wait-die',
+                         'wound-wait' or 'timeout' (see TransactionManager)
+        :param topology: sites and variables of the database, by default ten sites and twenty variables
+        :param events: event log receiving all events, by default printing them as text
+        :param metrics: metrics registry fed by the sites and the transaction manager, by default disabled
+        :param ticker: logical clock of this database, by default a new one at tick 0
+        :param start: if False, only initializes the database; commands are then given through execute or dispatch
+        :param processes: if True, runs each site in its own worker process, which fail kills and recover restarts
+        :param wal: function returning the write-ahead log of a site given its id, if commits are logged
+        :param fail_mode: 'keep' if failed sites keep their variables in memory, or 'drop' if they lose them and
+                          recover by replaying their write-ahead log (kept in memory unless wal is given)
+        :param group_window: ticks commits are grouped before their logs are flushed and they are acknowledged,
+                             0 to flush and acknowledge each commit as it is applied
+        :param group_budget: seconds commits are grouped, if not None
+        :param routing: policy choosing which live copy of a replicated variable a read goes to, e.g. 'round-robin'
+        :param write_mode: 'immediate' to write on the sites as writes go through, or 'deferred' or 'commit-locks'
+                           to buffer writes in the transaction until it ends (see TransactionManager)
+        :param deadlock_timeout: ticks a transaction may wait on locks before it is aborted, with 'timeout'
+        :param isolation: '2pl' for read/write transactions to lock what they read, 'si' or 'ssi' for (serializable)
+                          snapshot isolation, or 'occ' for optimistic concurrency control (see TransactionManager)
         """
         self.inputf = None
         self.cmd = False
-        if inputfile is None:
+        self.deadlock = deadlock
+        self.topology = topology if topology is not None else Topology()
+        self.events = events if events is not None else EventLog()
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.metrics_file = None
+        self.restore_file = None
+        self.snapshot_file = None
+        self.ticker = ticker if ticker is not None else Ticker()
+        self.processes = processes
+        self.wal = wal
+        self.fail_mode = fail_mode
+        self.group_window = group_window
+        self.group_budget = group_budget
+        self.routing = routing
+        self.write_mode = write_mode
+        self.deadlock_timeout = deadlock_timeout
+        self.isolation = isolation
+        if inputfile is not None:
+            self.inputf = self._open_input(inputfile)
+        elif start:
             self.parser = argparse.ArgumentParser(
                 description="Run Replicated Concurrency Control and Recovery database.")
             self.init_arguments()
-        else:
-            self.inputf = open(inputfile)
+        self.commands = {name: (getattr(self, method), least, most)
+                         for name, (method, least, most) in self.COMMANDS.items()}
         self.sites = {}
         self.init_site()
-        self.tm = TransactionManager(self.sites)
+        self.tm = TransactionManager(self.sites, self.deadlock, self.topology, self.events, self.metrics,
+                                     self.ticker, self.group_window, self.group_budget, self.routing,
+                                     self.write_mode, self.deadlock_timeout, self.isolation)
+        if not start:
+            return
+        if self.restore_file is not None:
+            self.restore(self.restore_file)
         self.run()
+        if self.snapshot_file is not None:
+            self.snapshot(self.snapshot_file)
         self.querystate()
+        if self.metrics_file is not None:
+            self.sample_metrics()
+            self.metrics.write_json(self.metrics_file)
 
     def init_arguments(self):
         """
@@ -44,67 +129,242 @@ class DDBMS:
         """
         self.parser.add_argument('--cmd', action='store_true',
                                  help="Specify flag if you wish to enter input via command line.")
-        self.parser.add_argument('-file', help="Filepath to input file.")
+        self.parser.add_argument('-file', help="Filepath to input file, or - for standard input.")
+        self.parser.add_argument('-deadlock', choices=TransactionManager.DEADLOCK_MODES, default='periodic',
+                                 help="Deadlock detection or prevention mode.")
+        self.parser.add_argument('-deadlock-timeout', type=int, default=10, metavar='TICKS',
+                                 help="Ticks a transaction may wait on locks with -deadlock timeout.")
+        self.parser.add_argument('-sites', type=int, default=10, help="Number of sites.")
+        self.parser.add_argument('-vars', type=int, default=20, help="Number of variables.")
+        self.parser.add_argument('-initial-factor', type=int, default=10,
+                                 help="Initial value of variable xi is FACTOR * i.")
+        self.parser.add_argument('-placement', choices=sorted(PLACEMENTS), default='default',
+                                 help="Placement of variables on sites.")
+        self.parser.add_argument('-replication', type=int,
+                                 help="Number of copies of each replicated variable (default: all sites).")
+        self.parser.add_argument('-log', choices=sorted(SINKS), default='text', help="Output format of events.")
+        self.parser.add_argument('-level', choices=sorted(LEVELS, key=LEVELS.get), default='debug',
+                                 help="Lowest level of events written.")
+        self.parser.add_argument('-processes', action='store_true',
+                                 help="Run each site in its own worker process.")
+        self.parser.add_argument('-metrics', metavar='FILE',
+                                 help="Record runtime metrics and write them as JSON to FILE at exit.")
+        self.parser.add_argument('-routing', choices=POLICIES, default='first',
+                                 help="Which live copy of a replicated variable reads go to.")
+        self.parser.add_argument('-writes', choices=TransactionManager.WRITE_MODES, default='immediate',
+                                 help="Whether writes go to the sites at once or are buffered until end.")
+        self.parser.add_argument('-isolation', choices=TransactionManager.ISOLATION_LEVELS, default='2pl',
+                                 help="Whether read/write transactions lock what they read, read snapshots, "
+                                      "or are validated at end.")
+        self.parser.add_argument('-restore', metavar='FILE', help="Resume from the snapshot in FILE.")
+        self.parser.add_argument('-snapshot', metavar='FILE', help="Write a snapshot to FILE at the end of the input.")
+        self.parser.add_argument('-wal', metavar='DIR',
+                                 help="Log commits of each site to DIR/site-N, or to memory if DIR is 'memory'.")
+        self.parser.add_argument('-checkpoint-every', type=int, default=0, metavar='N',
+                                 help="Checkpoint a site every N logged versions (default: never).")
+        self.parser.add_argument('-wal-mmap', action='store_true', help="Write log segments through memory maps.")
+        self.parser.add_argument('-wal-sync', action='store_true', help="Wait for log flushes to reach the disk.")
+        self.parser.add_argument('-group-commit', type=int, default=0, metavar='TICKS',
+                                 help="Flush logs and acknowledge commits in groups spanning TICKS ticks.")
+        self.parser.add_argument('-group-budget', type=float, metavar='SECONDS',
+                                 help="Close a group of commits after SECONDS at the latest.")
+        self.parser.add_argument('-fail-mode', choices=self.FAIL_MODES, default='keep',
+                                 help="Whether failed sites keep their variables or rebuild them from the log.")
 
         args = self.parser.parse_args()
         self.cmd = args.cmd
+        self.deadlock = args.deadlock
+        self.deadlock_timeout = args.deadlock_timeout
+        self.processes = args.processes
+        factor = args.initial_factor
+        self.topology = Topology(args.sites, args.vars, lambda i: factor * i, PLACEMENTS[args.placement],
+                                 args.replication)
+        self.events = EventLog([SINKS[args.log]()], LEVELS[args.level])
+        if args.metrics is not None:
+            self.metrics = Metrics()
+            self.metrics_file = args.metrics
+        self.routing = args.routing
+        self.write_mode = args.writes
+        self.isolation = args.isolation
+        self.restore_file = args.restore
+        self.snapshot_file = args.snapshot
+        self.fail_mode = args.fail_mode
+        self.group_window = args.group_commit
+        self.group_budget = args.group_budget
+        if args.wal is not None:
+            directory = None if args.wal == 'memory' else args.wal
+            self.wal = lambda i: WriteAheadLog(
+                directory and os.path.join(directory, 'site-{}'.format(i)), checkpoint_every=args.checkpoint_every,
+                use_mmap=args.wal_mmap, sync=args.wal_sync)
         if(self.cmd == False):
             inputfile = 'input'  # default input file if filepath not specified
             if(args.file is not None):
                 inputfile = args.file
-            self.inputf = open(inputfile)
+            self.inputf = self._open_input(inputfile)
 
-    def init_site(self):
+    @staticmethod
+    def _open_input(inputfile):
         """
-        Initializes ten sites indexed from 1 - 10.
+        Opens the input to be run.
+        :param inputfile: filepath to input file, '-' for standard input, or a file object
+        :return: file object to read the input from
         """
-        for i in range(1, 11):
-            self.sites[i] = DBSite(i)
+        if hasattr(inputfile, 'read'):
+            return inputfile
+        if inputfile == '-':
+            return sys.stdin
+        return open(inputfile)
+
+    def init_site(self):
+        """
+        Initializes the sites of the topology, indexed from 1.
+        """
+        if self.fail_mode not in self.FAIL_MODES:
+            raise ValueError('Unknown fail mode {}'.format(self.fail_mode))
+        if self.fail_mode == 'drop' and self.wal is None:
+            self.wal = lambda i: WriteAheadLog()
+        if self.processes:
+            if self.wal is not None:
+                raise ValueError('Sites in worker processes do not support write-ahead logs')
+            for i in self.topology.site_ids:
+                self.sites[i] = RemoteSite(i, self.topology, self.events, self.metrics, self.ticker)
+            return
+        for i in self.topology.site_ids:
+            self.sites[i] = DBSite(i, self.topology, self.events, self.metrics, self.ticker,
+                                   self.wal(i) if self.wal is not None else None)
 
     def querystate(self):
         """
-        Prints the state of sites and transactions.
+        Prints the state of sites and transactions, acknowledging the open group of commits first.
         """
-        print('----------System State at Time {}'.format(Ticker.get_tick()))
+        self.tm.flush_commits(force=True)
+        self.events.emit(INFO, 'system_state', '----------System State at Time {tick}', tick=self.ticker.get_tick())
         for s in self.sites:
             self.sites[s].querystate()
-        print('~~~~~~~~~~Transactions~~~~~~~~~~')
+        self.events.emit(INFO, 'transactions', '~~~~~~~~~~Transactions~~~~~~~~~~')
         self.tm.querystate()
+        self.events.emit(INFO, 'versions_kept', 'Versions kept: {count}', count=self.versions_kept())
+
+    def close(self):
+        """
+        Stops the worker processes of the sites, if they run in their own processes, and closes their logs.
+        """
+        for site in self.sites.values():
+            if self.processes:
+                site.close()
+            elif site.wal is not None:
+                site.wal.close()
+
+    def versions_kept(self):
+        """
+        Returns the number of committed versions currently stored over all sites.
+        """
+        return sum(s.versions_kept for s in self.sites.values())
 
     def run(self):
         """
         Reads the input line by line and calls the respective operation.
         """
-        print('Start')
+        self.events.emit(INFO, 'start', 'Start')
         if(self.cmd == True):  # run interactively via command line
-            line = None
-            while line != '':
-                line = input()
-                self._parse_line(line)
-        else:  # parse input file
-            for line in self.inputf:
-                self._parse_line(line)
-        print('Done')
-
-    def _parse_line(self, line):
-        """
-        Parses each line from the input.
+            for lineno, line in enumerate(self._prompt_lines(), 1):
+                self.execute(line, lineno)
+        else:  # stream input file
+            for lineno, name, args in parse_lines(self.inputf):
+                if name is None:
+                    self._bad_line(lineno, args)
+                else:
+                    self.dispatch(name, args, lineno)
+        self.tm.flush_commits(force=True)
+        if self.inputf is not None and self.inputf is not sys.stdin:
+            self.inputf.close()
+        self.events.emit(INFO, 'done', 'Done')
+
+    @staticmethod
+    def _prompt_lines():
+        """
+        Yields the lines entered on standard input until an empty line or the end of input.
+        """
+        for line in iter(sys.stdin.readline, ''):
+            line = line.rstrip('\n')
+            if not line:
+                return
+            yield line
+
+    def execute(self, line, lineno=None):
+        """
+        Parses a line of input and calls the respective operation. Blank lines and // comments are skipped,
+        malformed lines are reported and skipped; neither advances the tick.
         :param line: line to be parsed, e.g. R(T1,x1)
-        """
-        if not line:
-            return
-        tick = Ticker.get_tick()
-        line = line.split(')')[0]
-        line = line.split('(')
-        method = line[0]
-        args = [x.strip() for x in line[1].split(',')]
-
-        print('----------Tick {}----------'.format(tick))
+        :param lineno: line number of line in the input, used in error reports
+        :return: True if the line was run or skipped, False if it was malformed
+        """
+        try:
+            command = parse_command(line)
+        except ParseError as e:
+            return self._bad_line(lineno, str(e))
+        if command is None:
+            return True
+        return self.dispatch(command[0], command[1], lineno)
+
+    def dispatch(self, name, args, lineno=None):
+        """
+        Calls the operation of a parsed command and advances the tick.
+        :param name: name of the command, e.g. R
+        :param args: list of arguments of the command, e.g. ['T1', 'x1']
+        :param lineno: line number of the command in the input, used in error reports
+        :return: True if the command was run, False if it is unknown, has the wrong number of arguments, or
+                 names a variable, site or transaction that does not exist or a value that is not a number
+        """
+        if name not in self.commands:
+            return self._bad_line(lineno, 'unknown command {}'.format(name))
+        method, least, most = self.commands[name]
+        if not least <= len(args) <= most:
+            return self._bad_line(lineno, '{} takes {} argument(s), got {}'.format(
+                name, least if least == most else '{}-{}'.format(least, most), len(args)))
+        if name in self.UNTIMED:
+            return self._call(method, args, lineno)
+
+        tick = self.ticker.get_tick()
+        self.events.emit(DEBUG, 'tick', '----------Tick {tick}----------', tick=tick)
         # Detect cycles every five ticks:
-        if (tick % 5 == 0):
+        if (tick % 5 == 0 and self.deadlock == 'periodic'):
             self.detect_and_resolve_cycles()
-        getattr(self, method)(*args)  # call respective method
-        Ticker.next_tick()
+        elif self.deadlock == 'timeout':
+            self.tm.abort_timed_out()
+        if not self._call(method, args, lineno):  # call respective method
+            return False
+        self.tm.flush_commits()
+        self.ticker.next_tick()
+        self.metrics.inc('commands', name)
+        return True
+
+    def _call(self, method, args, lineno):
+        """
+        Calls the operation of a command, reporting arguments it rejects as a bad line.
+        :param method: operation of the command
+        :param args: list of arguments of the command
+        :param lineno: line number of the command in the input, used in error reports
+        :return: True if the operation was run, False if it rejected its arguments
+        """
+        try:
+            method(*args)
+        except KeyError as e:
+            return self._bad_line(lineno, 'unknown {}'.format(e.args[0]))
+        except ValueError as e:
+            return self._bad_line(lineno, str(e))
+        return True
+
+    def _bad_line(self, lineno, error):
+        """
+        Reports a malformed line of input.
+        :param lineno: line number of the line, if known
+        :param error: description of the problem
+        :return: False
+        """
+        self.events.emit(WARNING, 'bad_line', 'Bad input at line {lineno}: {error}',
+                         lineno='?' if lineno is None else lineno, error=error)
+        return False
 
     def begin(self, trx):
         """
@@ -112,7 +372,7 @@ class DDBMS:
 
         :param trx: read/write transaction
         """
-        print('{} begins'.format(trx))
+        self.events.emit(INFO, 'begin', '{trx} begins', trx=trx)
         self.tm.begin(trx)
 
     def beginRO(self, trx):
@@ -121,7 +381,7 @@ class DDBMS:
 
         :param trx: read-only transaction
         """
-        print('RO {} begins'.format(trx))
+        self.events.emit(INFO, 'begin_ro', 'RO {trx} begins', trx=trx)
         self.tm.beginRO(trx)
 
     def R(self, trx, var):
@@ -143,20 +403,20 @@ class DDBMS:
         """
         self.tm.write(trx, var, int(val))
 
-    def dump(self, arg):
+    def dump(self, arg=None):
         """
         Dispatches dump transactions to variables, sites, or displays a system-wide state.
 
         :param arg: variable for dump(variable); site for dump(site); or None for system-wide dump
         """
         if not arg:
-            print('Dump all')
+            self.events.emit(INFO, 'dump', 'Dump all')
             self._dump_all()
         elif 'x' in arg:
-            print('Dump value of {}'.format(arg))
+            self.events.emit(INFO, 'dump', 'Dump value of {var}', var=arg)
             self._dump_var(arg)
         else:
-            print('Dump values of all variables in site {}'.format(arg))
+            self.events.emit(INFO, 'dump', 'Dump values of all variables in site {site}', site=arg)
             self._dump_site(arg)
 
     def _dump_all(self):
@@ -186,39 +446,22 @@ class DDBMS:
 
     def _locate_var(self, var):
         """
-        Returns a list of sites where a variable is stored. If the variable is even, it is stored on all sites.
-        If odd, it is stored on site with index 1 + (index % 10), e.g. x3 is stored on site 1 + (3 % 10) = 4.
+        Returns a list of sites where a variable is stored, as given by the topology.
         :param var: Variable whose site location is being requested
         :return: list of sites where the variable is stored
         """
-        var_id = int(var[1:])
-        if var_id % 2 == 0:
-            return self.sites.keys()
-        else:
-            return [1 + (var_id % 10)]
+        return self.topology.locate(var)
 
     def detect_and_resolve_cycles(self):
         """
-        Detects cycles in wait-for graph. If there's a cycle in the graph, it aborts
+        Detects cycles in wait-for graph. While there's a cycle in the graph, it aborts
         the youngest transaction (with the latest timestamp).
         """
-        waits_for_graph = self.tm._generate_waits_for_graph()
-        cycles = Util.get_cycles(waits_for_graph)
-        if(len(cycles) > 0):
+        cycles = Util.get_cycles(self.tm._generate_waits_for_graph())
+        while(len(cycles) > 0):
             # Randomly select the first cycle to resolve:
-            cycle = cycles[0]
-            print("Detected cycle: ", cycle)
-
-            # Find youngest transaction in cycle:
-            latest_timestamp = 0
-            youngest_transaction = None
-            for trx in cycle:
-                t = self.tm.trxs[trx]
-                if(t.timestamp > latest_timestamp):
-                    latest_timestamp = t.timestamp
-                    youngest_transaction = trx
-            self.tm.abort(youngest_transaction)
-            self.detect_and_resolve_cycles()
+            self.tm.resolve_cycle(cycles[0])
+            cycles = Util.get_cycles(self.tm._generate_waits_for_graph())
 
     def end(self, trx):
         """
@@ -228,28 +471,89 @@ class DDBMS:
         # Check if there is any deadlock to be resolved before committing.
         # However, only check if there was no prior deadlock checking
         # at the beginning of this tick:
-        if(not Ticker.get_tick() % 5 == 0):
+        if(not self.ticker.get_tick() % 5 == 0 and self.deadlock == 'periodic'):
             self.detect_and_resolve_cycles()
-        print('{} ends'.format(trx))
+        self.events.emit(INFO, 'end', '{trx} ends', trx=trx)
         self.tm.end(trx)
 
+    def sample_metrics(self):
+        """
+        Records the gauges sampled on demand rather than as the database runs.
+        """
+        self.metrics.set('versions_kept', self.versions_kept(), self.ticker.get_tick())
+
+    def report_metrics(self):
+        """
+        Prints a summary of the runtime metrics.
+        """
+        if not self.metrics.enabled:
+            self.events.emit(INFO, 'metrics', 'Metrics are disabled')
+            return
+        self.sample_metrics()
+        self.events.emit(INFO, 'metrics', '~~~~~~~~~~Metrics~~~~~~~~~~', metrics=self.metrics.snapshot())
+        for line in self.metrics.summary():
+            self.events.emit(INFO, 'metric', '{line}', line=line)
+
+    def report_reads(self):
+        """
+        Prints the number and share of reads served by each site.
+        """
+        directory = self.tm.directory
+        self.events.emit(INFO, 'reads', '~~~~~~~~~~Reads ({policy})~~~~~~~~~~', policy=directory.policy)
+        for site, share in directory.distribution().items():
+            self.events.emit(INFO, 'site_reads', 'Site {site}: {reads} reads ({share:.1%})',
+                             site=site, reads=directory.reads[site], share=share)
+
+    def snapshot(self, path):
+        """
+        Writes the state of all sites and transactions, and the tick, to a file.
+        :param path: file to write
+        """
+        if self.processes:
+            raise ValueError('Sites in worker processes cannot be snapshot')
+        write_snapshot(path, self)
+        self.events.emit(INFO, 'snapshot', 'Snapshot at time {tick} written to {path}',
+                         tick=self.ticker.get_tick(), path=path)
+
+    def restore(self, path):
+        """
+        Replaces the state of all sites and transactions, and the tick, with those of a snapshot. The settings of
+        the transaction manager of the snapshot, e.g. its deadlock mode and isolation level, replace those of this
+        database (see snapshot).
+        :param path: file written by snapshot, from a database of the same topology
+        """
+        if self.processes:
+            raise ValueError('Sites in worker processes cannot be restored')
+        tick, self.sites, self.tm = read_snapshot(path, self)
+        self.ticker.tick = tick
+        tm = self.tm
+        self.deadlock, self.deadlock_timeout = tm.deadlock, tm.deadlock_timeout
+        self.write_mode, self.isolation, self.routing = tm.write_mode, tm.isolation, tm.directory.policy
+        self.group_window, self.group_budget = tm.group_window, tm.group_budget
+        self.events.emit(INFO, 'restore', 'Restored snapshot {path} at time {tick}', tick=tick, path=path)
+
     def fail(self, site):
         """
-        Causes site to fail.
+        Causes site to fail, once the commits it logged are flushed.
         :param site: failing site
         """
-        print('Site {} fails'.format(site))
-        self.sites[int(site)].fail()
+        self.tm.flush_commits(force=True)
+        self.events.emit(INFO, 'fail', 'Site {site} fails', site=site)
+        self.sites[int(site)].fail(self.fail_mode == 'drop')
+        self.tm.directory.fail(int(site))
 
     def recover(self, site):
         """
         Causes site to recover.
         :param site: recovering site
         """
-        print('Recover site {}'.format(site))
-        self.sites[int(site)].recover()
-        self.tm.retry_transaction()
+        self.events.emit(INFO, 'recover', 'Recover site {site}', site=site)
+        # waiters on the locks the site dropped may go ahead, as may waiters on the site
+        released = self.sites[int(site)].recover()
+        self.tm.directory.recover(int(site))
+        self.tm.retry_transaction(vars=released, sites=[int(site)])
 
 
 if __name__ == '__main__':
     ddbms = DDBMS()
+    ddbms.close()
@@ -0,0 +1,104 @@
+'''Replica Directory
+
+Keeps track of which sites are up and which copies of replicated variables can be read, so reads
+go straight to a live, readable copy instead of probing sites one by one. A site that recovers
+cannot serve reads of its replicated variables until a transaction commits a new value of them
+there; unreplicated variables are readable as soon as their site is up.
+
+Reads are routed by a policy ordering the readable copies:
+
+    first         in the order of the topology, so reads of a replicated variable go to its first live site
+    round-robin   starting one copy further for each read of the variable
+    least-locks   the copy on the site with the fewest locked variables first
+    locality      copies on sites the transaction already accessed first, then in the order of the topology
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from collections import Counter
+
+POLICIES = ('first', 'round-robin', 'least-locks', 'locality')
+
+
+class ReplicaDirectory:
+    '''Directory of live and readable copies, updated on fail, recover and commit
+
+    Attributes:
+        topology (Topology): Sites and variables of the database
+        sites (dict): Sites by id, asked for their number of locked variables with least-locks
+        policy (str): Routing policy, one of POLICIES
+        up (set): Ids of the sites that are up
+        fresh (dict): site: replicated variables committed on the site since it last recovered, for
+            sites that have recovered
+        reads (Counter): site: reads routed to the site
+    '''
+
+    def __init__(self, topology, sites=None, policy='first'):
+        '''Inits the directory with all sites up and never recovered'''
+        if policy not in POLICIES:
+            raise ValueError('Unknown routing policy {}'.format(policy))
+        self.topology = topology
+        self.sites = sites if sites is not None else {}
+        self.policy = policy
+        self.up = set(topology.site_ids)
+        self.fresh = {}
+        self.reads = Counter()
+        self._turns = Counter()  # var: reads routed with round-robin
+
+    def fail(self, site):
+        '''Records that site failed'''
+        self.up.discard(site)
+
+    def recover(self, site):
+        '''Records that site recovered, with none of its replicated variables readable'''
+        self.up.add(site)
+        self.fresh[site] = set()
+
+    def commit(self, site, vars):
+        '''Records that a transaction committed on site, making the variables it unlocked there readable
+
+        A recovered site grants read locks only on readable copies, so every variable a commit
+        unlocks is either written by it or already readable.
+
+        Args:
+            site (int): Site the commit was applied on
+            vars (list): Variables unlocked by the commit on site
+        '''
+        fresh = self.fresh.get(site)
+        if fresh is not None:
+            fresh.update(v for v in vars if self.topology.is_replicated(v))
+
+    def readable(self, site, var):
+        '''Returns True if the copy of var on site can be read'''
+        if site not in self.up:
+            return False
+        fresh = self.fresh.get(site)
+        return fresh is None or var in fresh or not self.topology.is_replicated(var)
+
+    def route(self, var, accessed=()):
+        '''Returns the sites to read var from, in the order of the policy
+
+        Args:
+            var (str): Variable being read
+            accessed (dict or set): Sites the reading transaction already accessed, used by locality
+
+        Returns:
+            List of the sites holding a readable copy of var
+        '''
+        sites = [s for s in self.topology.locate(var) if self.readable(s, var)]
+        if len(sites) < 2 or self.policy == 'first':
+            return sites
+        if self.policy == 'round-robin':
+            turn = self._turns[var] % len(sites)
+            self._turns[var] += 1
+            return sites[turn:] + sites[:turn]
+        if self.policy == 'least-locks':
+            return sorted(sites, key=lambda s: self.sites[s].lock_count())
+        return sorted(sites, key=lambda s: s not in accessed)
+
+    def distribution(self):
+        '''Returns the share of reads routed to each site, by site id'''
+        total = sum(self.reads.values())
+        return {s: self.reads[s] / total if total else 0.0 for s in self.topology.site_ids}
@@ -0,0 +1,152 @@
+'''Event Log
+
+This module routes the events of the database to pluggable sinks. Events carry a level, a kind,
+a message template and the fields used to format it; messages are only formatted by the sinks
+that write them.
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+import json
+import sys
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING}
+LEVEL_NAMES = {v: k for k, v in LEVELS.items()}
+
+
+class Event:
+    '''Event of the database
+
+    Attributes:
+        level (int): Level of the event
+        kind (str): Kind of the event, e.g. 'read_value'
+        template (str): Message template, formatted with the fields
+        fields (dict): Structured data of the event
+    '''
+
+    __slots__ = ('level', 'kind', 'template', 'fields')
+
+    def __init__(self, level, kind, template, fields):
+        '''Inits an event'''
+        self.level = level
+        self.kind = kind
+        self.template = template
+        self.fields = fields
+
+    def message(self):
+        '''Returns the human readable message of the event'''
+        return self.template.format(**self.fields)
+
+
+class NullSink:
+    '''Discards all events'''
+
+    def write(self, event):
+        pass
+
+
+class TextSink:
+    '''Writes the message of each event as a line of text, by default to the current sys.stdout'''
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, event):
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write(event.template.format(**event.fields) + '\n')
+
+
+def _jsonable(value):
+    '''Converts values json cannot encode, such as sets of transactions'''
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+
+class JsonSink:
+    '''Writes each event as a JSON line, by default to the current sys.stdout'''
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, event):
+        stream = self.stream if self.stream is not None else sys.stdout
+        record = {'level': LEVEL_NAMES.get(event.level, event.level), 'event': event.kind}
+        record.update(event.fields)
+        stream.write(json.dumps(record, default=_jsonable) + '\n')
+
+
+class MemorySink:
+    '''Keeps events in a list, e.g. for tests
+
+    Attributes:
+        events ([Event]): Events received, oldest first
+    '''
+
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        # copy sets, which the database keeps changing after the event
+        fields = {k: (set(v) if isinstance(v, set) else v) for k, v in event.fields.items()}
+        self.events.append(Event(event.level, event.kind, event.template, fields))
+
+    def kinds(self):
+        '''Returns the kinds of the events received'''
+        return [e.kind for e in self.events]
+
+    def messages(self):
+        '''Returns the messages of the events received'''
+        return [e.message() for e in self.events]
+
+
+SINKS = {
+    'text': TextSink,
+    'json': JsonSink,
+    'null': NullSink,
+}
+
+
+class EventLog:
+    '''Dispatches events at or above a level to sinks
+
+    Without any sink other than NullSink, emit does nothing at all.
+
+    Attributes:
+        sinks (list): Sinks receiving the events
+        level (int): Lowest level of the events dispatched
+    '''
+
+    def __init__(self, sinks=None, level=DEBUG):
+        '''Inits the event log, by default writing text to sys.stdout'''
+        self.sinks = [TextSink()] if sinks is None else [s for s in sinks if not isinstance(s, NullSink)]
+        self.level = level
+        if not self.sinks:
+            self.emit = self._discard
+
+    def enabled(self, level=DEBUG):
+        '''Returns True if events of level reach a sink'''
+        return bool(self.sinks) and level >= self.level
+
+    def emit(self, level, kind, template, **fields):
+        '''
+        Dispatches an event to the sinks.
+        :param level: level of the event
+        :param kind: kind of the event
+        :param template: message template, formatted with fields
+        :param fields: structured data of the event
+        '''
+        if level < self.level:
+            return
+        event = Event(level, kind, template, fields)
+        for sink in self.sinks:
+            sink.write(event)
+
+    def _discard(self, level, kind, template, **fields):
+        pass
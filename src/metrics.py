@@ -0,0 +1,191 @@
+'''Runtime Metrics
+
+This module keeps counters, gauges and histograms fed by the transaction manager, the sites and
+the deadlock detector. Instruments are created on first use and may be keyed, e.g. by site and
+variable. A disabled registry records nothing at all.
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+import json
+
+
+def _label(key):
+    '''Returns the text form of an instrument key, e.g. (1, 'x2') -> '1/x2' '''
+    if isinstance(key, tuple):
+        return '/'.join(str(k) for k in key)
+    return str(key)
+
+
+class Counter:
+    '''Monotonic counts, one per key
+
+    Attributes:
+        values (dict): key: count, with key None for an unkeyed counter
+    '''
+
+    def __init__(self):
+        self.values = {}
+
+    def inc(self, key=None, n=1):
+        '''Adds n to the count of key'''
+        self.values[key] = self.values.get(key, 0) + n
+
+    def total(self):
+        '''Returns the sum of the counts of all keys'''
+        return sum(self.values.values())
+
+    def export(self):
+        if list(self.values) == [None]:
+            return self.values[None]
+        return {_label(k): v for k, v in self.values.items()}
+
+
+class Gauge:
+    '''Value that goes up and down over time
+
+    Attributes:
+        value (int): Latest value
+        max (int): Highest value seen
+        series ([(int, int)]): (tick, value) each time the value changed
+    '''
+
+    def __init__(self):
+        self.value = 0
+        self.max = 0
+        self.series = []
+
+    def set(self, value, tick):
+        '''Sets the value at tick, recording it only if it changed'''
+        if self.series and value == self.value:
+            return
+        self.value = value
+        if value > self.max:
+            self.max = value
+        self.series.append((tick, value))
+
+    def export(self):
+        return {'value': self.value, 'max': self.max, 'series': self.series}
+
+
+class Histogram:
+    '''Distribution of non-negative observations in power of two buckets
+
+    Attributes:
+        count (int): Number of observations
+        sum (int): Sum of observations
+        min (int): Smallest observation
+        max (int): Largest observation
+        buckets (dict): upper bound: number of observations at most the bound and above the previous one
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+
+    def observe(self, value):
+        '''Records one observation'''
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        bound = 1 << max(int(value) - 1, 0).bit_length() if value > 0 else 0
+        self.buckets[bound] = self.buckets.get(bound, 0) + 1
+
+    def mean(self):
+        '''Returns the mean observation, or None without observations'''
+        return self.sum / self.count if self.count else None
+
+    def export(self):
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max, 'mean': self.mean(),
+                'buckets': {str(b): n for b, n in sorted(self.buckets.items())}}
+
+
+class Metrics:
+    '''Registry of the runtime metrics of a database
+
+    When disabled, inc, set and observe do nothing at all, and callers check enabled before
+    computing anything only needed by the metrics.
+
+    Attributes:
+        enabled (bool): Whether metrics are recorded
+        counters (dict): name: Counter
+        gauges (dict): name: Gauge
+        histograms (dict): name: Histogram
+    '''
+
+    def __init__(self, enabled=True):
+        '''Inits an empty registry'''
+        self.enabled = enabled
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        if not enabled:
+            self.inc = self.set = self.observe = self._discard
+
+    def inc(self, name, key=None, n=1):
+        '''
+        Adds n to counter name.
+        :param name: name of the counter
+        :param key: key of the count, e.g. (site, var), or None
+        :param n: amount added
+        '''
+        counter = self.counters.get(name)
+        if counter is None:
+            counter = self.counters[name] = Counter()
+        counter.inc(key, n)
+
+    def set(self, name, value, tick):
+        '''
+        Sets gauge name.
+        :param name: name of the gauge
+        :param value: new value
+        :param tick: tick of the new value
+        '''
+        gauge = self.gauges.get(name)
+        if gauge is None:
+            gauge = self.gauges[name] = Gauge()
+        gauge.set(value, tick)
+
+    def observe(self, name, value):
+        '''
+        Records an observation in histogram name.
+        :param name: name of the histogram
+        :param value: value observed
+        '''
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(value)
+
+    def _discard(self, *args, **kwargs):
+        pass
+
+    def snapshot(self):
+        '''Returns all metrics as a dictionary of plain values'''
+        return {
+            'counters': {n: c.export() for n, c in sorted(self.counters.items())},
+            'gauges': {n: g.export() for n, g in sorted(self.gauges.items())},
+            'histograms': {n: h.export() for n, h in sorted(self.histograms.items())},
+        }
+
+    def summary(self):
+        '''Yields one line of text per instrument'''
+        for name, counter in sorted(self.counters.items()):
+            yield '{}: {}'.format(name, counter.total())
+        for name, gauge in sorted(self.gauges.items()):
+            yield '{}: {} (max {})'.format(name, gauge.value, gauge.max)
+        for name, h in sorted(self.histograms.items()):
+            yield '{}: count {} mean {:.2f} max {}'.format(name, h.count, h.mean() or 0, h.max)
+
+    def write_json(self, path):
+        '''Writes the snapshot of all metrics to the file at path'''
+        with open(path, 'w') as out:
+            json.dump(self.snapshot(), out, indent=2, sort_keys=True)
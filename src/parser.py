@@ -0,0 +1,115 @@
+'''Command Parser
+
+Parses the input language of the database, e.g. R(T1,x1). Input is streamed in buffered chunks, so
+traces of any size are read in constant memory. A plain command line is split with str.partition;
+anything else (spaces around the name, comments, malformed lines) goes to one precompiled pattern.
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+import re
+
+CHUNK_SIZE = 1 << 16
+
+# One line of input: a command name(arg, ...) optionally followed by a // comment,
+# a blank or comment line, or anything else as a malformed line.
+LINE = re.compile(r'[ \t]*(?:(\w+)[ \t]*\(([^()\n]*)\)[ \t\r]*(?://[^\n]*)?|(?://[^\n]*)?\r?|([^\n]*))\n')
+
+
+class ParseError(ValueError):
+    '''Raised for a line that is not a command, a comment or blank'''
+
+
+def _split_args(args):
+    '''Splits the arguments of a command'''
+    if not args or args.isspace():
+        return []
+    if ' ' in args or '\t' in args:
+        return [a.strip() for a in args.split(',')]
+    return args.split(',')
+
+
+def _fast(line):
+    '''Returns (name, [args]) of a line holding nothing but name(args), or None for any other line'''
+    name, _, rest = line.partition('(')
+    args, close, tail = rest.partition(')')
+    if not close or tail or not name.isidentifier() or '(' in args:
+        return None
+    if not args or ' ' in args or '\t' in args:
+        return (name, _split_args(args))
+    return (name, args.split(','))
+
+
+def _malformed(text):
+    return 'cannot parse {!r}'.format(text.strip())
+
+
+def parse_command(line):
+    '''Parses one line of input
+
+    Args:
+        line (str): Line to be parsed, e.g. 'W(T1, x1, 101) // comment'
+
+    Returns:
+        (name, [args]) of the command, or None for a blank or comment line
+
+    Raises:
+        ParseError: if the line is malformed
+    '''
+    line = line.rstrip('\n')
+    command = _fast(line)
+    if command is not None:
+        return command
+    match = LINE.fullmatch(line + '\n')
+    if match is None:
+        raise ParseError(_malformed(line))
+    name, args, bad = match.groups()
+    if bad is not None:
+        raise ParseError(_malformed(bad))
+    if name is None:
+        return None
+    return (name, _split_args(args))
+
+
+def parse_lines(stream, chunk_size=CHUNK_SIZE):
+    '''Parses stream, reading it in chunks of chunk_size characters
+
+    Args:
+        stream: File object to read from
+        chunk_size (int): Number of characters read at a time
+
+    Yields:
+        (line number, name, [args]) for each command, and (line number, None, error) for each
+        malformed line. Blank and comment lines are skipped.
+    '''
+    lineno = 0
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if chunk:
+            text = pending + chunk
+            cut = text.rfind('\n') + 1
+            text, pending = text[:cut], text[cut:]
+        elif pending:
+            text, pending = pending + '\n', ''
+        else:
+            return
+        lines = text.split('\n')
+        lines.pop()  # text ends with a newline
+        for lineno, line in enumerate(lines, lineno + 1):
+            # _fast, inlined
+            name, _, rest = line.partition('(')
+            args, close, tail = rest.partition(')')
+            if close and not tail and name.isidentifier() and '(' not in args:
+                if not args or ' ' in args or '\t' in args:
+                    yield (lineno, name, _split_args(args))
+                else:
+                    yield (lineno, name, args.split(','))
+                continue
+            name, args, bad = LINE.fullmatch(line + '\n').groups()
+            if name is not None:
+                yield (lineno, name, _split_args(args))
+            elif bad is not None:
+                yield (lineno, None, _malformed(bad))
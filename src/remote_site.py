@@ -0,0 +1,288 @@
+'''Sites in Worker Processes
+
+Runs each site of a database in its own worker process. A RemoteSite stands in for the DBSite in
+the process of the transaction manager and forwards requests to the worker over a pipe; the
+events and metrics the worker records are replayed in the parent, so output does not depend on
+where sites run. Requests may be submitted to several workers before any reply is read, which
+lets replicated writes and commits run on all sites at once.
+
+fail kills the worker process and recover starts a new one. Committed versions are stable
+storage: the parent keeps a copy of them and hands it to the new worker, while locks and
+uncommitted values are lost with the process, as with a real crash.
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from .dbsite import DBSite
+from .events import EventLog
+from .metrics import Metrics
+from .ticker import Ticker
+from .topology import Topology
+from .variable import VersionChain
+
+import multiprocessing
+from copy import deepcopy
+
+# fork keeps the topology, whose functions may not be picklable, without sending it
+_CONTEXT = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+
+
+class _EventBuffer:
+    '''Sink keeping the events of a worker until they are sent with the reply'''
+
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        # copy sets, which the site keeps changing after the event
+        fields = {k: (set(v) if isinstance(v, set) else v) for k, v in event.fields.items()}
+        self.events.append((event.level, event.kind, event.template, fields))
+
+    def drain(self):
+        events, self.events = self.events, []
+        return events
+
+
+class _MetricsBuffer:
+    '''Stands in for the metrics registry in a worker, keeping calls until they are sent with the reply'''
+
+    enabled = True
+
+    def __init__(self):
+        self.calls = []
+
+    def inc(self, *args):
+        self.calls.append(('inc', args))
+
+    def set(self, *args):
+        self.calls.append(('set', args))
+
+    def observe(self, *args):
+        self.calls.append(('observe', args))
+
+    def drain(self):
+        calls, self.calls = self.calls, []
+        return calls
+
+
+def _restore(site, versions, accessed):
+    '''
+    Reinstalls committed versions on a new site.
+    :param site: site being restored
+    :param versions: var: VersionChain of the versions committed on the site
+    :param accessed: variables the site had created, in order of creation
+    '''
+    for var in accessed:
+        variable = site.vars[var]
+        chain = versions.get(var)
+        if chain is not None:
+            site.versions_kept += len(chain) - len(variable.versions)
+            variable.versions = deepcopy(chain)
+
+
+def _serve(conn, site_id, topology, level, record_events, record_metrics, state):
+    '''
+    Runs a site in a worker process, answering requests (method, args, tick) until it receives None.
+    Each reply is (result, events, metric calls, variables created) with result an exception if the
+    request raised one.
+    '''
+    events = _EventBuffer()
+    metrics = _MetricsBuffer() if record_metrics else None
+    ticker = Ticker()
+    site = DBSite(site_id, topology, EventLog([events] if record_events else [], level), metrics, ticker)
+    if state is not None:
+        versions, accessed, tick = state
+        ticker.tick = tick
+        _restore(site, versions, accessed)
+        site.recover()
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        method, args, ticker.tick = request
+        created = len(site.vars)
+        try:
+            if method == 'commit':
+                written = [v for v in site.trx_locks.get(args[0], ()) if site.locktable[v][1] == args[0]]
+                released = site.commit(*args)
+                result = (released, [(v,) + site.vars[v].versions.latest() for v in written])
+            elif method == 'state':
+                result = (dict(site.locktable), site.trx_locks)
+            else:
+                result = getattr(site, method)(*args)
+        except Exception as e:
+            result = e
+        new_vars = list(site.vars)[created:] if len(site.vars) > created else ()
+        conn.send((result, events.drain(), metrics.drain() if metrics else (), new_vars))
+    conn.close()
+
+
+class RemoteSite:
+    '''Site of a distributed database running in a worker process
+
+    Attributes:
+        id (int): Site id
+        up (bool): Whether the site is up
+        up_since (int): Tick the site last recovered
+        versions (dict): var: VersionChain of committed versions, kept to restart the worker
+        accessed (dict): Variables created on the site, in order of creation (values unused)
+    '''
+
+    def __init__(self, id, topology=None, events=None, metrics=None, ticker=None):
+        '''
+        Starts the worker process of the site.
+        :param id: site id
+        :param topology: topology of the database, by default ten sites and twenty variables
+        :param events: event log receiving the events of the site, by default printing them
+        :param metrics: metrics registry fed by the site, by default disabled
+        :param ticker: logical clock of the database, by default a new one at tick 0
+        '''
+        self.id = id
+        self.topology = topology if topology is not None else Topology()
+        self.events = events if events is not None else EventLog()
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.ticker = ticker if ticker is not None else Ticker()
+        self.up = True
+        self.up_since = 0
+        self.versions = {}
+        self.accessed = {}
+        self._down_site = None  # DBSite answering in the parent while the worker is dead
+        self._start(None)
+
+    def _start(self, state):
+        '''Starts a worker, restoring state (versions, accessed variables, tick) if given'''
+        self._conn, child = _CONTEXT.Pipe()
+        self._process = _CONTEXT.Process(
+            target=_serve, daemon=True,
+            args=(child, self.id, self.topology, self.events.level, bool(self.events.sinks), self.metrics.enabled,
+                  state))
+        self._process.start()
+        child.close()
+
+    def submit(self, method, *args):
+        '''
+        Sends a request to the worker without waiting for its reply.
+        :param method: DBSite method to run
+        :param args: arguments of the method
+        :return: function returning the result of the request
+        '''
+        if self._down_site is not None:
+            result = getattr(self._down_site, method)(*args)
+            return lambda: result
+        self._conn.send((method, args, self.ticker.get_tick()))
+        if method == 'commit':
+            return lambda: self._committed(self._receive(), args[1])
+        return self._receive
+
+    def _receive(self):
+        '''Reads the reply of the worker, replaying its events and metrics'''
+        result, events, calls, new_vars = self._conn.recv()
+        for level, kind, template, fields in events:
+            self.events.emit(level, kind, template, **fields)
+        for name, args in calls:
+            getattr(self.metrics, name)(*args)
+        for var in new_vars:
+            self.accessed[var] = None
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _call(self, method, *args):
+        return self.submit(method, *args)()
+
+    @property
+    def versions_kept(self):
+        '''Number of committed versions stored over all variables'''
+        if self._down_site is not None:
+            return self._down_site.versions_kept
+        return sum(len(self.versions[v]) if v in self.versions else 1 for v in self.accessed)
+
+    def read(self, trx, is_read_only, timestamp, var):
+        return self._call('read', trx, is_read_only, timestamp, var)
+
+    def write(self, trx, var, val):
+        return self._call('write', trx, var, val)
+
+    def abort(self, trx):
+        return self._call('abort', trx)
+
+    def check_write(self, trx, var):
+        return self._call('check_write', trx, var)
+
+    def lock_write(self, trx, var):
+        return self._call('lock_write', trx, var)
+
+    def commit(self, trx, watermark=None, flush=True):
+        return self._call('commit', trx, watermark, flush)
+
+    def flush_log(self):
+        return self._call('flush_log')
+
+    def lock_count(self):
+        return self._call('lock_count')
+
+    def _committed(self, reply, watermark):
+        '''
+        Records the versions a commit installed, as stable storage for restarting the worker.
+        :param reply: (variables unlocked, [(var, time, value)] committed) from the worker
+        :param watermark: timestamp of the oldest active read-only transaction, if versions are pruned
+        :return: list of variables unlocked
+        '''
+        released, written = reply
+        for var, time, value in written:
+            chain = self.versions.get(var)
+            if chain is None:
+                chain = self.versions[var] = VersionChain(0, self.topology.initial(var))
+            chain.append(time, value)
+            if watermark is not None:
+                chain.prune(watermark)
+        return released
+
+    def querystate(self):
+        return self._call('querystate')
+
+    def dump(self):
+        return self._call('dump')
+
+    def dump_var(self, var):
+        return self._call('dump_var', var)
+
+    def fail(self, drop_state=False):
+        '''
+        Kills the worker process, whose memory is lost whatever drop_state is. Until the site recovers,
+        a site in this process restored from the committed versions, and holding the locks of the worker
+        when it died, answers as a down site.
+        '''
+        locktable, trx_locks = self._call('state')
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        site = DBSite(self.id, self.topology, self.events, self.metrics, self.ticker)
+        _restore(site, self.versions, self.accessed)
+        site.locktable.update(locktable)
+        site.trx_locks = trx_locks
+        site.fail()
+        self._down_site = site
+        self.up = False
+
+    def recover(self):
+        '''
+        Starts a new worker process from the committed versions.
+        :return: list of variables whose locks were dropped, so their waiters can be retried
+        '''
+        released = self._down_site.init_locks()
+        self.accessed = dict.fromkeys(self._down_site.vars)
+        self._down_site = None
+        self._start((self.versions, list(self.accessed), self.ticker.get_tick()))
+        self.up = True
+        self.up_since = self.ticker.get_tick()
+        return released
+
+    def close(self):
+        '''Stops the worker process'''
+        if self._down_site is None and self._process.is_alive():
+            self._conn.send(None)
+            self._process.join()
+            self._conn.close()
@@ -0,0 +1,231 @@
+'''Database Server
+
+Serves the database to concurrent clients over TCP or a Unix socket. Each client sends commands in
+the input language, one per line, and may pipeline them. Commands of all clients are interleaved
+into one transaction manager in order of arrival. Every command line gets one reply line,
+'<n> <result>', where n counts the command lines of the connection from 1:
+
+    <n> ok                   begin, beginRO, W, dump, fail, recover, metrics
+    <n> ok <value>           R
+    <n> committed            end
+    <n> aborted <cause>      any command of an aborted transaction
+    <n> error <message>      malformed or failed commands
+
+A read or write that has to wait is parked: its reply is sent when a retry lets it go through
+or its transaction is aborted, and later commands of the same transaction are held until then.
+Replies of one connection may therefore arrive out of order.
+
+Usage:
+    python -m src.server [-host HOST] [-port PORT | -unix PATH] [-deadlock MODE] [-sites N] [-vars M]
+                         [-replication K] [-log FORMAT] [-level LEVEL]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from .ddbms import DDBMS
+from .events import EventLog, SINKS, LEVELS
+from .parser import ParseError, parse_command
+from .topology import Topology
+from .transaction import TransactionStatus
+from .transaction_manager import TransactionManager
+
+import argparse
+import asyncio
+from collections import deque
+
+# commands whose first argument is a transaction
+TRX_COMMANDS = {'begin', 'beginRO', 'R', 'W', 'end'}
+
+
+class Server:
+    '''Interleaves the commands of many clients into one database
+
+    Attributes:
+        db (DDBMS): Database the commands run on
+        parked (dict): trx: (writer, n) of the read or write trx is waiting to complete
+        held (dict): trx: deque of (writer, n, name, args) of commands waiting behind the parked one
+        detect_interval (float): Seconds between deadlock searches while operations are parked,
+            with periodic deadlock detection
+    '''
+
+    def __init__(self, db, detect_interval=0.05):
+        '''Inits the server and listens for completions of the transaction manager'''
+        self.db = db
+        self.tm.on_complete = self._completed
+        self.parked = {}
+        self.held = {}
+        self.detect_interval = detect_interval
+        self._running = None  # (trx, writer, n) of the read or write being dispatched
+        self._resumed = []  # transactions whose parked operation finished during the current command
+        self._detector = None
+
+    @property
+    def tm(self):
+        '''Transaction manager of the database, replaced when a snapshot is restored'''
+        return self.db.tm
+
+    async def handle(self, reader, writer):
+        '''Serves one connection until the client closes it'''
+        n = 0
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                command = parse_command(line.decode())
+            except ParseError as e:
+                n += 1
+                self._reply(writer, n, 'error ' + str(e))
+                continue
+            if command is None:
+                continue
+            n += 1
+            self.submit(writer, n, *command)
+            await writer.drain()
+        writer.close()
+
+    def submit(self, writer, n, name, args):
+        '''
+        Runs a command, or holds it if its transaction has a parked operation.
+        :param writer: stream the reply is written to
+        :param n: number of the command on its connection
+        :param name: command name, e.g. R
+        :param args: command arguments
+        '''
+        trx = args[0] if name in TRX_COMMANDS and args else None
+        if trx is not None and (trx in self.parked or trx in self.held):
+            self.held.setdefault(trx, deque()).append((writer, n, name, args))
+            return
+        self._execute(writer, n, name, args)
+        self._settle()
+
+    def _execute(self, writer, n, name, args):
+        '''Dispatches a command to the database and replies unless it was parked'''
+        trx = args[0] if name in TRX_COMMANDS and args else None
+        t = self.tm.trxs.get(trx)
+        if name in TRX_COMMANDS and name not in ('begin', 'beginRO'):
+            if t is None:
+                return self._reply(writer, n, 'error unknown transaction {}'.format(trx))
+            if t.status == TransactionStatus.ABORTED:
+                return self._reply(writer, n, self._aborted(trx))
+            if t.status == TransactionStatus.COMMITED:
+                return self._reply(writer, n, 'error {} already committed'.format(trx))
+        if name in ('R', 'W'):
+            self._running = (trx, writer, n)
+        error = 'cannot run {}({})'.format(name, ','.join(args))
+        try:
+            ok = self.db.dispatch(name, args)
+        except (KeyError, ValueError) as e:
+            ok = False
+            error = '{}: {}'.format(type(e).__name__, e)
+        finally:
+            running, self._running = self._running, None
+        if not ok:
+            self._reply(writer, n, 'error ' + error)
+        elif name == 'end':
+            t = self.tm.trxs[trx]
+            self._reply(writer, n, 'committed' if t.status == TransactionStatus.COMMITED else self._aborted(trx))
+        elif name not in ('R', 'W'):
+            self._reply(writer, n, 'ok')
+        elif running is None:
+            pass  # the read or write went through and was answered
+        elif self.tm.is_waiting(trx):
+            self.parked[trx] = (writer, n)
+            self._start_detector()
+        else:
+            self._reply(writer, n, self._aborted(trx))
+
+    def _completed(self, trx, value):
+        '''Replies to a read or write that went through, called back by the transaction manager'''
+        reply = 'ok' if value is None else 'ok {}'.format(value)
+        if self._running is not None and self._running[0] == trx:
+            _, writer, n = self._running
+            self._running = None
+            self._reply(writer, n, reply)
+        elif trx in self.parked:
+            writer, n = self.parked.pop(trx)
+            self._reply(writer, n, reply)
+            self._resumed.append(trx)
+
+    def _settle(self):
+        '''Answers parked operations whose transaction was aborted, and runs commands held behind
+        parked operations that finished, in order'''
+        while True:
+            for trx in [trx for trx in self.parked if self.tm.trxs[trx].status == TransactionStatus.ABORTED]:
+                writer, n = self.parked.pop(trx)
+                self._reply(writer, n, self._aborted(trx))
+                self._resumed.append(trx)
+            if not self._resumed:
+                return
+            trx = self._resumed.pop(0)
+            queue = self.held.get(trx)
+            while queue and trx not in self.parked:
+                self._execute(*queue.popleft())
+            if not queue:
+                self.held.pop(trx, None)
+
+    def _aborted(self, trx):
+        cause = self.tm.trxs[trx].abort_cause
+        return 'aborted {}'.format(cause.name.lower() if cause else 'unknown')
+
+    @staticmethod
+    def _reply(writer, n, result):
+        if not writer.is_closing():
+            writer.write('{} {}\n'.format(n, result).encode())
+
+    def _start_detector(self):
+        '''Searches for deadlocks while operations are parked, as no new command may arrive to do it'''
+        if self.db.deadlock == 'periodic' and (self._detector is None or self._detector.done()):
+            self._detector = asyncio.ensure_future(self._detect())
+
+    async def _detect(self):
+        while self.parked:
+            await asyncio.sleep(self.detect_interval)
+            self.db.detect_and_resolve_cycles()
+            self._settle()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix=None):
+        '''
+        Serves clients until cancelled.
+        :param host: address to listen on
+        :param port: TCP port to listen on, 0 for any free port
+        :param unix: path of a Unix socket to listen on instead of TCP
+        '''
+        server = await self.start(host, port, unix)
+        async with server:
+            await server.serve_forever()
+
+    async def start(self, host='127.0.0.1', port=8765, unix=None):
+        '''Starts listening and returns the asyncio server'''
+        if unix is not None:
+            return await asyncio.start_unix_server(self.handle, unix)
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the database to concurrent clients.")
+    parser.add_argument('-host', default='127.0.0.1', help="Address to listen on.")
+    parser.add_argument('-port', type=int, default=8765, help="TCP port to listen on.")
+    parser.add_argument('-unix', help="Path of a Unix socket to listen on instead of TCP.")
+    parser.add_argument('-deadlock', choices=TransactionManager.DEADLOCK_MODES, default='incremental',
+                        help="Deadlock detection mode.")
+    parser.add_argument('-sites', type=int, default=10, help="Number of sites.")
+    parser.add_argument('-vars', type=int, default=20, help="Number of variables.")
+    parser.add_argument('-replication', type=int,
+                        help="Number of copies of each replicated variable (default: all sites).")
+    parser.add_argument('-log', choices=sorted(SINKS), default='null', help="Output format of events.")
+    parser.add_argument('-level', choices=sorted(LEVELS, key=LEVELS.get), default='info',
+                        help="Lowest level of events written.")
+    args = parser.parse_args()
+    db = DDBMS(deadlock=args.deadlock, topology=Topology(args.sites, args.vars, replication=args.replication),
+               events=EventLog([SINKS[args.log]()], LEVELS[args.level]), start=False)
+    try:
+        asyncio.run(Server(db).serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+'''Snapshots
+
+Saves the whole state of a database to a file and loads it back, so a long simulation can be
+resumed from any tick instead of replayed from tick 0. A snapshot holds the tick, the variables,
+version chains, lock tables and up/down state of every site, and the transaction table with its
+waitlist and waits-for edges, pickled and compressed.
+
+The topology, the event log and the metrics registry are not stored: they stay those of the
+database the snapshot is restored into. Nor are the write-ahead logs of the sites, which stay those
+of that database too, but the snapshot holds the versions each log recovers, and restore writes
+them to the log of the site as a checkpoint, so a site that fails dropping its state after the
+restore recovers what it would have without the snapshot. A log is checkpointed with the
+committed versions in memory of its site if the snapshot was taken without logs. The settings of the
+transaction manager are stored with it, as its running transactions depend on them: the deadlock
+mode and timeout, the write mode, the isolation level, the read routing policy and the group
+commit window and budget of the snapshot replace those of the database it is restored into.
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+import io
+import pickle
+import zlib
+
+MAGIC = b'RCRSNAP2'
+
+
+class SnapshotError(ValueError):
+    '''Raised for a file that is not a snapshot, or a snapshot of a database of another shape'''
+
+
+def _shape(db):
+    '''Returns what the state of db depends on in its configuration'''
+    topology = db.topology
+    return (topology.num_sites, topology.num_vars, topology.replication)
+
+
+class _Pickler(pickle.Pickler):
+    '''Pickles a database, writing references in place of its configuration objects'''
+
+    def __init__(self, file, db):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.refs = {id(db.topology): 'topology', id(db.events): 'events', id(db.metrics): 'metrics',
+                     id(db.ticker): 'ticker'}
+        if db.tm.on_complete is not None:
+            self.refs[id(db.tm.on_complete)] = 'on_complete'
+        for i, site in db.sites.items():
+            if site.wal is not None:
+                self.refs[id(site.wal)] = ('wal', i)
+
+    def persistent_id(self, obj):
+        return self.refs.get(id(obj))
+
+
+class _Unpickler(pickle.Unpickler):
+    '''Loads a pickled database, resolving references to the configuration of db'''
+
+    def __init__(self, file, db):
+        super().__init__(file)
+        self.db = db
+
+    def persistent_load(self, ref):
+        if isinstance(ref, tuple):
+            return self.db.sites[ref[1]].wal
+        if ref == 'on_complete':
+            return self.db.tm.on_complete
+        return getattr(self.db, ref)
+
+
+def write_snapshot(path, db):
+    '''Writes the state of a database to a file
+
+    Args:
+        path (str): File to write
+        db (DDBMS): Database, whose sites run in this process
+    '''
+    buffer = io.BytesIO()
+    pickler = _Pickler(buffer, db)
+    pickler.dump(_shape(db))
+    pickler.dump((db.ticker.get_tick(), db.sites, db.tm))
+    pickler.dump({i: site.log_state()[0] for i, site in db.sites.items() if site.wal is not None})
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(zlib.compress(buffer.getbuffer(), 1))
+
+
+def read_snapshot(path, db):
+    '''Reads the state of a database from a file
+
+    Args:
+        path (str): File written by write_snapshot
+        db (DDBMS): Database of the same topology the state is loaded for
+
+    Returns:
+        (tick, sites, transaction manager) of the snapshot
+
+    Raises:
+        SnapshotError: if the file is not a snapshot, was taken of a database of another topology, or has
+            a site down without its state and db keeps no log for it
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise SnapshotError('{} is not a snapshot'.format(path))
+    unpickler = _Unpickler(io.BytesIO(zlib.decompress(data[len(MAGIC):])), db)
+    shape = unpickler.load()
+    if shape != _shape(db):
+        raise SnapshotError('Snapshot of {} sites and {} variables (replication {}) does not fit this database'
+                            .format(*shape))
+    tick, sites, tm = unpickler.load()
+    logs = unpickler.load()
+    for i, site in sites.items():
+        site.wal = db.sites[i].wal
+        if site.wal is not None:
+            if i in logs:
+                site.wal.checkpoint(logs[i])
+            else:
+                site.checkpoint()
+        elif site.state_lost:
+            raise SnapshotError('Site {} is down without its state, which this database has no log to recover'
+                                .format(i))
+    return (tick, sites, tm)
@@ -1,6 +1,7 @@
-'''System-wide Ticker
+'''Logical Clock
 
-This module records the tick
+This module records the tick of a database. Each database owns its own ticker, shared by its
+sites and transaction manager, so several databases can run in one process without sharing time.
 
 Authors:
     Da Ying (dy877@nyu.edu)
@@ -9,13 +10,20 @@ Authors:
 
 
 class Ticker:
-    '''Records and provides the current tick'''
-    tick = 0
+    '''Records and provides the current tick
 
-    @staticmethod
-    def next_tick():
-        Ticker.tick += 1
+    Attributes:
+        tick (int): Current tick
+    '''
 
-    @staticmethod
-    def get_tick():
-        return Ticker.tick
+    def __init__(self, tick=0):
+        '''Inits the ticker at tick'''
+        self.tick = tick
+
+    def next_tick(self):
+        '''Advances the ticker by one tick'''
+        self.tick += 1
+
+    def get_tick(self):
+        '''Returns the current tick'''
+        return self.tick
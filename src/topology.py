@@ -0,0 +1,160 @@
+'''Database Topology
+
+This module describes the sites and variables of a database, and where each variable is stored.
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+from bisect import bisect_right
+from hashlib import md5
+
+
+def default_placement(index, num_sites, replication=None):
+    '''Odd variable xi is stored on site 1 + (i % num_sites). Even variables are stored on all sites,
+    or with a replication factor k, on the k sites following round-robin from site 1 + (i % num_sites).'''
+    if index % 2 == 0:
+        if replication is None or replication >= num_sites:
+            return range(1, num_sites + 1)
+        return [1 + (index + j) % num_sites for j in range(replication)]
+    return (1 + index % num_sites,)
+
+
+class ConsistentHashPlacement:
+    '''Places variables on a consistent hash ring of sites
+
+    Even variables are stored on the first k distinct sites found clockwise from the
+    hash of the variable, odd variables on the first one only. Adding a site moves only
+    the variables between it and its predecessors on the ring.
+
+    Attributes:
+        vnodes (int): Number of points each site has on the ring
+    '''
+
+    def __init__(self, vnodes=64):
+        '''Inits the placement with vnodes points per site'''
+        self.vnodes = vnodes
+        self._rings = {}  # num_sites: (hashes, sites)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(md5(key.encode()).digest()[:8], 'big')
+
+    def _ring(self, num_sites):
+        ring = self._rings.get(num_sites)
+        if ring is None:
+            points = sorted((self._hash('site{}#{}'.format(s, v)), s)
+                            for s in range(1, num_sites + 1) for v in range(self.vnodes))
+            ring = ([h for h, _ in points], [s for _, s in points])
+            self._rings[num_sites] = ring
+        return ring
+
+    def __call__(self, index, num_sites, replication=None):
+        count = 1
+        if index % 2 == 0:
+            count = num_sites if replication is None else min(replication, num_sites)
+        if count == num_sites:
+            return range(1, num_sites + 1)
+        hashes, sites = self._ring(num_sites)
+        start = bisect_right(hashes, self._hash('x' + str(index)))
+        chosen = []
+        for j in range(len(sites)):
+            s = sites[(start + j) % len(sites)]
+            if s not in chosen:
+                chosen.append(s)
+                if len(chosen) == count:
+                    break
+        return chosen
+
+
+def default_initial_value(index):
+    '''Variable xi starts with the value 10 * i'''
+    return 10 * index
+
+
+PLACEMENTS = {
+    'default': default_placement,
+    'round-robin': default_placement,
+    'consistent-hash': ConsistentHashPlacement(),
+}
+
+
+class Topology:
+    '''Sites and variables of a database
+
+    Variable locations are computed once per variable and shared by the DDBMS, the
+    transaction manager and the sites.
+
+    Attributes:
+        num_sites (int): Number of sites, indexed from 1
+        num_vars (int): Number of variables, x1 to xnum_vars
+        site_ids (tuple(int)): Ids of all sites
+        initial_value (function): Maps a variable index to its initial value
+        placement (function): Maps a variable index, the number of sites and the replication factor
+            to the sites storing it
+        replication (int): Number of copies of a replicated variable, or None to store it on all sites
+    '''
+
+    def __init__(self, num_sites=10, num_vars=20, initial_value=default_initial_value, placement=default_placement,
+                 replication=None):
+        '''Inits a topology, by default ten sites and twenty variables'''
+        self.num_sites = num_sites
+        self.num_vars = num_vars
+        self.site_ids = tuple(range(1, num_sites + 1))
+        self.initial_value = initial_value
+        self.placement = placement
+        self.replication = replication
+        self._locations = {}  # var: (index, sites), filled on first lookup
+        self._site_vars = None  # site: tuple of the variables it stores, built on first use
+
+    def _lookup(self, var):
+        '''Returns (index, sites) of var, computing it on first use'''
+        location = self._locations.get(var)
+        if location is None:
+            try:
+                index = int(var[1:])
+            except ValueError:
+                raise KeyError(var)
+            if var[0] != 'x' or not 1 <= index <= self.num_vars:
+                raise KeyError(var)
+            sites = tuple(self.placement(index, self.num_sites, self.replication))
+            if sites == self.site_ids:
+                sites = self.site_ids  # share the tuple of fully replicated variables
+            location = (index, sites)
+            self._locations[var] = location
+        return location
+
+    def index(self, var):
+        '''Returns the index i of variable xi'''
+        return self._lookup(var)[0]
+
+    def locate(self, var):
+        '''Returns the ids of the sites storing var'''
+        return self._lookup(var)[1]
+
+    def is_replicated(self, var):
+        '''Returns True if var is stored on more than one site'''
+        return len(self._lookup(var)[1]) > 1
+
+    def hosts(self, site, var):
+        '''Returns True if site stores var'''
+        return site in self._lookup(var)[1]
+
+    def initial(self, var):
+        '''Returns the initial value of var'''
+        return self.initial_value(self._lookup(var)[0])
+
+    def vars_on_site(self, site):
+        '''Returns the variables stored on site in increasing order of index
+
+        The variables of every site are listed in one pass over the placement on first use.
+        '''
+        if self._site_vars is None:
+            site_vars = {s: [] for s in self.site_ids}
+            for i in range(1, self.num_vars + 1):
+                var = 'x' + str(i)
+                for s in self.placement(i, self.num_sites, self.replication):
+                    site_vars[s].append(var)
+            self._site_vars = {s: tuple(vars) for s, vars in site_vars.items()}
+        return self._site_vars[site]
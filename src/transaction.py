@@ -16,6 +16,16 @@ class TransactionType(Enum):
     READ_WRITE = 1
 
 
+class AbortCause(Enum):
+    '''Reason a transaction was aborted'''
+    DEADLOCK = 0  # chosen as victim of a deadlock
+    SITE_FAILURE = 1  # a site it accessed failed before it ended
+    WAITING = 2  # ended while an operation was still waiting
+    CONFLICT = 3  # lost a conflict on a variable it read or wrote, checked when it ended
+    PREVENTED = 4  # died or was wounded by wait-die or wound-wait, so no deadlock could form
+    TIMEOUT = 5  # waited on locks for longer than the deadlock timeout
+
+
 class TransactionStatus(Enum):
     '''Status of a transaction'''
     RUNNING = 0
@@ -35,6 +45,8 @@ class Operation:
         val (int): value to write
     '''
 
+    __slots__ = ('type', 'var', 'val')
+
     def __init__(self, o_type, var, val=None):
         '''Inits an operation'''
         self.type = o_type
@@ -52,24 +64,32 @@ class Transaction:
         timestamp (int): Tick when the transaction begins
         type (TransactionType): Type of the transaction
         status (TransactionStatus): Status of the transaction
-        wait_for (set(str)): Id of transactions blocking this transaction
+        wait_for (set(int)): Numbers of the transactions blocking this transaction, as interned in num
         operation (Operation): Operation is waiting for this transaction
         site_access_time ({site(int):time(int)}): Earliest access time table for sites accessed
+        abort_cause (AbortCause): Why the transaction was aborted, if it was
+        num (int): Number the id is interned to while the transaction runs, and freed for reuse when it ends;
+            lock tables and the wait_for sets of other transactions refer to the transaction by it
+        write_set ({var(str):value(int)}): Writes buffered until the transaction ends, with deferred writes
+        write_sites ({var(str):[site(int)]}): Sites the write lock of each buffered write was taken on
+        read_set ({var(str):time(int)}): Variables read without locks, with serializable snapshot isolation or
+            optimistic concurrency control, and the time of the latest commit of each seen by its first read
     '''
 
-    def __init__(self, trx_id, timestamp, trx_type):
+    __slots__ = ('id', 'timestamp', 'type', 'status', 'wait_for', 'operation', 'site_access_time', 'abort_cause',
+                 'num', 'write_set', 'write_sites', 'read_set')
+
+    def __init__(self, trx_id, timestamp, trx_type, num=0):
         '''Inits a transaction'''
         self.id = trx_id
+        self.num = num
         self.timestamp = timestamp
         self.type = trx_type
         self.status = TransactionStatus.RUNNING
         self.wait_for = set()
         self.operation = None
         self.site_access_time = {}  # site id: first success access tick
-
-    def querystate(self):
-        '''Print out the state of the transaction'''
-        print('{}:'.format(self.id))
-        print('started at time {}'.format(self.timestamp))
-        print('type: {}'.format(self.type.name))
-        print('status: {}'.format(self.status.name))
+        self.abort_cause = None
+        self.write_set = {}
+        self.write_sites = {}
+        self.read_set = {}
@@ -7,73 +7,287 @@ Authors:
     Ardi Jusufi (aj2223@nyu.edu)
 '''
 
+from .directory import ReplicaDirectory
+from .events import EventLog, DEBUG, INFO
+from .metrics import Metrics
 from .ticker import Ticker
-from .transaction import TransactionType, Transaction, TransactionStatus, Operation
+from .topology import Topology
+from .transaction import AbortCause, TransactionType, Transaction, TransactionStatus, Operation
+from .util import Util
 
+import heapq
+import time
 from collections import defaultdict
 
 
 class TransactionManager:
     """Manages the transactions read from input, and dispatches them to respective classes for further handling."""
 
-    def __init__(self, sites=None):
+    DEADLOCK_MODES = ('periodic', 'incremental', 'wait-die', 'wound-wait', 'timeout')
+    WRITE_MODES = ('immediate', 'deferred', 'commit-locks')
+    ISOLATION_LEVELS = ('2pl', 'si', 'ssi', 'occ')
+    VALUE_RANGE = (-(1 << 63), (1 << 63) - 1)  # values are logged as 64-bit integers
+
+    def __init__(self, sites=None, deadlock='periodic', topology=None, events=None, metrics=None, ticker=None,
+                 group_window=0, group_budget=None, routing='first', write_mode='immediate', deadlock_timeout=10,
+                 isolation='2pl'):
         """
         Maintains a list of sites and transactions used in the database, as well as a waitlist of all transactions
         waiting to finish execution.
         :param sites: Dictionary of sites to be used in the database indexed by number
+        :param deadlock: 'periodic' to search the whole waits-for graph from the DDBMS every few ticks,
+                         'incremental' to search for a cycle whenever a waits-for edge is added,
+                         'wait-die' to abort a transaction about to wait for an older one,
+                         'wound-wait' to abort the younger transactions one is about to wait for, or
+                         'timeout' to abort transactions waiting on locks for deadlock_timeout ticks
+        :param topology: topology of the database, by default ten sites and twenty variables
+        :param events: event log receiving the events of transactions, by default printing them
+        :param metrics: metrics registry fed by the transaction manager, by default disabled
+        :param ticker: logical clock of the database, shared with the sites; by default a new one at tick 0
+        :param group_window: ticks a group of commits stays open before the logs of its sites are flushed
+                             once and its commits acknowledged together; 0 for no tick window
+        :param group_budget: seconds a group of commits stays open, if not None
+        :param routing: policy choosing the copy a read goes to among the live and readable ones (see directory)
+        :param write_mode: 'immediate' to write values on the sites as writes go through, 'deferred' to take the
+                           write locks then but buffer the values in the transaction until it ends, or
+                           'commit-locks' to also take the write locks only when the transaction ends
+        :param deadlock_timeout: ticks a transaction may wait on locks before it is aborted, with 'timeout'
+        :param isolation: '2pl' for read/write transactions to lock what they read, 'si' for snapshot isolation,
+                          where they read the versions committed before they began without locks, buffer their
+                          writes, and are aborted at end if another transaction committed a write of a variable
+                          they wrote since they began (first committer wins), 'ssi' to also abort them if a
+                          variable they read was overwritten since, which makes snapshot isolation serializable,
+                          or 'occ' for optimistic concurrency control, where they read the latest committed
+                          versions without locks, buffer their writes, and are aborted at end if a variable they
+                          read was overwritten since they read it
         """
+        if deadlock not in self.DEADLOCK_MODES:
+            raise ValueError('Unknown deadlock detection mode {}'.format(deadlock))
+        if write_mode not in self.WRITE_MODES:
+            raise ValueError('Unknown write mode {}'.format(write_mode))
+        if isolation not in self.ISOLATION_LEVELS:
+            raise ValueError('Unknown isolation level {}'.format(isolation))
         self.sites = sites
+        self.deadlock = deadlock
+        self.topology = topology if topology is not None else Topology()
+        self.events = events if events is not None else EventLog()
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self.ticker = ticker if ticker is not None else Ticker()
         self.trxs = {}
-        self.waitlist = []  # transactions waiting to execute ordered by time.
+        # Transactions are interned to dense numbers at begin, and the numbers of finished transactions are
+        # reused, so bitsets of lock holders stay small. Everything below holds numbers; ids are looked up
+        # only for output.
+        self.by_num = []  # number: transaction
+        self.free_nums = []  # heap of numbers of finished transactions
+        self.waitlist = {}  # transactions waiting to execute ordered by time: sequence number
+        self.wait_seq = 0
+        self.var_waiters = {}  # var: transactions waiting on an operation on var, ordered by time
+        self.site_waiters = {}  # site: transactions waiting for site to recover, ordered by time
+        self.waiting_sites = {}  # trx: sites trx is registered to wait on
+        self.wait_since = {}  # trx: tick it started waiting, kept only with metrics enabled or timeouts
+        self.deadlock_timeout = deadlock_timeout
+        self.retries_attempted = 0
+        self.retries_succeeded = 0
+        # running transactions reading from snapshots: timestamp, ordered by begin time; read-only ones,
+        # and read/write ones with snapshot isolation
+        self.active_ro = {}
+        self.on_complete = None  # callback(trx, value) when a read or write of trx goes through, waiting or not
+        self.group_window = group_window
+        self.group_budget = group_budget
+        self.commit_group = []  # (trx, site ids) of commits applied but not yet flushed and acknowledged, in order
+        self.group_opened = None  # (tick, wall time) the first commit of the group was applied
+        self.directory = ReplicaDirectory(self.topology, self.sites, routing)  # told of fail and recover by the DDBMS
+        self.write_mode = write_mode
+        self.isolation = isolation
+        # writes are buffered and locked when the transaction ends
+        self.lock_at_commit = write_mode == 'commit-locks' or isolation != '2pl'
+        self.committed_writes = {}  # var: tick of the latest commit writing it, kept unless isolation is 2pl
 
     def begin(self, trx):
         """
         Initializes a read/write transaction.
         :param trx: Transaction id being started, e.g. 'T1'
         """
-        self.trxs[trx] = Transaction(
-            trx, Ticker.get_tick(), TransactionType.READ_WRITE)
+        t = self._intern(Transaction(trx, self.ticker.get_tick(), TransactionType.READ_WRITE))
+        if self.isolation in ('si', 'ssi'):
+            self.active_ro[t.num] = t.timestamp
 
     def beginRO(self, trx):
         """
         Initializes a read-only transaction.
         :param trx: Transaction id being started, e.g. 'T1'
         """
-        self.trxs[trx] = Transaction(
-            trx, Ticker.get_tick(), TransactionType.READ_ONLY)
+        t = self._intern(Transaction(trx, self.ticker.get_tick(), TransactionType.READ_ONLY))
+        self.active_ro[t.num] = self.ticker.get_tick()
+
+    def _intern(self, t):
+        """
+        Registers a new transaction under its id and gives it the lowest free number.
+        :param t: transaction being started
+        :return: t
+        """
+        if self.free_nums:
+            t.num = heapq.heappop(self.free_nums)
+            self.by_num[t.num] = t
+        else:
+            t.num = len(self.by_num)
+            self.by_num.append(t)
+        self.trxs[t.id] = t
+        return t
+
+    def _release_num(self, t):
+        """
+        Frees the number of a finished transaction, which holds no locks and is in no wait_for.
+        :param t: committed or aborted transaction
+        """
+        if self.by_num[t.num] is t:
+            heapq.heappush(self.free_nums, t.num)
 
-    def retry_transaction(self):
+    def _names(self, nums):
         """
-        Retries all transactions in the waiting list ordered by time when:
-        1. trx end / unavailable variable becomes available or aborts
-        2. site recover, or
-        3. trx abort due to deadlock detection
+        Returns the ids of transactions given by number, for output.
+        :param nums: iterable of transaction numbers
+        :return: list of ids, or set of ids if nums is a set
+        """
+        names = [self.by_num[n].id for n in nums]
+        return set(names) if isinstance(nums, set) else names
+
+    def is_waiting(self, trx):
         """
-        current_waitlist = self.waitlist[:]
-        print('Retry {}'.format(current_waitlist))
-        for trx in current_waitlist:
-            o = self.trxs[trx].operation
+        Returns True if transaction trx is on the waitlist.
+        :param trx: transaction id
+        """
+        t = self.trxs.get(trx)
+        return t is not None and t.num in self.waitlist and self.by_num[t.num] is t
+
+    def version_watermark(self):
+        """
+        Returns the timestamp of the oldest running read-only transaction. Committed versions
+        that no transaction with this timestamp or later can read may be dropped.
+        :return: timestamp of the oldest read-only transaction, or the next tick if there is none
+        """
+        for timestamp in self.active_ro.values():
+            return timestamp
+        return self.ticker.get_tick() + 1
+
+    def retry_transaction(self, vars=(), sites=()):
+        """
+        Retries, ordered by time, the transactions in the waiting list that may proceed when:
+        1. trx end / unavailable variable becomes available or aborts: waiters on the released variables
+        2. site recover: waiters blocked on the site being down, or
+        3. trx abort due to deadlock detection: waiters on the released variables
+        :param vars: variables whose locks were released or that became available
+        :param sites: sites that recovered
+        """
+        candidates = set()
+        for var in vars:
+            candidates.update(self.var_waiters.get(var, ()))
+        for s in sites:
+            candidates.update(self.site_waiters.get(s, ()))
+        if not candidates:
+            return
+        current_waitlist = sorted(candidates, key=self.waitlist.get)
+        if self.events.enabled(DEBUG):
+            self.events.emit(DEBUG, 'retry', 'Retry {trxs}', trxs=self._names(current_waitlist))
+        for n in current_waitlist:
+            # an earlier retry may have completed or aborted trx already
+            if n not in self.waitlist:
+                continue
+            self.retries_attempted += 1
+            t = self.by_num[n]
+            o = t.operation
             if o.type == 'r':
-                self.read(trx, o.var)
+                self.read(t.id, o.var)
             else:
-                self.write(trx, o.var, o.val)
+                self.write(t.id, o.var, o.val)
+            if n not in self.waitlist:
+                self.retries_succeeded += 1
+
+    def _enqueue(self, trx, op, down_sites=()):
+        """
+        Places trx on the waitlist with its blocked operation, or keeps its place if it is already waiting.
+        :param trx: number of the transaction being blocked
+        :param op: operation trx is blocked on
+        :param down_sites: sites trx has to wait to recover
+        """
+        t = self.by_num[trx]
+        if trx not in self.waitlist:
+            self.waitlist[trx] = self.wait_seq
+            self.wait_seq += 1
+            self.var_waiters.setdefault(op.var, {})[trx] = None
+            if self.metrics.enabled or self.deadlock == 'timeout':
+                self.wait_since[trx] = self.ticker.get_tick()
+                self.metrics.set('waitlist_depth', len(self.waitlist), self.ticker.get_tick())
+        elif t.operation.var != op.var:
+            # a waiting trx issued an operation on another variable: move it keeping its place in time
+            self._remove_var_waiter(trx, t.operation.var)
+            waiters = self.var_waiters.setdefault(op.var, {})
+            waiters[trx] = None
+            if len(waiters) > 1:
+                self.var_waiters[op.var] = dict.fromkeys(sorted(waiters, key=self.waitlist.get))
+        t.operation = op
+        self._unregister_sites(trx)
+        if down_sites:
+            self.waiting_sites[trx] = down_sites
+            for s in down_sites:
+                self.site_waiters.setdefault(s, {})[trx] = None
+
+    def _unregister_sites(self, trx):
+        """
+        Removes trx from the wait queues of the sites it is waiting to recover.
+        :param trx: number of the transaction no longer waiting on sites
+        """
+        for s in self.waiting_sites.pop(trx, ()):
+            waiters = self.site_waiters[s]
+            del waiters[trx]
+            if not waiters:
+                del self.site_waiters[s]
+
+    def _dequeue(self, trx):
+        """
+        Removes trx from the waitlist and from the wait queues of its variable and sites.
+        :param trx: number of the transaction no longer waiting
+        :return: variable trx was waiting on, or None if it was not waiting
+        """
+        if trx not in self.waitlist:
+            return None
+        del self.waitlist[trx]
+        t = self.by_num[trx]
+        var = t.operation.var
+        self._remove_var_waiter(trx, var)
+        self._unregister_sites(trx)
+        since = self.wait_since.pop(trx, None)
+        if self.metrics.enabled and since is not None:
+            waited = self.ticker.get_tick() - since
+            self.metrics.observe('wait_ticks', waited)
+            self.metrics.inc('trx_wait_ticks', t.id, waited)
+            self.metrics.set('waitlist_depth', len(self.waitlist), self.ticker.get_tick())
+        return var
+
+    def _remove_var_waiter(self, trx, var):
+        """
+        Removes trx from the wait queue of variable var.
+        :param trx: number of the transaction no longer waiting on var
+        :param var: variable trx was waiting on
+        """
+        waiters = self.var_waiters[var]
+        del waiters[trx]
+        if not waiters:
+            del self.var_waiters[var]
 
     def _wait_for_write(self, trx, var):
         """
         When a read/write trx wishes to acquire a read lock on var, it must ensure
         there is no other write transaction that is waiting to access it before trx.
-        :param trx: r/w transaction seeking access to the variable
+        :param trx: number of the r/w transaction seeking access to the variable
         :param var: variable that is sought to be read
-        :return: transaction that is waiting to write on var ahead of trx, *if any*. Default is None.
-        """
-        current_waitlist = self.waitlist
-        if trx in current_waitlist:
-            index = current_waitlist.index(trx)
-            current_waitlist = current_waitlist[:index]
-        for t in current_waitlist:
-            op = self.trxs[t].operation
-            if op.type == 'w' and op.var == var:
-                return t
+        :return: number of the transaction that is waiting to write on var ahead of trx, *if any*. Default is None.
+        """
+        for n in self.var_waiters.get(var, ()):
+            if n == trx:
+                break
+            if self.by_num[n].operation.type == 'w':
+                return n
         return None
 
     def read(self, trx, var):
@@ -84,124 +298,291 @@ class TransactionManager:
 
         :param trx: Transaction attempting to read variable
         :param var: Variable being read
+        :return: value read, or None if the read is waiting
         """
-        print('Read {} for {}'.format(var, trx))
+        self.events.emit(INFO, 'read', 'Read {var} for {trx}', trx=trx, var=var)
         t = self.trxs[trx]
         if t.status == TransactionStatus.ABORTED or t.status == TransactionStatus.COMMITED:
-            print('{} is already aborted or commited'.format(trx))
+            self.events.emit(INFO, 'finished', '{trx} is already aborted or commited', trx=trx)
             return
 
+        n = t.num
+        # a transaction reads its own buffered write without going to a site
+        if var in t.write_set:
+            value = t.write_set[var]
+            self.events.emit(INFO, 'read_value', '{var} has buffered value {value}', var=var, value=value, site=None)
+            self.events.emit(INFO, 'read_success', 'Read success', trx=trx, var=var, site=None, value=value)
+            self._dequeue(n)
+            t.status = TransactionStatus.RUNNING
+            if self.on_complete is not None:
+                self.on_complete(trx, value)
+            return value
+
+        # without locks, read/write transactions read like read-only ones: what committed up to the tick
+        # they began with snapshot isolation (nothing commits in that tick, except the initial values at
+        # time 0), or up to now with optimistic concurrency control
+        snapshot = t.type == TransactionType.READ_ONLY or self.isolation != '2pl'
+        timestamp = t.timestamp
+        if self.isolation == 'occ' and t.type == TransactionType.READ_WRITE:
+            timestamp = self.ticker.get_tick() + 1
+        elif snapshot and t.type == TransactionType.READ_WRITE:
+            timestamp = t.timestamp + 1
         # check if there is a write operation for same variable already waiting
         # in front of this trx:
-        blocking_trx = self._wait_for_write(trx, var)
+        blocking_trx = None if snapshot and t.type == TransactionType.READ_WRITE else self._wait_for_write(n, var)
 
         # There is no write operation ahead of trx, so we can proceed with the
         # read:
         if blocking_trx is None:
-            potential_sites = self._locate_var(var)
-            for s in potential_sites:
+            for s in self.directory.route(var, t.site_access_time):
                 # read success
                 site = self.sites[s]
-                success, blocking_trx = site.read(
-                    t.id, t.type == TransactionType.READ_ONLY, t.timestamp, var)
+                success, blocking_trx, value = site.read(n, snapshot, timestamp, var)
                 if success:
-                    print('Read success')
-                    if trx in self.waitlist:
-                        self.waitlist.remove(trx)
+                    self.events.emit(INFO, 'read_success', 'Read success', trx=trx, var=var, site=s, value=value)
+                    self.directory.reads[s] += 1
+                    self.metrics.inc('site_reads', s)
+                    self._dequeue(n)
                     t.status = TransactionStatus.RUNNING
                     if t.type == TransactionType.READ_WRITE:
-                        t.site_access_time[s] = Ticker.get_tick()
-                    return
+                        t.site_access_time[s] = self.ticker.get_tick()
+                        if self.isolation in ('ssi', 'occ'):
+                            t.read_set.setdefault(var, self.committed_writes.get(var, -1))
+                    if self.on_complete is not None:
+                        self.on_complete(trx, value)
+                    return value
                 elif blocking_trx is not None:
                     break
 
         # read fail
-        print('Read fail')
+        self.events.emit(INFO, 'read_fail', 'Read fail', trx=trx, var=var)
+        # edges left from an earlier wait are searched again when trx starts waiting anew
+        was_waiting = n in self.waitlist
         t.status = TransactionStatus.WAITING
-        t.operation = Operation('r', var)
-        if trx not in self.waitlist:
-            self.waitlist.append(trx)
+        down_sites = ()
+        if blocking_trx is None:
+            down_sites = [s for s in self._locate_var(var) if not self.sites[s].up]
+        self._enqueue(n, Operation('r', var), down_sites)
         # fail because some trx hold write lock on var
 
+        new_edges = []
         if blocking_trx is not None:
-            print('Blocked by {}'.format(blocking_trx))
+            self.events.emit(INFO, 'blocked', 'Blocked by {blocking}', trx=trx,
+                             blocking=self.by_num[blocking_trx].id)
+            if blocking_trx not in t.wait_for or not was_waiting:
+                new_edges.append(blocking_trx)
             t.wait_for.add(blocking_trx)
-        if (t.wait_for):
-            print('Wait-for list: ', t.wait_for)
+        if t.wait_for and self.events.enabled(DEBUG):
+            self.events.emit(DEBUG, 'wait_for', 'Wait-for list:  {wait_for}', trx=trx,
+                             wait_for=self._names(t.wait_for))
+        if new_edges:
+            self._on_wait(n, new_edges)
 
     def _locate_var(self, var):
         """
-        Returns a list of sites where a variable is stored. If the variable is even, it is stored on all sites.
-        If odd, it is stored on site with index 1 + (index % 10), e.g. x3 is stored on site 1 + (3 % 10) = 4.
+        Returns a list of sites where a variable is stored, as given by the topology.
         :param var: Variable whose site location is being requested
         :return: list of sites where the variable is stored
         """
-        var_id = int(var[1:])
-        if var_id % 2 == 0:
-            return self.sites.keys()
-        else:
-            return [1 + (var_id % 10)]
+        return self.topology.locate(var)
+
+    def _fan_out(self, site_ids, method, *args):
+        """
+        Sends a request to several sites before collecting any result, so sites running in
+        worker processes serve it concurrently.
+        :param site_ids: ids of the sites receiving the request
+        :param method: name of the site method to run, e.g. 'write'
+        :param args: arguments of the method
+        :return: list of results, in the order of site_ids
+        """
+        pending = [self.sites[s].submit(method, *args) for s in site_ids]
+        return [result() for result in pending]
 
     def write(self, trx, var, val):
         """
-        Attempts to write a value on a variable on all active sites that store it. If the write is not successful,
+        Attempts to write a value on a variable on all active sites that store it. The write is first checked
+        on every site without changing anything, and applied on all active sites only if none of them blocks it,
+        so a blocked write leaves no lock or value behind. If the write is not successful,
         the transaction is placed on the waitlist. It either prints that the value was written successfully,
         or displays a message if not.
 
         :param trx: write transaction attempting to write value val on the variable var
         :param var: variable being updated
         :param val: value being written on variable
+        :raises ValueError: if val does not fit in a 64-bit integer, before any site sees the write
         """
-        print('Write {} = {} for {}'.format(var, val, trx))
+        lo, hi = self.VALUE_RANGE
+        if not lo <= val <= hi:
+            raise ValueError('Value {} out of range [{}, {}]'.format(val, lo, hi))
+        self.events.emit(INFO, 'write', 'Write {var} = {value} for {trx}', trx=trx, var=var, value=val)
         t = self.trxs[trx]
         if t.status == TransactionStatus.ABORTED or t.status == TransactionStatus.COMMITED:
-            print('{} is already aborted or commited'.format(trx))
+            self.events.emit(INFO, 'finished', '{trx} is already aborted or commited', trx=trx)
             return
 
+        n = t.num
+        if self.lock_at_commit:
+            t.write_set[var] = val
+            self.events.emit(INFO, 'write_buffered', 'Write buffered', trx=trx, var=var)
+            self._dequeue(n)
+            t.status = TransactionStatus.RUNNING
+            if self.on_complete is not None:
+                self.on_complete(trx, None)
+            return
+
+        new_edges = []
         potential_sites = self._locate_var(var)
         success_sites = []
-        success = True
         blocking_trx = set()
-        for s in potential_sites:
-            site = self.sites[s]
-            site_success, site_blocking_trx = site.write(trx, var, val)
+        for s, (site_success, site_blocking_trx) in zip(
+                potential_sites, self._fan_out(potential_sites, 'check_write', n, var)):
             if site_success:
                 success_sites.append(s)
-            # if its blocked by site or not blocked, site_blocking_trx will be
-            # empty list
+            # if site is down, site_blocking_trx will be empty list, which
+            # doesn't mean the write will fail
             blocking_trx.update(site_blocking_trx)
-            # if site is down, doesn't mean the write will fail
-            if not site_success and not site_blocking_trx:
-                site_success = True
-            success = success and site_success
 
-        # if success, var uncommited value will have been all updated
-        # success and there is site in success site
+        # if not blocked, apply the write on every site that accepts it
         # if all sites down, success sites will be empty
-        if success and success_sites:
-            print('Write success')
-            if trx in self.waitlist:
-                self.waitlist.remove(trx)
+        if not blocking_trx and success_sites:
+            if self.write_mode == 'immediate':
+                self._fan_out(success_sites, 'write', n, var, val)
+            else:
+                self._fan_out(success_sites, 'lock_write', n, var)
+                t.write_set[var] = val
+                locked = t.write_sites.setdefault(var, [])
+                locked.extend(s for s in success_sites if s not in locked)
+            self.events.emit(INFO, 'write_success', 'Write success', trx=trx, var=var, sites=success_sites)
+            self._dequeue(n)
             t.status = TransactionStatus.RUNNING
             for s in success_sites:
                 if s not in t.site_access_time:
-                    t.site_access_time[s] = Ticker.get_tick()
+                    t.site_access_time[s] = self.ticker.get_tick()
+            if self.on_complete is not None:
+                self.on_complete(trx, None)
         else:
             # blocked by other trx
-            print('Write fail')
+            self.events.emit(INFO, 'write_fail', 'Write fail', trx=trx, var=var)
             if blocking_trx:
-                print('Blocked by {}'.format(blocking_trx))
+                if self.events.enabled(INFO):
+                    self.events.emit(INFO, 'blocked', 'Blocked by {blocking}', trx=trx,
+                                     blocking=self._names(blocking_trx))
+                # edges left from an earlier wait are searched again when trx starts waiting anew
+                was_waiting = n in self.waitlist
+                new_edges = [b for b in sorted(blocking_trx) if b not in t.wait_for or not was_waiting]
                 t.wait_for.update(blocking_trx)
-                for s in potential_sites:
-                    self.sites[s].release_write_lock(trx, var)
             else:
-                print('No available sites')
+                self.events.emit(INFO, 'no_sites', 'No available sites', trx=trx, var=var)
             t.status = TransactionStatus.WAITING
-            t.operation = Operation('w', var, val)
-            if trx not in self.waitlist:
-                self.waitlist.append(trx)
-        if (t.wait_for):
-            print('Wait-for list: ', t.wait_for)
+            self._enqueue(n, Operation('w', var, val), [] if blocking_trx else potential_sites)
+        if t.wait_for and self.events.enabled(DEBUG):
+            self.events.emit(DEBUG, 'wait_for', 'Wait-for list:  {wait_for}', trx=trx,
+                             wait_for=self._names(t.wait_for))
+        if new_edges:
+            self._on_wait(n, new_edges)
+
+    def _on_wait(self, trx, blockers):
+        """
+        Handles the waits-for edges trx -> blockers that have just been added, as the deadlock mode says:
+        searches for a cycle through them, or lets wait-die or wound-wait abort a transaction.
+        :param trx: number of the transaction that started waiting
+        :param blockers: numbers of the transactions trx has just started waiting for
+        """
+        if self.deadlock == 'incremental':
+            self._detect_deadlock(trx, blockers)
+        elif self.deadlock == 'wait-die':
+            self._wait_die(trx, blockers)
+        elif self.deadlock == 'wound-wait':
+            self._wound_wait(trx, blockers)
+
+    def _wait_die(self, trx, blockers):
+        """
+        Aborts trx if it is younger than any of the transactions it would wait for, so transactions
+        only ever wait for younger ones and no cycle can form.
+        :param trx: number of the transaction that started waiting
+        :param blockers: numbers of the transactions trx has just started waiting for
+        """
+        t = self.by_num[trx]
+        older = [b for b in blockers if self.by_num[b].timestamp < t.timestamp]
+        if older:
+            if self.events.enabled(INFO):
+                self.events.emit(INFO, 'die', '{trx} dies rather than wait for older {older}', trx=t.id,
+                                 older=self._names(older))
+            self.abort(t.id, AbortCause.PREVENTED)
+
+    def _wound_wait(self, trx, blockers):
+        """
+        Aborts the transactions younger than trx that it would wait for, so transactions only ever
+        wait for older ones and no cycle can form. trx is retried as their locks are released.
+        :param trx: number of the transaction that started waiting
+        :param blockers: numbers of the transactions trx has just started waiting for
+        """
+        t = self.by_num[trx]
+        for b in blockers:
+            # an earlier wound may have let trx go ahead, and frees the number of the wounded transaction
+            if trx not in self.waitlist or b not in t.wait_for:
+                continue
+            victim = self.by_num[b]
+            if victim.timestamp > t.timestamp:
+                self.events.emit(INFO, 'wound', '{trx} wounds younger {victim}', trx=t.id, victim=victim.id)
+                self.abort(victim.id, AbortCause.PREVENTED)
+
+    def abort_timed_out(self):
+        """
+        Aborts, oldest wait first, the transactions that have waited on locks for deadlock_timeout ticks
+        or more. Transactions waiting for a site to recover are left waiting.
+        """
+        deadline = self.ticker.get_tick() - self.deadlock_timeout
+        expired = []
+        # the waitlist is ordered by the tick transactions started waiting
+        for n in self.waitlist:
+            if self.wait_since[n] > deadline:
+                break
+            if n not in self.waiting_sites:
+                expired.append(n)
+        for n in expired:
+            # aborting an earlier one may have let n go ahead
+            if n in self.waitlist:
+                t = self.by_num[n]
+                self.events.emit(INFO, 'timeout', '{trx} waited on locks since {since}', trx=t.id,
+                                 since=self.wait_since[n])
+                self.abort(t.id, AbortCause.TIMEOUT)
+
+    def _detect_deadlock(self, trx, blockers):
+        """
+        Checks whether the new waits-for edges trx -> blockers close a cycle, searching only what
+        is reachable from the blockers. Each cycle found is resolved by aborting its youngest transaction,
+        until no cycle through the new edges is left.
+        :param trx: number of the transaction that started waiting
+        :param blockers: numbers of the transactions trx has just started waiting for
+        """
+        t = self.by_num[trx]
+        for b in blockers:
+            # one edge may close several cycles: search again until none is left or the edge is gone
+            while t.status != TransactionStatus.ABORTED and b in t.wait_for:
+                cycle = Util.find_cycle(lambda k: self.by_num[k].wait_for, b, trx)
+                if cycle is None:
+                    break
+                self.resolve_cycle(cycle)
+
+    def resolve_cycle(self, cycle):
+        """
+        Resolves a deadlock by aborting the youngest transaction (with the latest timestamp) in cycle.
+        :param cycle: list of numbers of the transactions forming a cycle in the waits-for graph
+        """
+        if self.events.enabled(INFO):
+            self.events.emit(INFO, 'deadlock', 'Detected cycle:  {cycle}', cycle=self._names(cycle))
+        self.metrics.inc('deadlock_cycles')
+        self.metrics.observe('deadlock_cycle_length', len(cycle))
+        latest_timestamp = 0
+        youngest_transaction = None
+        for n in cycle:
+            t = self.by_num[n]
+            if(t.timestamp > latest_timestamp):
+                latest_timestamp = t.timestamp
+                youngest_transaction = t.id
+        self.metrics.inc('deadlock_victims', youngest_transaction)
+        self.abort(youngest_transaction, AbortCause.DEADLOCK)
 
     def _remove_wait_for_edge(self, trx):
         '''
@@ -210,76 +591,203 @@ class TransactionManager:
         at the end of this procedure it won't wait anymore.
         This is needed for solving and preventing deadlocks.
 
-        :param trx: Transaction that is being aborted/ended
+        :param trx: number of the transaction that is being aborted/ended
         '''
-        for transaction, t in self.trxs.items():
+        for t in self.by_num:
             if (trx in t.wait_for):
                 t.wait_for.remove(trx)
 
-    def abort(self, trx):
+    def abort(self, trx, cause=None):
         """
         Aborts transaction trx and retries transactions on the waitlist,
         because any transaction that was waiting for trx can now proceed.
 
         :param trx: transaction being aborted
+        :param cause: AbortCause of the abort
         """
-        if trx in self.waitlist:
-            self.waitlist.remove(trx)
-        print('{} aborted'.format(trx))
-        self.trxs[trx].status = TransactionStatus.ABORTED
-
-        if self.trxs[trx].type == TransactionType.READ_WRITE:
-            for s in self.sites:
-                self.sites[s].abort(trx)
-            self._remove_wait_for_edge(trx)
-            self.retry_transaction()
+        t = self.trxs[trx]
+        n = t.num
+        # trx holds locks only on the sites it accessed; sites it waits on are released too, to be safe
+        held_sites = sorted(set(t.site_access_time).union(self.waiting_sites.get(n, ())))
+        waited_var = self._dequeue(n)
+        self.events.emit(INFO, 'abort', '{trx} aborted', trx=trx, cause=cause.name if cause else None)
+        t.status = TransactionStatus.ABORTED
+        t.abort_cause = cause
+        self.metrics.inc('aborts', cause.name.lower() if cause else None)
+        self.active_ro.pop(n, None)
+
+        if t.type == TransactionType.READ_WRITE:
+            released = set()
+            for site_released in self._fan_out(held_sites, 'abort', n):
+                released.update(site_released)
+            self._remove_wait_for_edge(n)
+            t.wait_for.clear()
+            self._release_num(t)
+            # readers queued behind a waiting write may now go ahead
+            if waited_var is not None:
+                released.add(waited_var)
+            self.retry_transaction(vars=released)
+        else:
+            self._release_num(t)
 
     def end(self, trx):
         """
         Attempts to commit transaction trx if possible.
         :param trx: transaction trying to be committed
         """
-        if trx in self.waitlist:
-            self.abort(trx)
-            return
         t = self.trxs[trx]
+        if t.status == TransactionStatus.ABORTED or t.status == TransactionStatus.COMMITED:
+            self.events.emit(INFO, 'finished', '{trx} is already aborted or commited', trx=trx)
+            return
+        if t.num in self.waitlist:
+            self.abort(trx, AbortCause.WAITING)
+            return
         if t.type == TransactionType.READ_ONLY:
-            print('READ ONLY {} commited'.format(trx))
+            self.events.emit(INFO, 'commit', 'READ ONLY {trx} commited', trx=trx)
             t.status = TransactionStatus.COMMITED
+            self.active_ro.pop(t.num, None)
+            self._release_num(t)
+            self.metrics.inc('commits', 'read_only')
             return
         t_site_access_time = t.site_access_time
 
         for s in t_site_access_time:
             if t_site_access_time[s] < self.sites[s].up_since or not self.sites[s].up:
-                print(
-                    'Site {}, accessed by {} at {}, but up since {} or still down'.format(s, trx, t_site_access_time[s],
-                                                                                          self.sites[s].up_since))
-                self.abort(trx)
+                self.events.emit(INFO, 'site_validation_fail',
+                                 'Site {site}, accessed by {trx} at {access_time}, '
+                                 'but up since {up_since} or still down',
+                                 site=s, trx=trx, access_time=t_site_access_time[s], up_since=self.sites[s].up_since)
+                self.abort(trx, AbortCause.SITE_FAILURE)
                 return
+        if self.isolation != '2pl' and not self._validate(t):
+            return
+        if t.write_set and not self._install_writes(t):
+            return
         # pass validation
-        for s in t_site_access_time:
-            self.sites[s].commit(trx)
-        self._remove_wait_for_edge(trx)
+        self.active_ro.pop(t.num, None)
+        watermark = self.version_watermark()
+        grouped = self.group_window > 0 or self.group_budget is not None
+        released = set()
+        for s, site_released in zip(t_site_access_time,
+                                    self._fan_out(t_site_access_time, 'commit', t.num, watermark, not grouped)):
+            self.directory.commit(s, site_released)
+            released.update(site_released)
+        if self.isolation != '2pl':
+            for var in t.write_set:
+                self.committed_writes[var] = self.ticker.get_tick()
+        self._remove_wait_for_edge(t.num)
         t.status = TransactionStatus.COMMITED
-        print('READ WRITE {} commited'.format(trx))
-        self.retry_transaction()
+        self._release_num(t)
+        if grouped:
+            if not self.commit_group:
+                self.group_opened = (self.ticker.get_tick(), time.perf_counter())
+            self.commit_group.append((trx, list(t_site_access_time)))
+        else:
+            self._acknowledge(trx)
+        self.retry_transaction(vars=released)
+
+    def _validate(self, t):
+        """
+        Validates t against the transactions that committed while it ran. With snapshot isolation, aborts t
+        if a transaction that committed after t began wrote a variable t wrote (first committer wins) or, with
+        serializable snapshot isolation, a variable t read, unless t wrote nothing. Every dependency between
+        committed transactions then goes forward in the order of their commits (of their begins, for
+        transactions that wrote nothing), so their serialization graph has no cycle. With optimistic
+        concurrency control, aborts t if a variable it read was written by a commit after it read it,
+        so t could have done all its reads as it commits.
+        :param t: read/write transaction ending without having locked what it read
+        :return: True if t may commit, False if it was aborted
+        """
+        if self.isolation == 'occ':
+            checked = [('read', var, seen) for var, seen in t.read_set.items()]
+        else:
+            checked = [('wrote', var, t.timestamp) for var in t.write_set]
+            if self.isolation == 'ssi' and t.write_set:
+                checked.extend(('read', var, t.timestamp) for var in t.read_set)
+        for verb, var, since in checked:
+            committed = self.committed_writes.get(var)
+            if committed is not None and committed > since:
+                self.events.emit(INFO, 'validation_conflict',
+                                 '{var} {verb} by {trx} was written by a commit at time {time}',
+                                 var=var, verb=verb, trx=t.id, time=committed)
+                self.abort(t.id, AbortCause.CONFLICT)
+                return False
+        return True
+
+    def _install_writes(self, t):
+        """
+        Writes the values buffered by t on the sites it holds their write locks on. With locks taken at commit,
+        first takes the write locks on all live copies of every buffered variable, if none of them is held by
+        another transaction; otherwise t is aborted without waiting.
+        :param t: transaction ending with buffered writes
+        :return: True if the writes were installed, False if t was aborted
+        """
+        n = t.num
+        if self.lock_at_commit:
+            for var in t.write_set:
+                potential_sites = self._locate_var(var)
+                checked = self._fan_out(potential_sites, 'check_write', n, var)
+                blocking_trx = {b for _, site_blocking_trx in checked for b in site_blocking_trx}
+                success_sites = [s for s, (site_success, _) in zip(potential_sites, checked) if site_success]
+                if blocking_trx or not success_sites:
+                    if self.events.enabled(INFO):
+                        self.events.emit(INFO, 'commit_conflict', '{trx} cannot lock {var} at commit', trx=t.id,
+                                         var=var, blocking=self._names(blocking_trx))
+                    self.abort(t.id, AbortCause.CONFLICT if blocking_trx else AbortCause.SITE_FAILURE)
+                    return False
+                t.write_sites[var] = success_sites
+            for sites in t.write_sites.values():
+                for s in sites:
+                    t.site_access_time.setdefault(s, self.ticker.get_tick())
+        for var, val in t.write_set.items():
+            self._fan_out(t.write_sites[var], 'write', n, var, val)
+        return True
+
+    def _acknowledge(self, trx):
+        self.events.emit(INFO, 'commit', 'READ WRITE {trx} commited', trx=trx)
+        self.metrics.inc('commits', 'read_write')
+
+    def flush_commits(self, force=False):
+        """
+        Closes the group of commits once its window or time budget has passed: flushes the log of
+        every site the group wrote to once, then acknowledges the commits in the order they were
+        applied. Locks and versions are released as each commit is applied, so a transaction that
+        read a grouped commit commits in the same group or a later one.
+        :param force: if True, closes the group whether or not it is due
+        :return: number of commits acknowledged
+        """
+        if not self.commit_group:
+            return 0
+        tick, opened = self.group_opened
+        if not (force or (self.group_window > 0 and self.ticker.get_tick() - tick >= self.group_window)
+                or (self.group_budget is not None and time.perf_counter() - opened >= self.group_budget)):
+            return 0
+        group, self.commit_group = self.commit_group, []
+        self._fan_out(sorted({s for _, site_ids in group for s in site_ids}), 'flush_log')
+        for trx, _ in group:
+            self._acknowledge(trx)
+        self.metrics.observe('group_commit_size', len(group))
+        return len(group)
 
     def _generate_waits_for_graph(self):
         """
         Generates a waits-for graph of all transactions, which is used for cycle detection
         in resolving deadlocks.
 
-        :return: dictionary which for each transaction trx
-                 maintains a list of other transactions that trx is waiting for to finish
+        :return: dictionary which for the number of each transaction trx
+                 maintains the numbers of other transactions that trx is waiting for to finish
         """
         graph = defaultdict(list)
-        for trx, t in self.trxs.items():
-            graph[trx] = t.wait_for
+        for t in self.by_num:
+            graph[t.num] = t.wait_for
         return graph
 
     def querystate(self):
         """
         Calls and subsequently prints the state of transactions.
         """
-        for t in self.trxs:
-            self.trxs[t].querystate()
+        if not self.events.enabled(INFO):
+            return
+        for t in self.trxs.values():
+            self.events.emit(INFO, 'trx_state', '{trx}:\nstarted at time {timestamp}\ntype: {type}\nstatus: {status}',
+                             trx=t.id, timestamp=t.timestamp, type=t.type.name, status=t.status.name)
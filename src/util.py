@@ -47,20 +47,29 @@ class DetectCycles():
     def dfs_visit(self, graph, node):
         """
         Performs DFS on graph starting on node. Stores cycles as they are encountered.
+        The search keeps an explicit stack, so long wait chains do not hit the recursion limit.
         :param graph: graph complete with directed edges where the DFS is performed
         :param node: start node for the DFS
         """
         self.node_colors[node] = NodeColor.GRAY
         self.chain_of_nodes.append(node)
-        for neighbor in graph[node]:
-            if self.node_colors[neighbor] == NodeColor.WHITE:
-                self.node_parents[neighbor] = node
-                self.dfs_visit(graph, neighbor)
-            # Just encountered a visited node -- this is a cycle:
-            elif self.node_colors[neighbor] == NodeColor.GRAY:
-                self.cycles.append(self.dfs_get_cycle(neighbor))
-        self.node_colors[node] = NodeColor.BLACK
-        self.chain_of_nodes = self.chain_of_nodes[:-1]
+        stack = [(node, iter(graph[node]))]
+        while stack:
+            current, neighbors = stack[-1]
+            for neighbor in neighbors:
+                if self.node_colors[neighbor] == NodeColor.WHITE:
+                    self.node_parents[neighbor] = current
+                    self.node_colors[neighbor] = NodeColor.GRAY
+                    self.chain_of_nodes.append(neighbor)
+                    stack.append((neighbor, iter(graph[neighbor])))
+                    break
+                # Just encountered a visited node -- this is a cycle:
+                elif self.node_colors[neighbor] == NodeColor.GRAY:
+                    self.cycles.append(self.dfs_get_cycle(neighbor))
+            else:
+                self.node_colors[current] = NodeColor.BLACK
+                self.chain_of_nodes.pop()
+                stack.pop()
 
     def dfs_get_cycle(self, node):
         """
@@ -88,3 +97,30 @@ class Util:
         :return: list of cycles in graph, if any
         """
         return DetectCycles().get_cycles(graph)
+
+    @staticmethod
+    def find_cycle(successors, start, target):
+        """
+        Searches for a path from start back to target, i.e. the cycle closed by a new edge target -> start.
+        The search is iterative and only visits nodes reachable from start.
+        :param successors: function returning the nodes a node has edges to
+        :param start: head of the new edge
+        :param target: tail of the new edge
+        :return: list of nodes in the cycle beginning with target, or None if there is no cycle
+        """
+        visited = {start}
+        path = [start]
+        stack = [iter(successors(start))]
+        while stack:
+            for neighbor in stack[-1]:
+                if neighbor == target:
+                    return [target] + path
+                if neighbor not in visited:
+                    visited.add(neighbor)
+                    path.append(neighbor)
+                    stack.append(iter(successors(neighbor)))
+                    break
+            else:
+                stack.pop()
+                path.pop()
+        return None
@@ -7,6 +7,85 @@ Authors:
     Ardi Jusufi (aj2223@nyu.edu)
 '''
 
+from array import array
+from bisect import bisect_left
+
+
+def _pack(items):
+    '''Returns items in an array of 64-bit integers, or in a list if some do not fit'''
+    try:
+        return array('q', items)
+    except (OverflowError, TypeError):
+        return list(items)
+
+
+class VersionChain:
+    '''Committed versions of a variable
+
+    Versions are appended in increasing order of commit time, so the version
+    visible at a given timestamp is found by binary search. Commit times are
+    kept in an array of 64-bit integers searched with bisect, and values in a
+    parallel array.
+
+    Attributes:
+        times (array): Commit times in ascending order
+        values (array): Committed values, parallel to times
+    '''
+
+    __slots__ = ('times', 'values')
+
+    def __init__(self, time, value):
+        '''Inits the chain with the initial version'''
+        self.times = array('q', (time,))
+        self.values = _pack((value,))
+
+    @classmethod
+    def load(cls, times, values):
+        '''Returns a chain of the versions committed at times with values, in ascending order of time'''
+        chain = cls.__new__(cls)
+        chain.times = array('q', times)
+        chain.values = _pack(values)
+        return chain
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, time, value):
+        '''Appends a version committed at time'''
+        self.times.append(time)
+        try:
+            self.values.append(value)
+        except (OverflowError, TypeError):  # a value an array cannot hold
+            self.values = list(self.values)
+            self.values.append(value)
+
+    def latest(self):
+        '''Returns (time, value) of the latest committed version'''
+        return (self.times[-1], self.values[-1])
+
+    def before(self, timestamp):
+        '''Returns (time, value) of the latest version committed before timestamp, or None'''
+        i = bisect_left(self.times, timestamp)
+        if i == 0:
+            return None
+        return (self.times[i - 1], self.values[i - 1])
+
+    def prune(self, watermark):
+        '''Drops versions no reader with a timestamp of at least watermark can see
+
+        Args:
+            watermark (int): Timestamp of the oldest transaction that may still read old versions
+
+        Returns:
+            Number of versions dropped
+        '''
+        i = bisect_left(self.times, watermark) - 1
+        if i <= 0:
+            return 0
+        del self.times[:i]
+        del self.values[:i]
+        return i
+
 
 class Variable:
     '''The summary line for a class docstring should fit on one line.
@@ -21,27 +100,25 @@ class Variable:
 
     Attributes:
         id (str): Id of the variable
-        commited_value ([(time(int),value(int))]): List of committed values of the variable in descending order of committed time
+        versions (VersionChain): Committed values of the variable in ascending order of committed time
         uncommited_value (int): Value has not been committed
         available_for_read (bool): Flag indicates if a replicated variable is available for reading after site recovery
     '''
 
+    __slots__ = ('id', 'versions', 'uncommited_value', 'available_for_read')
+
     def __init__(self, id, val):
         '''Inits a variable with id and the default value'''
         self.id = id
-        self.commited_value = [(0, val)]  # order by decreasing time
+        self.versions = VersionChain(0, val)
         self.uncommited_value = None
         self.available_for_read = True
 
-    def querystate(self):
-        '''Print out the state of the variable'''
-        print('{}: {} at time {}'.format(
-            self.id, self.commited_value[0][1], self.commited_value[0][0]))
-
-    def dump(self):
-        '''Print out the state of the variable'''
-        print('{}: {} at time {}'.format(
-            self.id, self.commited_value[0][1], self.commited_value[0][0]))
+    @property
+    def commited_value(self):
+        '''List of committed (time, value) of the variable in descending order of committed time'''
+        versions = self.versions
+        return list(zip(reversed(versions.times), reversed(versions.values)))
 
     def read(self, is_read_only, timestamp):
         '''Read the value of the variable
@@ -53,46 +130,44 @@ class Variable:
             timestamp (int): Timestamp of the transaction
 
         Returns:
-            Ture if read successfully, False otherwise
+            (commit time, value) if read successfully, with commit time None for an uncommitted value.
+            None otherwise
 
         '''
 
         # Replicated variable not available for read until first commit after
         # site recovers
         if not self.available_for_read:
-            print('{} not available for read yet'.format(self.id))
-            return False
+            return None
 
         if not is_read_only:
             # READ WRITE transaction reads uncommitted value first if there is
             # one.
             if self.uncommited_value is not None:
-                print('{} has uncommitted value {}'.format(
-                    self.id, self.uncommited_value))
-            else:
-                print('{} has committed value {} modified at time {}'.format(
-                    self.id, self.commited_value[0][1], self.commited_value[0][0]))
-            return True
-        else:
-            # READ ONLY transaction reads latest committed value
-            # whose committed time is earlier than the timestamp of the
-            # transaction
-            for v in self.commited_value:
-                if v[0] < timestamp:
-                    print('{} has committed value {} modified at time {}'.format(
-                        self.id, v[1], v[0]))
-                    return True
-
-        # shouldn't reach here
-        return False
+                return (None, self.uncommited_value)
+            return self.versions.latest()
+        # READ ONLY transaction reads latest committed value
+        # whose committed time is earlier than the timestamp of the
+        # transaction
+        return self.versions.before(timestamp)
 
     def write(self, val):
         '''Write value to uncommited value'''
         self.uncommited_value = val
 
-    def commit(self, time):
-        '''Commits the uncommitted value, and sets replicated variable to available for read.'''
-        print('commit value {} at time {}'.format(self.uncommited_value, time))
-        self.commited_value.insert(0, (time, self.uncommited_value))
+    def commit(self, time, watermark=None):
+        '''Commits the uncommitted value, and sets replicated variable to available for read.
+
+        Args:
+            time (int): Commit time
+            watermark (int): Timestamp of the oldest active READ ONLY transaction, if versions should be pruned
+
+        Returns:
+            Change in the number of versions kept
+        '''
+        self.versions.append(time, self.uncommited_value)
         self.uncommited_value = None
         self.available_for_read = True
+        if watermark is None:
+            return 1
+        return 1 - self.versions.prune(watermark)
@@ -0,0 +1,239 @@
+'''Write-Ahead Log
+
+Durable log of the commits of a site. Each committed version is a fixed-size record (commit time,
+variable index, value), appended in batches to segments of a fixed number of records. Segments
+are kept in memory, in files, or in memory-mapped files. A checkpoint stores the committed
+versions of all variables as of a log position; segments wholly before the latest checkpoint
+are dropped, and recovery replays only the records after it.
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+import mmap
+import os
+import struct
+
+RECORD = struct.Struct('<qiq')  # commit time, variable index, value
+CHECKPOINT_HEADER = struct.Struct('<qi')  # log position covered, number of variables
+CHECKPOINT_VAR = struct.Struct('<ii')  # variable index, number of versions
+
+
+class WriteAheadLog:
+    '''Append-only log of committed versions with checkpoints
+
+    Records are numbered by log sequence number (LSN) from 0. Segment k holds records
+    k * segment_records to (k + 1) * segment_records - 1.
+
+    Attributes:
+        directory (str): Directory of the segment and checkpoint files, or None to keep them in memory
+        segment_records (int): Number of records per segment
+        checkpoint_every (int): Records appended between checkpoints, 0 for no automatic checkpoints
+        use_mmap (bool): Whether segment files are written through memory maps
+        sync (bool): Whether flushes wait for the records to reach the disk (fsync)
+        lsn (int): Number of records appended so far
+        checkpoint_lsn (int): Log position covered by the latest checkpoint
+        batches (int): Number of batches appended
+        flushes (int): Number of flushes that made appended records durable
+    '''
+
+    def __init__(self, directory=None, segment_records=1 << 14, checkpoint_every=0, use_mmap=False, sync=False):
+        '''Opens the log in directory, continuing an existing one, or creates an empty log in memory'''
+        self.directory = directory
+        self.segment_records = segment_records
+        self.checkpoint_every = checkpoint_every
+        self.use_mmap = use_mmap and directory is not None
+        self.sync = sync
+        self.lsn = 0
+        self.checkpoint_lsn = 0
+        self.batches = 0
+        self.flushes = 0
+        self._dirty = set()  # segments written since the last flush
+        self._segments = {}  # k: bytearray, file object or mmap of segment k
+        self._checkpoint = b''  # serialized checkpoint, when kept in memory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._reopen()
+
+    def _segment_path(self, k):
+        return os.path.join(self.directory, 'segment-{:08d}.log'.format(k))
+
+    def _checkpoint_path(self):
+        return os.path.join(self.directory, 'checkpoint')
+
+    def _reopen(self):
+        '''Continues the log found in the directory, ending at the first empty record'''
+        checkpoint = self._read_checkpoint()
+        if checkpoint:
+            self.checkpoint_lsn = CHECKPOINT_HEADER.unpack_from(checkpoint)[0]
+        ks = sorted(int(name[8:16]) for name in os.listdir(self.directory) if name.startswith('segment-'))
+        self.lsn = ks[0] * self.segment_records if ks else self.checkpoint_lsn
+        for k in ks:
+            segment = self._open_segment(k)
+            if self.use_mmap:
+                data = segment[:]
+            else:
+                with open(self._segment_path(k), 'rb') as f:
+                    data = f.read()
+            for offset in range(0, len(data) - RECORD.size + 1, RECORD.size):
+                if RECORD.unpack_from(data, offset)[1] == 0:
+                    return
+                self.lsn += 1
+
+    def _open_segment(self, k):
+        '''Returns segment k, creating it if needed'''
+        segment = self._segments.get(k)
+        if segment is None:
+            if self.directory is None:
+                segment = bytearray()
+            elif self.use_mmap:
+                size = self.segment_records * RECORD.size
+                with open(self._segment_path(k), 'a+b') as f:
+                    if os.fstat(f.fileno()).st_size < size:
+                        f.truncate(size)
+                    segment = mmap.mmap(f.fileno(), size)
+            else:
+                segment = open(self._segment_path(k), 'ab')
+            self._segments[k] = segment
+        return segment
+
+    def append(self, records, flush=True):
+        '''
+        Appends a batch of records with one write per segment touched.
+        :param records: list of (commit time, variable index, value)
+        :param flush: whether to flush the log once the batch is written, else a later flush makes it durable
+        '''
+        if not records:
+            return
+        data = b''.join(RECORD.pack(*r) for r in records)
+        start = 0
+        while start < len(records):
+            k, offset = divmod(self.lsn, self.segment_records)
+            count = min(len(records) - start, self.segment_records - offset)
+            chunk = data[start * RECORD.size:(start + count) * RECORD.size]
+            segment = self._open_segment(k)
+            if self.directory is None:
+                segment += chunk
+            elif self.use_mmap:
+                segment[offset * RECORD.size:(offset + count) * RECORD.size] = chunk
+            else:
+                segment.write(chunk)
+            self._dirty.add(k)
+            self.lsn += count
+            start += count
+        self.batches += 1
+        if flush:
+            self.flush()
+
+    @property
+    def dirty(self):
+        '''Whether records were appended since the last flush'''
+        return bool(self._dirty)
+
+    def flush(self):
+        '''Writes the segments appended to since the last flush through to the file system, or the disk with sync'''
+        for k in self._dirty:
+            segment = self._segments.get(k)
+            if segment is None or self.directory is None:
+                continue
+            if self.use_mmap:
+                if self.sync:
+                    segment.flush()
+            else:
+                segment.flush()
+                if self.sync:
+                    os.fsync(segment.fileno())
+        self._dirty.clear()
+        self.flushes += 1
+
+    def records(self, start=0):
+        '''
+        Yields the records from log position start on.
+        :param start: LSN of the first record, at least the position of the latest checkpoint
+        '''
+        lsn = start
+        while lsn < self.lsn:
+            k, offset = divmod(lsn, self.segment_records)
+            segment = self._segments.get(k)
+            if self.directory is None:
+                data = segment
+            elif self.use_mmap:
+                data = self._open_segment(k)
+            else:
+                with open(self._segment_path(k), 'rb') as f:
+                    data = f.read()
+            end = min(self.lsn - k * self.segment_records, self.segment_records)
+            for i in range(offset, end):
+                yield RECORD.unpack_from(data, i * RECORD.size)
+            lsn = (k + 1) * self.segment_records
+
+    def checkpoint_due(self):
+        '''Returns True if checkpoint_every records were appended since the latest checkpoint'''
+        return self.checkpoint_every > 0 and self.lsn - self.checkpoint_lsn >= self.checkpoint_every
+
+    def checkpoint(self, state):
+        '''
+        Stores a checkpoint of the current log position and drops the segments before it.
+        :param state: variable index: (commit times, values) of every variable with committed versions
+        '''
+        parts = [CHECKPOINT_HEADER.pack(self.lsn, len(state))]
+        for index, (times, values) in state.items():
+            parts.append(CHECKPOINT_VAR.pack(index, len(times)))
+            parts.append(struct.pack('<{0}q{0}q'.format(len(times)), *times, *values))
+        data = b''.join(parts)
+        if self.directory is None:
+            self._checkpoint = data
+        else:
+            path = self._checkpoint_path()
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+                if self.sync:
+                    os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+        self.checkpoint_lsn = self.lsn
+        for k in [k for k in self._segments if (k + 1) * self.segment_records <= self.checkpoint_lsn]:
+            self._drop_segment(k)
+
+    def _drop_segment(self, k):
+        segment = self._segments.pop(k)
+        if self.directory is not None:
+            segment.close()
+            os.remove(self._segment_path(k))
+
+    def _read_checkpoint(self):
+        if self.directory is None:
+            return self._checkpoint
+        try:
+            with open(self._checkpoint_path(), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return b''
+
+    def load_checkpoint(self):
+        '''
+        Returns the latest checkpoint.
+        :return: (LSN covered, {variable index: (commit times, values)}), or (0, {}) without a checkpoint
+        '''
+        data = self._read_checkpoint()
+        if not data:
+            return (0, {})
+        lsn, count = CHECKPOINT_HEADER.unpack_from(data)
+        offset = CHECKPOINT_HEADER.size
+        state = {}
+        for _ in range(count):
+            index, n = CHECKPOINT_VAR.unpack_from(data, offset)
+            offset += CHECKPOINT_VAR.size
+            versions = struct.unpack_from('<{}q'.format(2 * n), data, offset)
+            offset += 16 * n
+            state[index] = (list(versions[:n]), list(versions[n:]))
+        return (lsn, state)
+
+    def close(self):
+        '''Flushes and closes the segment files'''
+        if self._dirty:
+            self.flush()
+        if self.directory is not None:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments = {}
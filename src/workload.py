@@ -0,0 +1,138 @@
+'''Synthetic Workload Generator
+
+Writes traces in the input language of the database: interleaved read/write and read-only
+transactions over keys with Zipfian skew, with optional site failures and recoveries.
+
+Usage:
+    python -m src.workload [-o FILE] [-transactions N] [-ops N] [-writes RATIO] [-ro RATIO]
+                           [-zipf S] [-concurrency N] [-fail-every N] [-recover-after N]
+                           [-sites N] [-vars M] [-seed SEED]
+
+Authors:
+    Da Ying (dy877@nyu.edu)
+    Ardi Jusufi (aj2223@nyu.edu)
+'''
+
+import argparse
+import random
+import sys
+from itertools import accumulate
+
+
+class Workload:
+    '''Settings of a synthetic workload
+
+    Attributes:
+        transactions (int): Number of transactions
+        ops_per_trx (int): Reads and writes issued by each transaction
+        write_ratio (float): Fraction of the operations of read/write transactions that are writes
+        ro_fraction (float): Fraction of the transactions that are read-only
+        zipf (float): Zipfian skew of the keys accessed, 0 for uniform
+        concurrency (int): Number of transactions running at the same time
+        fail_every (int): A random site fails every fail_every commands, 0 for no failures
+        recover_after (int): Commands after which a failed site recovers
+        num_sites (int): Number of sites
+        num_vars (int): Number of variables
+        seed (int): Seed of the random generator, the same settings and seed give the same trace
+    '''
+
+    def __init__(self, transactions=100, ops_per_trx=4, write_ratio=0.5, ro_fraction=0.1, zipf=0.0,
+                 concurrency=5, fail_every=0, recover_after=10, num_sites=10, num_vars=20, seed=0):
+        '''Inits the settings of a workload'''
+        self.transactions = transactions
+        self.ops_per_trx = ops_per_trx
+        self.write_ratio = write_ratio
+        self.ro_fraction = ro_fraction
+        self.zipf = zipf
+        self.concurrency = concurrency
+        self.fail_every = fail_every
+        self.recover_after = recover_after
+        self.num_sites = num_sites
+        self.num_vars = num_vars
+        self.seed = seed
+
+    def settings(self):
+        '''Returns the settings as a dictionary'''
+        return dict(vars(self))
+
+    def lines(self):
+        '''Yields the commands of the trace'''
+        rng = random.Random(self.seed)
+        weights = [1.0 / (k ** self.zipf) for k in range(1, self.num_vars + 1)]
+        cum_weights = list(accumulate(weights))
+        keys = ['x' + str(k) for k in range(1, self.num_vars + 1)]
+        # hot keys are spread over odd and even variables
+        rng.shuffle(keys)
+
+        running = []  # [trx, read only, operations left]
+        started = 0
+        commands = 0
+        down = {}  # site: command count at which it recovers
+        while started < self.transactions or running:
+            commands += 1
+            for site in [s for s, at in down.items() if at <= commands]:
+                del down[site]
+                yield 'recover({})'.format(site)
+            if self.fail_every and commands % self.fail_every == 0:
+                site = rng.randint(1, self.num_sites)
+                if site not in down:
+                    down[site] = commands + self.recover_after
+                    yield 'fail({})'.format(site)
+            if started < self.transactions and len(running) < self.concurrency:
+                started += 1
+                trx = 'T' + str(started)
+                read_only = rng.random() < self.ro_fraction
+                running.append([trx, read_only, self.ops_per_trx])
+                yield '{}({})'.format('beginRO' if read_only else 'begin', trx)
+                continue
+            entry = rng.choice(running)
+            trx, read_only, left = entry
+            if left == 0:
+                running.remove(entry)
+                yield 'end({})'.format(trx)
+                continue
+            entry[2] -= 1
+            key = rng.choices(keys, cum_weights=cum_weights)[0]
+            if read_only or rng.random() >= self.write_ratio:
+                yield 'R({},{})'.format(trx, key)
+            else:
+                yield 'W({},{},{})'.format(trx, key, rng.randint(0, 999))
+        for site in sorted(down):
+            yield 'recover({})'.format(site)
+
+    def write(self, out):
+        '''Writes the trace to the file object out'''
+        for line in self.lines():
+            out.write(line + '\n')
+
+    def trace(self):
+        '''Returns the trace as a string'''
+        return ''.join(line + '\n' for line in self.lines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic workload trace.")
+    parser.add_argument('-o', help="Output file (default: standard output).")
+    parser.add_argument('-transactions', type=int, default=100, help="Number of transactions.")
+    parser.add_argument('-ops', type=int, default=4, help="Operations per transaction.")
+    parser.add_argument('-writes', type=float, default=0.5, help="Fraction of writes in read/write transactions.")
+    parser.add_argument('-ro', type=float, default=0.1, help="Fraction of read-only transactions.")
+    parser.add_argument('-zipf', type=float, default=0.0, help="Zipfian skew of keys, 0 for uniform.")
+    parser.add_argument('-concurrency', type=int, default=5, help="Transactions running at the same time.")
+    parser.add_argument('-fail-every', type=int, default=0, help="Fail a site every N commands, 0 for never.")
+    parser.add_argument('-recover-after', type=int, default=10, help="Recover a failed site after N commands.")
+    parser.add_argument('-sites', type=int, default=10, help="Number of sites.")
+    parser.add_argument('-vars', type=int, default=20, help="Number of variables.")
+    parser.add_argument('-seed', type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+    workload = Workload(args.transactions, args.ops, args.writes, args.ro, args.zipf, args.concurrency,
+                        args.fail_every, args.recover_after, args.sites, args.vars, args.seed)
+    if args.o is None:
+        workload.write(sys.stdout)
+    else:
+        with open(args.o, 'w') as out:
+            workload.write(out)
+
+
+if __name__ == '__main__':
+    main()
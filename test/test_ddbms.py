@@ -11,8 +11,24 @@ Authors:
     Ardi Jusufi (aj2223@nyu.edu)
 '''
 
+import asyncio
+import json
+import tempfile
+import threading
 import unittest
+from src.batch import collect, run_batch
 from src.ddbms import DDBMS
+from src.events import EventLog, JsonSink, MemorySink, NullSink
+from src.metrics import Metrics
+from src.parser import parse_command, parse_lines
+from src.server import Server
+from src.util import Util
+from src.wal import WriteAheadLog
+from src.workload import Workload
+from src.dbsite import DBSite
+from src.topology import Topology
+from src.transaction import AbortCause, TransactionStatus
+from src.transaction_manager import TransactionManager
 import sys
 from io import StringIO
 
@@ -129,3 +145,701 @@ class TestDDBMS(unittest.TestCase):
         output = self.result.getvalue()
         self.assertTrue(db.sites[1].vars['x2'].available_for_read)
         self.assertEqual(db.tm.trxs['T1'].status.name, 'COMMITED')
+
+    def test_lock_index_released(self):
+        '''Reverse lock index is emptied once every transaction has ended
+
+        Expected Result:
+            No site has locks or index entries left for any transaction
+        '''
+        db = DDBMS('test/test_deadlock_detection_2')
+        for s in db.sites.values():
+            self.assertEqual(s.trx_locks, {})
+            for readlocks, writelock in s.locktable.values():
+                self.assertFalse(readlocks)
+                self.assertIsNone(writelock)
+
+        # an abort only visits the sites the transaction accessed
+        db = DDBMS(events=EventLog([]), start=False)
+        aborted_on = []
+        for site in db.sites.values():
+            site.abort = lambda trx, site=site: aborted_on.append(site.id) or DBSite.abort(site, trx)
+        for line in ['begin(T1)', 'R(T1,x1)', 'R(T1,x3)', 'begin(T2)', 'W(T2,x1,5)', 'end(T2)', 'end(T1)']:
+            db.execute(line)
+        self.assertEqual(aborted_on, [])
+        for line in ['begin(T3)', 'R(T3,x1)', 'W(T3,x3,5)', 'fail(4)', 'end(T3)']:
+            db.execute(line)
+        self.assertEqual(aborted_on, [2, 4])
+
+    def test_version_gc(self):
+        '''Versions are kept only while a READ ONLY trx may still read them
+
+        Expected Result:
+            T2 reads x1 = 1 committed before it began
+            Only the latest version of x1 is kept once T2 ends
+        '''
+        db = DDBMS('test/test_version_gc')
+        output = self.result.getvalue()
+        self.assertIn('x1 has committed value 1 modified', output)
+        self.assertEqual(len(db.sites[2].vars['x1'].versions), 1)
+        self.assertEqual(db.sites[2].vars['x1'].commited_value[0][1], 3)
+        self.assertEqual(db.versions_kept(), 1)
+
+    def test_incremental_deadlock_detection(self):
+        '''Cycles are found when the closing waits-for edge is added
+
+        Expected Result:
+            Same victims as periodic detection
+        '''
+        db = DDBMS('test/test_deadlock_detection_1', deadlock='incremental')
+        for i in range(1, 5):
+            self.assertEqual(db.tm.trxs['T' + str(i)].status.name, 'COMMITED')
+        self.assertEqual(db.tm.trxs['T5'].status.name, 'ABORTED')
+        db = DDBMS('test/test_deadlock_detection_2', deadlock='incremental')
+        self.assertEqual(db.tm.trxs['T1'].status.name, 'COMMITED')
+        self.assertEqual(db.tm.trxs['T3'].status.name, 'COMMITED')
+        self.assertEqual(db.tm.trxs['T2'].status.name, 'ABORTED')
+        self.assertEqual(db.tm.trxs['T4'].status.name, 'ABORTED')
+
+    def test_long_wait_chain(self):
+        '''Cycle detection does not recurse along long waits-for chains
+
+        Expected Result:
+            The cycle closing a chain of 10000 transactions is found by both searches
+        '''
+        n = 10000
+        graph = {i: [i + 1] for i in range(n)}
+        graph[n] = [0]
+        self.assertEqual(len(Util.get_cycles(graph)[0]), n + 1)
+        self.assertEqual(len(Util.find_cycle(lambda k: graph[k], 1, 0)), n + 1)
+
+    def test_waiter_moves(self):
+        '''A waiting transaction that issues an operation on another variable waits on that variable
+
+        Expected Result:
+            T2, blocked on x1 and then on x2, reads x2 once T3 releases it and leaves the wait queues
+            All transactions commit
+        '''
+        db = DDBMS('test/test_waiter_moves_1')
+        self.assertIn('Retry', self.result.getvalue())
+        for i in range(1, 4):
+            self.assertEqual(db.tm.trxs['T' + str(i)].status.name, 'COMMITED')
+        self.assertEqual(db.tm.waitlist, {})
+        self.assertEqual(db.tm.var_waiters, {})
+
+    def test_site_fail_recover_3(self):
+        '''Read blocked on a down site is retried only when that site recovers
+
+        Expected Result:
+            T1 reads x1 after site 2 recovers and commits
+            The single retry succeeds and no transaction is left waiting
+        '''
+        db = DDBMS('test/test_site_fail_recover_3')
+        output = self.result.getvalue()
+        self.assertIn("Retry ['T1']", output)
+        self.assertEqual(db.tm.trxs['T1'].status.name, 'COMMITED')
+        self.assertEqual(db.tm.retries_attempted, 1)
+        self.assertEqual(db.tm.retries_succeeded, 1)
+        self.assertEqual(db.tm.waitlist, {})
+        self.assertEqual(db.tm.site_waiters, {})
+
+    def test_large_topology(self):
+        '''Variables of a large topology are created only when accessed
+
+        Expected Result:
+            T1 writes x1 on site 2 and x2 on all 200 sites
+            Sites store only the variables that were accessed
+        '''
+        topology = Topology(num_sites=200, num_vars=10 ** 6)
+        sites = {i: DBSite(i, topology) for i in topology.site_ids}
+        tm = TransactionManager(sites, topology=topology)
+        tm.begin('T1')
+        tm.write('T1', 'x1', 101)
+        tm.write('T1', 'x2', 102)
+        tm.end('T1')
+        self.assertEqual(tm.trxs['T1'].status.name, 'COMMITED')
+        self.assertEqual(sites[2].vars['x1'].commited_value[0][1], 101)
+        self.assertEqual(sites[200].vars['x2'].commited_value[0][1], 102)
+        self.assertEqual(sites[2].vars['x1000000'].commited_value[0][1], 10 ** 7)
+        self.assertEqual(len(sites[200].vars), 1)
+        self.assertEqual(topology.locate('x201'), (2,))
+
+    def test_replication_factor(self):
+        '''Replicated variables are copied on k sites only
+
+        Expected Result:
+            x2 is written and committed on sites 3-5 only
+            After site 4 recovers, x2 there is unavailable until written again
+        '''
+        topology = Topology(replication=3)
+        sites = {i: DBSite(i, topology) for i in topology.site_ids}
+        tm = TransactionManager(sites, topology=topology)
+        tm.begin('T1')
+        tm.write('T1', 'x2', 102)
+        self.assertEqual([s for s in sites if 'x2' in sites[s].locktable], [3, 4, 5])
+        tm.end('T1')
+        self.assertEqual(sorted(tm.trxs['T1'].site_access_time), [3, 4, 5])
+        self.assertEqual(sites[5].vars['x2'].commited_value[0][1], 102)
+        self.assertNotIn('x2', sites[1].vars)
+        sites[4].fail()
+        sites[4].recover()
+        self.assertFalse(sites[4].vars['x2'].available_for_read)
+        self.assertTrue(sites[4].vars['x3'].available_for_read)
+        for site in topology.site_ids:
+            self.assertEqual(topology.vars_on_site(site),
+                             tuple(v for v in ('x' + str(i) for i in range(1, 21)) if topology.hosts(site, v)))
+        self.assertIs(topology.vars_on_site(4), topology.vars_on_site(4))
+
+    def test_event_sinks(self):
+        '''Events go to the configured sinks only
+
+        Expected Result:
+            The memory sink receives structured read events, nothing is printed
+            The JSON sink writes one JSON object per line
+            The null sink receives nothing
+        '''
+        sink = MemorySink()
+        DDBMS('test/test_RO_1', events=EventLog([sink]))
+        self.assertEqual(self.result.getvalue(), '')
+        reads = [e.fields for e in sink.events if e.kind == 'read_value']
+        self.assertEqual([(r['var'], r['value']) for r in reads], [('x2', 20), ('x1', 10)])
+        self.assertIn('x2 has committed value 20 modified at time 0', sink.messages())
+
+        stream = StringIO()
+        DDBMS('test/test_RO_1', events=EventLog([JsonSink(stream)]))
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertIn({'level': 'info', 'event': 'commit', 'trx': 'T1'}, records)
+
+        log = EventLog([NullSink()])
+        DDBMS('test/test_RO_1', events=log)
+        self.assertFalse(log.enabled())
+        self.assertEqual(self.result.getvalue(), '')
+
+    def test_parser(self):
+        '''Comments are skipped and malformed lines are reported with their line number
+
+        Expected Result:
+            Bad lines 3 and 4 are reported and do not take a tick
+            Chunk boundaries do not split commands
+        '''
+        trace = 'begin(T1) // first\n\n  // comment\nR(T1,x1\nfoo(T1)\nW(T1, x2, 5)\nend(T1)'
+        sink = MemorySink()
+        db = DDBMS(StringIO(trace), events=EventLog([sink]))
+        bad = [e.fields for e in sink.events if e.kind == 'bad_line']
+        self.assertEqual([b['lineno'] for b in bad], [4, 5])
+        self.assertEqual([e.fields['tick'] for e in sink.events if e.kind == 'tick'][-1] -
+                         [e.fields['tick'] for e in sink.events if e.kind == 'tick'][0], 2)
+        self.assertEqual(db.tm.trxs['T1'].status.name, 'COMMITED')
+        self.assertEqual(list(parse_lines(StringIO(trace), chunk_size=3)), list(parse_lines(StringIO(trace))))
+
+    def test_workload(self):
+        '''Generated workloads are reproducible and run to completion
+
+        Expected Result:
+            The same settings and seed give the same trace
+            Every transaction ends committed or aborted, each abort with a cause
+        '''
+        workload = Workload(transactions=50, zipf=0.99, fail_every=15, seed=7)
+        trace = workload.trace()
+        self.assertEqual(trace, Workload(transactions=50, zipf=0.99, fail_every=15, seed=7).trace())
+        self.assertNotEqual(trace, Workload(transactions=50, zipf=0.99, fail_every=15, seed=8).trace())
+        db = DDBMS(StringIO(trace), events=EventLog([]))
+        trxs = db.tm.trxs.values()
+        self.assertEqual(len(trxs), 50)
+        for t in trxs:
+            self.assertIn(t.status, (TransactionStatus.COMMITED, TransactionStatus.ABORTED))
+            if t.status == TransactionStatus.ABORTED:
+                self.assertIsInstance(t.abort_cause, AbortCause)
+
+    def test_metrics(self):
+        '''Metrics are recorded only when enabled
+
+        Expected Result:
+            Lock failures on x2 at all ten sites, one deadlock with victim T2, one commit
+            Every wait and each commit of x2 is observed, and the waitlist is empty at the end
+            Disabled metrics record nothing and metrics() says so
+        '''
+        trace = 'begin(T1)\nbegin(T2)\nW(T1,x2,5)\nW(T2,x2,6)\nR(T1,x4)\nW(T2,x4,1)\nR(T1,x4)\nend(T1)\nend(T2)\n'
+        metrics = Metrics()
+        DDBMS(StringIO(trace), events=EventLog([]), metrics=metrics)
+        snapshot = metrics.snapshot()
+        counters = snapshot['counters']
+        self.assertEqual(len([k for k in counters['lock_failures'] if k.endswith('/x2')]), 10)
+        self.assertEqual(counters['deadlock_victims'], {'T2': 1})
+        self.assertEqual(counters['aborts'], {'deadlock': 1})
+        self.assertEqual(counters['commits'], {'read_write': 1})
+        self.assertEqual(sorted(counters['trx_wait_ticks']), ['T1', 'T2'])
+        self.assertEqual(snapshot['histograms']['wait_ticks']['count'], 2)
+        self.assertEqual(snapshot['gauges']['waitlist_depth']['max'], 2)
+        self.assertEqual(snapshot['gauges']['waitlist_depth']['value'], 0)
+        self.assertEqual(snapshot['histograms']['version_chain_length']['count'], 10)
+        json.dumps(snapshot)
+
+        sink = MemorySink()
+        db = DDBMS(StringIO(trace + 'metrics()\n'), events=EventLog([sink]))
+        self.assertFalse(db.metrics.snapshot()['counters'])
+        self.assertIn('Metrics are disabled', sink.messages())
+
+    def test_independent_clocks(self):
+        '''Each database keeps its own time
+
+        Expected Result:
+            Every database starts at tick 0 however many ran before it
+            Databases running in threads produce the same events as one running alone
+        '''
+        def events(path):
+            sink = MemorySink()
+            db = DDBMS(path, events=EventLog([sink]))
+            return db, sink.messages()
+
+        db, expected = events('test/test_deadlock_detection_1')
+        self.assertEqual(db.ticker.get_tick(), db.sites[1].ticker.get_tick())
+        self.assertIs(db.tm.ticker, db.ticker)
+        self.assertIn('----------Tick 0----------', expected)
+        results = {}
+        threads = [threading.Thread(target=lambda i=i: results.setdefault(i, events('test/test_deadlock_detection_1')))
+                   for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(8):
+            self.assertEqual(results[i][1], expected)
+            self.assertEqual(results[i][0].ticker.get_tick(), db.ticker.get_tick())
+
+    def test_batch(self):
+        '''The trace corpus replays through the batch runner
+
+        Expected Result:
+            Every trace under test/ runs without error, the .py files are skipped
+            Outcomes are the same in a process pool and in this process
+        '''
+        paths = collect(['test'])
+        self.assertNotIn('test/test_ddbms.py', paths)
+        self.assertEqual(paths, sorted(paths))
+        pooled = run_batch(paths, workers=2)
+        self.assertEqual([o['path'] for o in pooled['outcomes']], paths)
+        self.assertFalse([o for o in pooled['outcomes'] if 'error' in o])
+        self.assertEqual(pooled['outcomes'], run_batch(paths, workers=0)['outcomes'])
+        outcome = pooled['outcomes'][paths.index('test/test_deadlock_detection_1')]
+        self.assertEqual(outcome['transactions']['T5'], 'ABORTED (DEADLOCK)')
+
+    def test_server(self):
+        '''Clients get the results of their own commands, parked ones once they go through
+
+        Expected Result:
+            T2's read of x1 is answered with T1's value only after T1 commits
+            Commands T2 pipelined behind the parked read run after it, in order
+            The deadlock between T3 and T4 aborts the younger T4, answering its parked write
+        '''
+        async def session():
+            server = Server(DDBMS(events=EventLog([]), deadlock='incremental', start=False))
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            (r1, w1), (r2, w2) = [await asyncio.open_connection('127.0.0.1', port) for _ in range(2)]
+
+            async def send(writer, reader, lines, replies):
+                writer.write(''.join(line + '\n' for line in lines).encode())
+                await writer.drain()
+                return [(await reader.readline()).decode().strip() for _ in range(replies)]
+
+            first = await send(w1, r1, ['begin(T1)', 'W(T1,x1,5)'], 2)
+            second = await send(w2, r2, ['begin(T2)', 'R(T2,x1)', 'W(T2,x2,7)', 'bad'], 2)
+            third = await send(w1, r1, ['end(T1)'], 1)
+            fourth = [(await r2.readline()).decode().strip() for _ in range(2)]
+            fourth += await send(w2, r2, ['end(T2)'], 1)
+            fifth = await send(w1, r1, ['begin(T3)', 'W(T3,x3,1)'], 2)
+            fifth += await send(w2, r2, ['begin(T4)', 'W(T4,x5,1)', 'W(T4,x3,2)'], 2)
+            fifth += await send(w1, r1, ['W(T3,x5,3)'], 0)
+            fifth += [(await r2.readline()).decode().strip()]
+            fifth += [(await r1.readline()).decode().strip()]
+            for w in (w1, w2):
+                w.close()
+                await w.wait_closed()
+            listener.close()
+            await listener.wait_closed()
+            return first, second, third, fourth, fifth
+
+        first, second, third, fourth, fifth = asyncio.run(session())
+        self.assertEqual(first, ['1 ok', '2 ok'])
+        self.assertEqual(second, ['1 ok', "4 error cannot parse 'bad'"])
+        self.assertEqual(third, ['3 committed'])
+        self.assertEqual(fourth, ['2 ok 5', '3 ok', '5 committed'])
+        self.assertEqual(fifth, ['4 ok', '5 ok', '6 ok', '7 ok', '8 aborted deadlock', '6 ok'])
+
+    def test_site_processes(self):
+        '''Sites in worker processes behave as sites in this process
+
+        Expected Result:
+            The same events for traces with failures and recoveries
+            fail kills the worker of the site and recover starts a new one from committed versions only
+        '''
+        for trace in ('test/test_site_fail_recover_1', 'test/test_RO_1'):
+            local, remote = MemorySink(), MemorySink()
+            DDBMS(trace, events=EventLog([local]))
+            db = DDBMS(trace, events=EventLog([remote]), processes=True)
+            db.close()
+            self.assertEqual(remote.messages(), local.messages())
+
+        for processes in (False, True):
+            sink = MemorySink()
+            db = DDBMS(events=EventLog([sink]), start=False, processes=processes)
+            for line in ['begin(T1)', 'W(T1,x3,5)', 'end(T1)', 'begin(T2)', 'W(T2,x3,6)', 'fail(4)']:
+                db.execute(line)
+            if processes:
+                worker = db.sites[4]._process
+                self.assertFalse(worker.is_alive())
+            db.execute('recover(4)')
+            if processes:
+                self.assertIsNot(db.sites[4]._process, worker)
+            db.execute('begin(T3)')
+            db.execute('R(T3,x3)')
+            self.assertEqual([e.fields['value'] for e in sink.events if e.kind == 'read_value'], [5])
+            self.assertEqual(db.versions_kept(), 1)
+            db.close()
+
+    def test_write_ahead_log(self):
+        '''Sites losing their state on failure are rebuilt from checkpoint and log
+
+        Expected Result:
+            The same events for traces with failures and recoveries
+            Recover restores the committed versions whether they are in the checkpoint or the log tail
+            A log reopened from its directory continues after its last record
+        '''
+        for trace in ('test/test_site_fail_recover_1', 'test/test_site_fail_recover_3'):
+            kept, dropped = MemorySink(), MemorySink()
+            DDBMS(trace, events=EventLog([kept]))
+            DDBMS(trace, events=EventLog([dropped]), fail_mode='drop')
+            self.assertEqual(dropped.messages(), kept.messages())
+
+        with tempfile.TemporaryDirectory() as directory:
+            db = DDBMS(events=EventLog([]), start=False, fail_mode='drop',
+                       wal=lambda i: WriteAheadLog('{}/site-{}'.format(directory, i), segment_records=2,
+                                                   checkpoint_every=3))
+            for i in range(1, 6):
+                db.execute('begin(T{})'.format(i))
+                db.execute('W(T{},x2,{})'.format(i, i))
+                db.execute('end(T{})'.format(i))
+            site = db.sites[1]
+            self.assertEqual((site.wal.lsn, site.wal.checkpoint_lsn), (5, 3))
+            db.execute('fail(1)')
+            self.assertFalse(site.vars)
+            db.execute('recover(1)')
+            self.assertEqual(site.vars['x2'].versions.latest(), (14, 5))
+            self.assertEqual(list(site.vars['x2'].versions.values), [3, 4, 5])
+            db.close()
+
+            wal = WriteAheadLog(directory + '/site-1', segment_records=2)
+            self.assertEqual((wal.lsn, wal.checkpoint_lsn), (5, 3))
+            self.assertEqual(list(wal.records(wal.checkpoint_lsn)), [(11, 2, 4), (14, 2, 5)])
+            wal.close()
+
+        with self.assertRaises(ValueError):
+            DBSite(1).fail(drop_state=True)
+
+    def test_group_commit(self):
+        '''Commits within a window of ticks share one log flush per site and are acknowledged together
+
+        Expected Result:
+            Commits are applied at once, so later transactions read them before they are acknowledged
+            Once the window has passed, each site's log is flushed once and the commits are acknowledged in order
+        '''
+        for window, flushes in ((0, 2), (4, 1)):
+            sink = MemorySink()
+            db = DDBMS(events=EventLog([sink]), start=False, wal=lambda i: WriteAheadLog(), group_window=window)
+            for line in ['begin(T1)', 'begin(T2)', 'W(T1,x1,5)', 'W(T2,x2,6)', 'end(T1)', 'end(T2)']:
+                db.execute(line)
+            acknowledged = [e.fields['trx'] for e in sink.events if e.kind == 'commit']
+            self.assertEqual(acknowledged, [] if window else ['T1', 'T2'])
+            self.assertEqual(db.tm.trxs['T2'].status, TransactionStatus.COMMITED)
+            for line in ['begin(T3)', 'R(T3,x1)', 'end(T3)']:
+                db.execute(line)
+            self.assertEqual([e.fields['value'] for e in sink.events if e.kind == 'read_value'], [5])
+            acknowledged = [e.fields['trx'] for e in sink.events if e.kind == 'commit']
+            self.assertEqual(acknowledged, ['T1', 'T2', 'T3'])
+            self.assertEqual((db.sites[2].wal.batches, db.sites[2].wal.flushes), (2, flushes))
+            self.assertEqual((db.sites[1].wal.batches, db.sites[1].wal.flushes), (1, 1))
+
+    def test_snapshot(self):
+        '''A run cut at any tick and resumed from a snapshot gives the results of the uncut run
+
+        Expected Result:
+            The same events after the cut, and the same final state, as the run without a cut
+            Snapshot and restore do not take a tick, and sites that drop their state recover it from their logs
+            The settings of the transaction manager of the snapshot replace those of the database restoring it
+        '''
+        workload = Workload(transactions=30, seed=3, fail_every=7, recover_after=4, ro_fraction=0.2)
+        traces = [workload.trace()]
+        for trace in ('test/test_site_fail_recover_3', 'test/test_deadlock_detection_2', 'test/test_RO_1'):
+            with open(trace) as f:
+                traces.append(f.read())
+
+        def events(sink):
+            return [(e.kind, e.fields) for e in sink.events if e.kind not in ('snapshot', 'restore')]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = directory + '/snapshot'
+            for fail_mode in DDBMS.FAIL_MODES:
+                for trace in traces:
+                    lines = [line for line in trace.splitlines() if parse_command(line)]
+                    sink = MemorySink()
+                    db = DDBMS(events=EventLog([sink]), start=False, fail_mode=fail_mode)
+                    for line in lines:
+                        db.execute(line)
+                    db.querystate()
+                    uncut = events(sink)
+                    for cut in range(0, len(lines) + 1, 3):
+                        sink = MemorySink()
+                        db = DDBMS(events=EventLog([sink]), start=False, fail_mode=fail_mode)
+                        for line in lines[:cut]:
+                            db.execute(line)
+                        db.execute('snapshot({})'.format(path))
+                        resumed = DDBMS(events=EventLog([sink]), start=False, fail_mode=fail_mode)
+                        resumed.execute('restore({})'.format(path))
+                        self.assertEqual(resumed.ticker.get_tick(), cut)
+                        for line in lines[cut:]:
+                            resumed.execute(line)
+                        resumed.querystate()
+                        self.assertEqual(events(sink), uncut)
+
+            # a site dropping its state after the restore recovers the commits made before the snapshot
+            db = DDBMS(events=EventLog([]), start=False)
+            for line in ['begin(T1)', 'W(T1,x1,55)', 'end(T1)']:
+                db.execute(line)
+            db.execute('snapshot({})'.format(path))
+            resumed = DDBMS(events=EventLog([]), start=False, fail_mode='drop')
+            for line in ['restore({})'.format(path), 'fail(2)', 'recover(2)', 'begin(T2)']:
+                resumed.execute(line)
+            self.assertEqual(resumed.tm.read('T2', 'x1'), 55)
+
+            with self.assertRaises(ValueError):
+                DDBMS(events=EventLog([]), topology=Topology(4, 8), start=False).restore(path)
+
+            # the settings of the transaction manager come with the snapshot
+            db = DDBMS(events=EventLog([]), deadlock='wound-wait', isolation='si', routing='round-robin',
+                       start=False)
+            db.execute('snapshot({})'.format(path))
+            resumed = DDBMS(events=EventLog([]), start=False)
+            resumed.execute('restore({})'.format(path))
+            self.assertEqual((resumed.deadlock, resumed.isolation, resumed.routing),
+                             ('wound-wait', 'si', 'round-robin'))
+            self.assertEqual((resumed.tm.deadlock, resumed.tm.isolation, resumed.tm.directory.policy),
+                             ('wound-wait', 'si', 'round-robin'))
+
+    def test_interned_transactions(self):
+        '''Transactions are numbered at begin, lock tables hold numbers and output holds ids
+
+        Expected Result:
+            Read locks of T1 and T2 on x2 are bits 0 and 1 of the entry
+            A blocked write reports its blockers by id
+            The numbers of finished transactions are reused by the next transactions to begin
+        '''
+        sink = MemorySink()
+        db = DDBMS(events=EventLog([sink]), start=False)
+        for line in ['begin(T1)', 'begin(T2)', 'begin(T3)', 'R(T1,x2)', 'R(T2,x2)', 'W(T3,x2,5)']:
+            db.execute(line)
+        self.assertEqual([db.tm.trxs[t].num for t in ('T1', 'T2', 'T3')], [0, 1, 2])
+        self.assertEqual(db.sites[1].locktable['x2'], [0b11, None])
+        self.assertEqual([e.fields['blocking'] for e in sink.events if e.kind == 'blocked'], [{'T1', 'T2'}])
+        self.assertEqual(db.tm.trxs['T3'].wait_for, {0, 1})
+        self.assertTrue(db.tm.is_waiting('T3'))
+        for line in ['end(T1)', 'end(T2)', 'begin(T4)', 'begin(T5)', 'begin(T6)']:
+            db.execute(line)
+        self.assertEqual(db.tm.trxs['T3'].status, TransactionStatus.RUNNING)
+        self.assertEqual([db.tm.trxs[t].num for t in ('T4', 'T5', 'T6')], [0, 1, 3])
+        self.assertEqual(db.sites[1].locktable['x2'], [0, 2])
+
+    def test_read_routing(self):
+        '''Reads go straight to a live, readable copy chosen by the routing policy
+
+        Expected Result:
+            Round-robin spreads the reads of x2 over sites 1, 2 and 3
+            A down site and a recovered site with no commit of x2 are skipped without probing them
+            Once a write of x2 commits on the recovered site, it is read from again
+        '''
+        sink = MemorySink()
+        db = DDBMS(events=EventLog([sink]), topology=Topology(3, 4), routing='round-robin', start=False)
+        for line in ['begin(T1)', 'R(T1,x2)', 'R(T1,x2)', 'R(T1,x2)', 'end(T1)']:
+            db.execute(line)
+        self.assertEqual(db.tm.directory.distribution(), {1: 1 / 3, 2: 1 / 3, 3: 1 / 3})
+        for line in ['fail(1)', 'fail(2)', 'recover(2)', 'begin(T2)', 'R(T2,x2)', 'R(T2,x2)', 'end(T2)']:
+            db.execute(line)
+        self.assertEqual([e.fields['site'] for e in sink.events if e.kind == 'read_success'][3:], [3, 3])
+        self.assertFalse([e for e in sink.events if e.kind in ('site_down', 'var_unavailable_for_read')])
+        for line in ['begin(T3)', 'W(T3,x2,7)', 'end(T3)', 'begin(T4)', 'R(T4,x2)', 'R(T4,x2)', 'end(T4)']:
+            db.execute(line)
+        self.assertEqual([e.fields['site'] for e in sink.events if e.kind == 'read_success'][5:], [3, 2])
+        self.assertEqual(db.tm.directory.reads, {1: 1, 2: 2, 3: 4})
+
+    def test_all_or_nothing_write(self):
+        '''A write blocked on one copy leaves no lock or value on any copy
+
+        Expected Result:
+            W(T2,x2,5) is blocked by the read lock of T1 on site 1 only and no copy of x2 is touched
+            The write lock and value T2 already has on x4 survive its blocked write
+            Once T1 ends, the retried write is applied on all copies
+        '''
+        db = DDBMS(events=EventLog([]), start=False)
+        for line in ['begin(T1)', 'begin(T2)', 'W(T2,x4,7)', 'R(T1,x2)', 'W(T2,x2,5)']:
+            db.execute(line)
+        for site in db.sites.values():
+            self.assertIsNone(site.vars['x2'].uncommited_value)
+            self.assertNotIn('x2', site.locktable if site.id > 1 else {})
+            self.assertEqual(site.locktable['x4'], [0, 1])
+            self.assertEqual(site.vars['x4'].uncommited_value, 7)
+        db.execute('end(T1)')
+        self.assertEqual([site.vars['x2'].uncommited_value for site in db.sites.values()], [5] * 10)
+        self.assertEqual(db.tm.trxs['T2'].status, TransactionStatus.RUNNING)
+
+    def test_deferred_writes(self):
+        '''Writes are buffered in the transaction and installed on the sites when it ends
+
+        Expected Result:
+            With deferred writes, W(T1,x2,5) takes the write locks but leaves every copy of x2 unwritten,
+            T1 reads its own buffered 5, T2 is blocked reading x2, and the end of T1 commits 5 everywhere
+            With locks taken at commit, W(T1,x2,5) touches no site, T2 reads x2 = 20,
+            and T1 is aborted at end because T2 holds a read lock on x2
+        '''
+        db = DDBMS(events=EventLog([]), write_mode='deferred', start=False)
+        for line in ['begin(T1)', 'begin(T2)', 'W(T1,x2,5)']:
+            db.execute(line)
+        for site in db.sites.values():
+            self.assertIsNone(site.vars['x2'].uncommited_value)
+            self.assertEqual(site.locktable['x2'], [0, 0])
+        self.assertEqual(db.tm.read('T1', 'x2'), 5)
+        self.assertIsNone(db.tm.read('T2', 'x2'))
+        db.execute('end(T1)')
+        self.assertEqual(db.tm.trxs['T2'].status, TransactionStatus.RUNNING)
+        self.assertEqual([site.vars['x2'].versions.latest() for site in db.sites.values()], [(3, 5)] * 10)
+
+        db = DDBMS(events=EventLog([]), write_mode='commit-locks', start=False)
+        for line in ['begin(T1)', 'begin(T2)', 'W(T1,x2,5)']:
+            db.execute(line)
+        self.assertFalse(any(site.locktable for site in db.sites.values()))
+        self.assertEqual(db.tm.read('T2', 'x2'), 20)
+        for line in ['end(T1)', 'end(T2)']:
+            db.execute(line)
+        self.assertEqual(db.tm.trxs['T1'].abort_cause, AbortCause.CONFLICT)
+        self.assertEqual(db.tm.trxs['T2'].status, TransactionStatus.COMMITED)
+        self.assertEqual(db.sites[1].vars['x2'].versions.latest(), (0, 20))
+
+    def test_deadlock_prevention(self):
+        '''Wait-die, wound-wait and timeouts abort transactions without searching the waits-for graph
+
+        Expected Result:
+            Wait-die: T2 dies rather than wait for the older T1, and T1 waits for the younger T2
+            Wound-wait: T2 waits for the older T1, and T1 wounds the younger T2 and writes x1
+            Timeout: T2 blocked by T1 at tick 3 is aborted at tick 13, then T1 commits
+        '''
+        def run(mode, lines):
+            db = DDBMS(events=EventLog([]), deadlock=mode, start=False)
+            for line in ['begin(T1)', 'begin(T2)'] + lines:
+                db.execute(line)
+            return db.tm.trxs['T1'], db.tm.trxs['T2']
+
+        t1, t2 = run('wait-die', ['R(T1,x1)', 'W(T2,x1,5)'])
+        self.assertEqual((t1.status, t2.abort_cause), (TransactionStatus.RUNNING, AbortCause.PREVENTED))
+        t1, t2 = run('wait-die', ['R(T2,x1)', 'W(T1,x1,5)'])
+        self.assertEqual((t1.status, t2.status), (TransactionStatus.WAITING, TransactionStatus.RUNNING))
+        t1, t2 = run('wound-wait', ['R(T1,x1)', 'W(T2,x1,5)'])
+        self.assertEqual((t1.status, t2.status), (TransactionStatus.RUNNING, TransactionStatus.WAITING))
+        t1, t2 = run('wound-wait', ['R(T2,x1)', 'W(T1,x1,5)'])
+        self.assertEqual((t1.status, t2.abort_cause), (TransactionStatus.RUNNING, AbortCause.PREVENTED))
+        fillers = ['dump(x2)'] * 9
+        t1, t2 = run('timeout', ['R(T1,x1)', 'W(T2,x1,5)'] + fillers)
+        self.assertEqual(t2.status, TransactionStatus.WAITING)
+        t1, t2 = run('timeout', ['R(T1,x1)', 'W(T2,x1,5)'] + fillers + ['end(T1)'])
+        self.assertEqual((t1.status, t2.abort_cause), (TransactionStatus.COMMITED, AbortCause.TIMEOUT))
+
+    def test_snapshot_isolation(self):
+        '''Read/write transactions read snapshots without locks and conflicts are found at end
+
+        Expected Result:
+            With si, reads take no locks, T3 reads x1 = 10 from its snapshot after T1 committed x1 = 0,
+            and the write skew of T1 and T2 commits both
+            With ssi, T2 is aborted because x1, which it read, was overwritten by T1 since it began
+            Of two transactions writing x2, the first to end commits and the second is aborted
+        '''
+        skew = ['begin(T1)', 'begin(T2)', 'begin(T3)', 'R(T1,x1)', 'R(T1,x3)', 'R(T2,x1)', 'R(T2,x3)',
+                'W(T1,x1,0)', 'W(T2,x3,0)', 'end(T1)', 'R(T3,x1)', 'end(T2)']
+        for isolation, t2 in [('si', TransactionStatus.COMMITED), ('ssi', TransactionStatus.ABORTED)]:
+            db = DDBMS(events=EventLog([]), isolation=isolation, start=False)
+            for line in skew[:7]:
+                db.execute(line)
+            self.assertFalse(any(site.locktable for site in db.sites.values()))
+            for line in skew[7:]:
+                db.execute(line)
+            self.assertEqual(db.tm.read('T3', 'x1'), 10)
+            self.assertEqual(db.tm.trxs['T1'].status, TransactionStatus.COMMITED)
+            self.assertEqual(db.tm.trxs['T2'].status, t2)
+
+        db = DDBMS(events=EventLog([]), isolation='si', start=False)
+        for line in ['begin(T1)', 'begin(T2)', 'W(T1,x2,1)', 'W(T2,x2,2)', 'end(T2)', 'end(T1)']:
+            db.execute(line)
+        self.assertEqual(db.tm.trxs['T1'].abort_cause, AbortCause.CONFLICT)
+        self.assertEqual(db.sites[1].vars['x2'].versions.latest(), (4, 2))
+
+    def test_optimistic_concurrency_control(self):
+        '''Transactions run without locks and are validated against the commits made since their reads
+
+        Expected Result:
+            Reads and writes take no locks and T2 reads x1 = 20 committed by T1 after T2 began
+            T3 is aborted because x1, which it read, was overwritten by T1 after it read it
+            T2 commits, as nothing it read was overwritten since, and its write is on all sites
+        '''
+        db = DDBMS(events=EventLog([]), isolation='occ', start=False)
+        for line in ['begin(T1)', 'begin(T2)', 'begin(T3)', 'R(T3,x1)', 'R(T1,x1)', 'W(T1,x1,20)',
+                     'W(T3,x4,30)']:
+            db.execute(line)
+        self.assertFalse(any(site.locktable for site in db.sites.values()))
+        db.execute('end(T1)')
+        self.assertEqual(db.tm.read('T2', 'x1'), 20)
+        for line in ['W(T2,x2,7)', 'end(T3)', 'end(T2)']:
+            db.execute(line)
+        self.assertEqual(db.tm.trxs['T3'].abort_cause, AbortCause.CONFLICT)
+        self.assertEqual(db.tm.trxs['T2'].status, TransactionStatus.COMMITED)
+        self.assertEqual([site.vars['x2'].versions.latest() for site in db.sites.values()], [(10, 7)] * 10)
+
+    def test_recover_retries_dropped_locks(self):
+        '''Waiters on the locks a site drops when it fails are retried when it recovers
+
+        Expected Result:
+            T2 blocked by the write lock of T1 on x1 reads x1 once site 2 recovers without the lock
+            T1 is aborted for the failure of site 2 and T2 commits, keeping or dropping the site state
+        '''
+        trace = 'begin(T1)\nbegin(T2)\nW(T1,x1,5)\nR(T2,x1)\nfail(2)\nrecover(2)\nend(T1)\nend(T2)\n'
+        for fail_mode in DDBMS.FAIL_MODES:
+            db = DDBMS(StringIO(trace), events=EventLog([]), fail_mode=fail_mode)
+            self.assertEqual(db.tm.trxs['T1'].abort_cause, AbortCause.SITE_FAILURE)
+            self.assertEqual(db.tm.trxs['T2'].status, TransactionStatus.COMMITED)
+
+    def test_bad_arguments(self):
+        '''Commands naming what does not exist, or writing a value that is not a number, are bad lines
+
+        Expected Result:
+            Lines 2 to 5 are reported with their line number and take no tick
+            T1 commits its write of x2
+        '''
+        trace = 'begin(T1)\nW(T1,x1,abc)\nR(T1,x99)\nR(T9,x1)\ndump(x0)\nW(T1,x2,7)\nend(T1)\n'
+        sink = MemorySink()
+        db = DDBMS(StringIO(trace), events=EventLog([sink]))
+        bad = [e.fields for e in sink.events if e.kind == 'bad_line']
+        self.assertEqual([b['lineno'] for b in bad], [2, 3, 4, 5])
+        self.assertEqual([b['error'] for b in bad][1:], ['unknown x99', 'unknown T9', 'unknown x0'])
+        self.assertEqual(db.ticker.get_tick(), 3)
+        self.assertEqual(db.sites[1].vars['x2'].versions.latest(), (2, 7))
+
+    def test_out_of_range_write(self):
+        '''A value that does not fit in a 64-bit integer is a bad line, even with write-ahead logs
+
+        Expected Result:
+            Line 2 is reported and leaves no lock, so T2 writes x2 and both commit
+        '''
+        trace = 'begin(T1)\nW(T1,x2,9223372036854775808)\nbegin(T2)\nW(T2,x2,5)\nend(T2)\nend(T1)\n'
+        sink = MemorySink()
+        db = DDBMS(StringIO(trace), events=EventLog([sink]), wal=lambda i: WriteAheadLog())
+        bad = [e.fields for e in sink.events if e.kind == 'bad_line']
+        self.assertEqual([b['lineno'] for b in bad], [2])
+        self.assertIn('out of range', bad[0]['error'])
+        self.assertEqual(db.sites[1].vars['x2'].versions.latest(), (3, 5))
+        self.assertEqual(db.tm.trxs['T1'].status, TransactionStatus.COMMITED)